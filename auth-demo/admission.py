@@ -0,0 +1,148 @@
+from collections import OrderedDict, deque
+import threading
+import time
+
+
+class AdmissionTimeoutError(Exception):
+    """Raised when a query waits longer than the admission timeout for a slot"""
+
+
+class AdmissionAbortedError(Exception):
+    """Raised when a queued caller gives up before it is admitted"""
+
+
+class _Waiter:
+    def __init__(self, owner, key):
+        self.owner = owner
+        self.key = key
+        self.enqueued_at = time.monotonic()
+        self.admitted = False
+
+
+class FairLimiter:
+    """Admit at most max_total concurrent holders, and at most max_per_key per key.
+
+    Callers that have to wait are queued per owner and admitted round-robin
+    across owners, so one owner with many queued calls cannot starve the
+    others. A waiter whose key is at its limit is passed over in favour of
+    the next owner's waiter rather than blocking the whole queue.
+    """
+
+    def __init__(self, max_total, max_per_key, timeout):
+        self.max_total = max_total
+        self.max_per_key = max_per_key
+        self.timeout = timeout
+        self._cond = threading.Condition()
+        self._running = 0
+        self._running_per_key = {}
+        # Queued waiters per owner; owners are rotated to the end once served
+        self._queues = OrderedDict()
+        self._stats = {"admitted": 0, "queued": 0, "timeouts": 0, "aborted": 0, "wait_seconds": 0.0, "max_wait": 0.0}
+
+    def acquire(self, owner, key, on_position=None, should_abort=None):
+        """Wait for a slot; return a ticket to pass to release().
+
+        on_position(position, depth) is called whenever the caller's place
+        in the queue changes. should_abort() is checked while waiting.
+        """
+        with self._cond:
+            waiter = _Waiter(owner, key)
+            if not self._queues and self._has_capacity(key):
+                self._admit(waiter)
+                return waiter
+            self._queues.setdefault(owner, deque()).append(waiter)
+            self._stats["queued"] += 1
+            self._dispatch()
+            deadline = waiter.enqueued_at + self.timeout
+            last_position = None
+            while not waiter.admitted:
+                position = self._position(waiter)
+                if on_position is not None and position != last_position:
+                    last_position = position
+                    on_position(*position)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or (should_abort is not None and should_abort()):
+                    self._remove(waiter)
+                    if remaining <= 0:
+                        self._stats["timeouts"] += 1
+                        raise AdmissionTimeoutError(
+                            f"No query slot became available within {self.timeout:g}s"
+                        )
+                    self._stats["aborted"] += 1
+                    raise AdmissionAbortedError("Query left the queue before it was admitted")
+                self._cond.wait(min(remaining, 0.5))
+            return waiter
+
+    def release(self, ticket):
+        with self._cond:
+            self._running -= 1
+            self._running_per_key[ticket.key] -= 1
+            if not self._running_per_key[ticket.key]:
+                del self._running_per_key[ticket.key]
+            self._dispatch()
+
+    def stats(self):
+        with self._cond:
+            now = time.monotonic()
+            waiting = [waiter for queue in self._queues.values() for waiter in queue]
+            return {
+                **self._stats,
+                "wait_seconds": round(self._stats["wait_seconds"], 2),
+                "max_wait": round(self._stats["max_wait"], 2),
+                "running": self._running,
+                "queue_depth": len(waiting),
+                "queued_owners": len(self._queues),
+                "oldest_wait": round(max((now - waiter.enqueued_at for waiter in waiting), default=0.0), 2),
+                "max_total": self.max_total,
+                "max_per_key": self.max_per_key,
+            }
+
+    def _has_capacity(self, key):
+        return self._running < self.max_total and self._running_per_key.get(key, 0) < self.max_per_key
+
+    def _admit(self, waiter):
+        waiter.admitted = True
+        self._running += 1
+        self._running_per_key[waiter.key] = self._running_per_key.get(waiter.key, 0) + 1
+        waited = time.monotonic() - waiter.enqueued_at
+        self._stats["admitted"] += 1
+        self._stats["wait_seconds"] += waited
+        self._stats["max_wait"] = max(self._stats["max_wait"], waited)
+
+    def _dispatch(self):
+        """Admit queued waiters round-robin by owner while slots are free; called with the lock held"""
+        admitted = False
+        progress = True
+        while progress and self._running < self.max_total:
+            progress = False
+            for owner in list(self._queues):
+                queue = self._queues[owner]
+                waiter = next((waiter for waiter in queue if self._has_capacity(waiter.key)), None)
+                if waiter is None:
+                    continue
+                queue.remove(waiter)
+                if queue:
+                    self._queues.move_to_end(owner)
+                else:
+                    del self._queues[owner]
+                self._admit(waiter)
+                admitted = progress = True
+                break
+        if admitted:
+            self._cond.notify_all()
+
+    def _remove(self, waiter):
+        queue = self._queues.get(waiter.owner)
+        if queue is not None and waiter in queue:
+            queue.remove(waiter)
+            if not queue:
+                del self._queues[waiter.owner]
+        self._cond.notify_all()
+
+    def _position(self, waiter):
+        """(position, depth) of waiter in the round-robin admission order"""
+        order = []
+        queues = [list(queue) for queue in self._queues.values()]
+        for round_index in range(max((len(queue) for queue in queues), default=0)):
+            order.extend(queue[round_index] for queue in queues if round_index < len(queue))
+        return order.index(waiter) + 1, len(order)
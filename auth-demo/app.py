@@ -1,11 +1,13 @@
 import dash
 import dash_mantine_components as dmc
 from dash import Dash, Input, Output, State, callback, dcc, html
+from flask import jsonify
 import jwt
 import json
 
 from auth import (
     cfg,
+    get_sql_pool_stats,
     fetch_sp_details,
     get_connection_obo,
     get_connection_sp,
@@ -15,14 +17,24 @@ from auth import (
     get_genie_conversations_sp,
     get_genie_conversations_obo,
 )
+from cache import get_cache_stats
+from genie_messages import get_pattern_stats
+from jobs import get_background_job_stats, manager
+from prewarm import get_prewarm_state, is_ready, start_prewarm
+from rest import get_breaker_stats, get_session_stats
+from result_store import get_result_store_stats
+from singleflight import get_single_flight_stats
 from sql import (
+    WAREHOUSE_STATE_TTL,
+    cancel_queries,
     fetch_warehouses,
-    run_query,
+    get_query_admission_stats,
 )
 from utils import create_data_table, get_icon, create_genie_list
+from wire import WIRE_COMPRESSION, compression_server, get_wire_stats
 
 # Import callbacks
-from callbacks.auth_callbacks import update_header_and_warehouses
+from callbacks.auth_callbacks import update_header, update_sp_name, update_warehouses
 from callbacks.sql_callbacks import run_sp_query_callback, run_obo_query_callback
 from callbacks.genie_callbacks import (
     list_spaces_sp_callback,
@@ -35,8 +47,14 @@ from callbacks.message_callbacks import (
     list_messages_obo_callback,
 )
 
-app = Dash(external_stylesheets=[dmc.styles.ALL])
+app = Dash(
+    server=compression_server(),
+    compress=WIRE_COMPRESSION,
+    external_stylesheets=[dmc.styles.ALL],
+    background_callback_manager=manager,
+)
 app.title = "Databricks Auth Demo"
+start_prewarm()
 
 app.layout = dmc.MantineProvider(
     theme={
@@ -108,20 +126,46 @@ app.layout = dmc.MantineProvider(
                         dmc.Grid(
                             [
                                 dmc.GridCol(
-                                    dmc.Select(
-                                        id="sql-http-path",
-                                        label="Select SQL Warehouse",
-                                        description="Choose a running SQL warehouse.",
-                                        data=[],
-                                        value=None,
-                                        required=True,
-                                        style={"width": "100%"},
-                                        searchable=True,
-                                        nothingFoundMessage="No warehouses found",
-                                        leftSection=get_icon(
-                                            "material-symbols:database-outline"
+                                    [
+                                        dmc.Select(
+                                            id="sql-http-path",
+                                            label="Select SQL Warehouse",
+                                            description="Choose a running SQL warehouse.",
+                                            data=[],
+                                            value=None,
+                                            placeholder="Loading warehouses…",
+                                            required=True,
+                                            style={"width": "100%"},
+                                            searchable=True,
+                                            nothingFoundMessage="No warehouses found",
+                                            leftSection=get_icon(
+                                                "material-symbols:database-outline"
+                                            ),
                                         ),
-                                    ),
+                                        dmc.Group(
+                                            [
+                                                dmc.Text(
+                                                    id="warehouse-state",
+                                                    size="xs",
+                                                    c="dimmed",
+                                                ),
+                                                dmc.Button(
+                                                    id="use-running-warehouse",
+                                                    variant="subtle",
+                                                    size="compact-xs",
+                                                    style={"display": "none"},
+                                                ),
+                                            ],
+                                            gap="xs",
+                                            mt="xs",
+                                        ),
+                                        dcc.Store(id="running-warehouse-suggestion"),
+                                        # Keeps the warehouse states in the selector current
+                                        dcc.Interval(
+                                            id="warehouse-state-interval",
+                                            interval=WAREHOUSE_STATE_TTL * 1000,
+                                        ),
+                                    ],
                                     span=6,
                                 ),
                                 dmc.GridCol(
@@ -170,24 +214,48 @@ app.layout = dmc.MantineProvider(
                                         dmc.Text(
                                             [
                                                 "Service principal: ",
-                                                html.B(id="sp-name-display"),
+                                                html.B("Loading…", id="sp-name-display"),
                                             ],
                                             size="sm",
                                             mb="md",
                                         ),
-                                        dmc.Button(
-                                            "Run Query (SP)",
-                                            id="run-query-sp",
-                                            variant="outline",
-                                            leftSection=get_icon(
-                                                "material-symbols:play-arrow-outline"
-                                            ),
+                                        dmc.Group(
+                                            [
+                                                dmc.Button(
+                                                    "Run Query (SP)",
+                                                    id="run-query-sp",
+                                                    variant="outline",
+                                                    leftSection=get_icon(
+                                                        "material-symbols:play-arrow-outline"
+                                                    ),
+                                                    loading=False,
+                                                    loaderProps={
+                                                        "variant": "dots",
+                                                        "size": "sm",
+                                                    },
+                                                ),
+                                                dmc.Button(
+                                                    "Cancel",
+                                                    id="cancel-query-sp",
+                                                    variant="subtle",
+                                                    color="gray",
+                                                    leftSection=get_icon(
+                                                        "material-symbols:stop-outline"
+                                                    ),
+                                                    disabled=True,
+                                                ),
+                                                dmc.Button(
+                                                    "Refresh",
+                                                    id="refresh-query-sp",
+                                                    variant="subtle",
+                                                    color="gray",
+                                                    leftSection=get_icon(
+                                                        "material-symbols:refresh"
+                                                    ),
+                                                ),
+                                            ],
+                                            gap="sm",
                                             mb="md",
-                                            loading=False,
-                                            loaderProps={
-                                                "variant": "dots",
-                                                "size": "sm",
-                                            },
                                         ),
                                         dmc.Alert(
                                             id="alert-sp",
@@ -198,11 +266,36 @@ app.layout = dmc.MantineProvider(
                                             hide=True,
                                             radius="sm",
                                         ),
+                                        dmc.Text(
+                                            id="warehouse-wait-sp",
+                                            size="xs",
+                                            c="dimmed",
+                                            mt="xs",
+                                        ),
+                                        dmc.Progress(
+                                            id="warehouse-wait-bar-sp",
+                                            value=0,
+                                            size="xs",
+                                            animated=True,
+                                            style={"display": "none"},
+                                        ),
+                                        dmc.Text(
+                                            id="query-progress-sp",
+                                            size="xs",
+                                            c="dimmed",
+                                            mt="xs",
+                                        ),
+                                        dcc.Interval(
+                                            id="query-progress-interval-sp",
+                                            interval=500,
+                                            disabled=True,
+                                        ),
                                         html.Div(
                                             create_data_table("table-output-sp"),
                                             id="table-container-sp",
                                             style={"display": "none"},
                                         ),
+                                        dcc.Store(id="table-data-sp"),
                                         dmc.LoadingOverlay(
                                             id="loading-overlay-sp",
                                             visible=False,
@@ -297,19 +390,43 @@ app.layout = dmc.MantineProvider(
                                                 mb="md",
                                             ),
                                         ),
-                                        dmc.Button(
-                                            "Run Query (OBO)",
-                                            id="run-query-obo",
-                                            variant="outline",
-                                            leftSection=get_icon(
-                                                "material-symbols:play-arrow-outline"
-                                            ),
+                                        dmc.Group(
+                                            [
+                                                dmc.Button(
+                                                    "Run Query (OBO)",
+                                                    id="run-query-obo",
+                                                    variant="outline",
+                                                    leftSection=get_icon(
+                                                        "material-symbols:play-arrow-outline"
+                                                    ),
+                                                    loading=False,
+                                                    loaderProps={
+                                                        "variant": "dots",
+                                                        "size": "sm",
+                                                    },
+                                                ),
+                                                dmc.Button(
+                                                    "Cancel",
+                                                    id="cancel-query-obo",
+                                                    variant="subtle",
+                                                    color="gray",
+                                                    leftSection=get_icon(
+                                                        "material-symbols:stop-outline"
+                                                    ),
+                                                    disabled=True,
+                                                ),
+                                                dmc.Button(
+                                                    "Refresh",
+                                                    id="refresh-query-obo",
+                                                    variant="subtle",
+                                                    color="gray",
+                                                    leftSection=get_icon(
+                                                        "material-symbols:refresh"
+                                                    ),
+                                                ),
+                                            ],
+                                            gap="sm",
                                             mb="md",
-                                            loading=False,
-                                            loaderProps={
-                                                "variant": "dots",
-                                                "size": "sm",
-                                            },
                                         ),
                                         dmc.Alert(
                                             id="alert-obo",
@@ -321,11 +438,36 @@ app.layout = dmc.MantineProvider(
                                             radius="sm",
                                             mt="md",
                                         ),
+                                        dmc.Text(
+                                            id="warehouse-wait-obo",
+                                            size="xs",
+                                            c="dimmed",
+                                            mt="xs",
+                                        ),
+                                        dmc.Progress(
+                                            id="warehouse-wait-bar-obo",
+                                            value=0,
+                                            size="xs",
+                                            animated=True,
+                                            style={"display": "none"},
+                                        ),
+                                        dmc.Text(
+                                            id="query-progress-obo",
+                                            size="xs",
+                                            c="dimmed",
+                                            mt="xs",
+                                        ),
+                                        dcc.Interval(
+                                            id="query-progress-interval-obo",
+                                            interval=500,
+                                            disabled=True,
+                                        ),
                                         html.Div(
                                             create_data_table("table-output-obo"),
                                             id="table-container-obo",
                                             style={"display": "none"},
                                         ),
+                                        dcc.Store(id="table-data-obo"),
                                         dmc.LoadingOverlay(
                                             id="loading-overlay-obo",
                                             visible=False,
@@ -363,7 +505,7 @@ app.layout = dmc.MantineProvider(
                                         dmc.Text(
                                             [
                                                 "Service principal: ",
-                                                html.B(id="sp-name-display-genie"),
+                                                html.B("Loading…", id="sp-name-display-genie"),
                                             ],
                                             size="sm",
                                             mb="md",
@@ -446,13 +588,35 @@ app.layout = dmc.MantineProvider(
                                         # Conversations output container
                                         html.Div([
                                             dmc.Text("Conversations", size="sm", fw=500, mb="xs"),
-                                            html.Div(id="conversations-output-sp")
+                                            html.Div(id="conversations-output-sp"),
+                                            dmc.Button(
+                                                "Load more conversations",
+                                                id="more-conversations-sp",
+                                                variant="subtle",
+                                                size="xs",
+                                                mt="xs",
+                                                loading=False,
+                                                style={"display": "none"},
+                                            ),
+                                            # Where the next page starts, or None once everything is shown
+                                            dcc.Store(id="conversations-page-sp"),
                                         ], id="conversations-container-sp", style={"display": "none"}, className="mb-3"),
                                         
                                         # Messages output container
                                         html.Div([
                                             dmc.Text("Messages", size="sm", fw=500, mb="xs"),
-                                            html.Div(id="messages-output-sp")
+                                            html.Div(id="messages-output-sp"),
+                                            dmc.Button(
+                                                "Load more messages",
+                                                id="more-messages-sp",
+                                                variant="subtle",
+                                                size="xs",
+                                                mt="xs",
+                                                loading=False,
+                                                style={"display": "none"},
+                                            ),
+                                            # Where the next page starts, or None once everything is shown
+                                            dcc.Store(id="messages-page-sp"),
                                         ], id="messages-container-sp", style={"display": "none"}, className="mb-3"),
                                         dmc.LoadingOverlay(
                                             id="loading-overlay-genie-sp",
@@ -572,13 +736,35 @@ app.layout = dmc.MantineProvider(
                                         # Conversations output container  
                                         html.Div([
                                             dmc.Text("Conversations", size="sm", fw=500, mb="xs"),
-                                            html.Div(id="conversations-output-obo")
+                                            html.Div(id="conversations-output-obo"),
+                                            dmc.Button(
+                                                "Load more conversations",
+                                                id="more-conversations-obo",
+                                                variant="subtle",
+                                                size="xs",
+                                                mt="xs",
+                                                loading=False,
+                                                style={"display": "none"},
+                                            ),
+                                            # Where the next page starts, or None once everything is shown
+                                            dcc.Store(id="conversations-page-obo"),
                                         ], id="conversations-container-obo", style={"display": "none"}, className="mb-3"),
                                         
                                         # Messages output container
                                         html.Div([
                                             dmc.Text("Messages", size="sm", fw=500, mb="xs"),
-                                            html.Div(id="messages-output-obo")
+                                            html.Div(id="messages-output-obo"),
+                                            dmc.Button(
+                                                "Load more messages",
+                                                id="more-messages-obo",
+                                                variant="subtle",
+                                                size="xs",
+                                                mt="xs",
+                                                loading=False,
+                                                style={"display": "none"},
+                                            ),
+                                            # Where the next page starts, or None once everything is shown
+                                            dcc.Store(id="messages-page-obo"),
                                         ], id="messages-container-obo", style={"display": "none"}, className="mb-3"),
                                         dmc.LoadingOverlay(
                                             id="loading-overlay-genie-obo",
@@ -597,6 +783,7 @@ app.layout = dmc.MantineProvider(
                         ),
                         html.Div(id="initial-load-trigger", style={"display": "none"}),
                         dcc.Store(id="obo-token-store"),
+                        dcc.Store(id="query-session-store"),
                     ],
                     fluid=False,
                     p="0",
@@ -619,5 +806,32 @@ app.layout = dmc.MantineProvider(
 # Genie callback functions moved to callbacks/genie_callbacks.py
 
 
+@app.server.route("/_stats")
+def stats():
+    return jsonify({
+        "http": get_session_stats(),
+        "circuit_breakers": get_breaker_stats(),
+        "caches": get_cache_stats(),
+        "sql_pools": get_sql_pool_stats(),
+        "sql_admission": get_query_admission_stats(),
+        "message_patterns": get_pattern_stats(),
+        "single_flight": get_single_flight_stats(),
+        "background_jobs": get_background_job_stats(),
+        "result_store": get_result_store_stats(),
+        "wire": get_wire_stats(),
+    })
+
+
+@app.server.route("/_ready")
+def ready():
+    return jsonify(get_prewarm_state()), 200 if is_ready() else 503
+
+
+@app.server.route("/_cancel_queries/<query_session>", methods=["POST"])
+def cancel_session_queries(query_session):
+    cancelled = cancel_queries((query_session, "sp")) + cancel_queries((query_session, "obo"))
+    return jsonify({"cancelled": cancelled})
+
+
 if __name__ == "__main__":
     app.run()
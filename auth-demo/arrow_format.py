@@ -0,0 +1,80 @@
+import json
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+
+def _format_column(column):
+    """Convert one Arrow column to a type the DataTable can display"""
+    col_type = column.type
+    if pa.types.is_timestamp(col_type):
+        seconds = pc.cast(column, pa.timestamp("s", tz=col_type.tz), safe=False)
+        return pc.strftime(seconds, format="%Y-%m-%d %H:%M:%S")
+    if pa.types.is_time(col_type):
+        return pc.cast(pc.cast(column, pa.time32("s"), safe=False), pa.string())
+    if pa.types.is_date(col_type) or pa.types.is_decimal(col_type):
+        return pc.cast(column, pa.string())
+    if pa.types.is_binary(col_type) or pa.types.is_large_binary(col_type) or pa.types.is_fixed_size_binary(col_type):
+        # Always hex, so a column renders the same in every streamed batch
+        # whether or not that batch happens to hold valid UTF-8
+        return pa.array(
+            [value.hex() if value is not None else None for value in column.to_pylist()],
+            pa.string(),
+        )
+    if pa.types.is_list(col_type) or pa.types.is_large_list(col_type):
+        return _format_list(column)
+    if (
+        pa.types.is_nested(col_type)
+        or pa.types.is_duration(col_type)
+        or pa.types.is_interval(col_type)
+        or pa.types.is_dictionary(col_type)
+    ):
+        # No Arrow cast to string exists for these, so format the Python values
+        return pa.array(
+            [
+                _format_nested(value) if value is not None else None
+                for value in column.to_pylist()
+            ],
+            pa.string(),
+        )
+    if pa.types.is_null(col_type):
+        return pc.cast(column, pa.string())
+    return column
+
+
+def _format_list(column):
+    """Render list values as "[a, b]" strings, formatting the items with Arrow kernels"""
+    chunks = column.chunks if isinstance(column, pa.ChunkedArray) else [column]
+    formatted = []
+    for chunk in chunks:
+        items = pc.fill_null(_format_column(chunk.values).cast(pa.string()), "null")
+        list_type = pa.large_list(pa.string()) if pa.types.is_large_list(chunk.type) else pa.list_(pa.string())
+        lists = type(chunk).from_arrays(chunk.offsets, items, type=list_type)
+        rendered = pc.binary_join_element_wise("[", pc.binary_join(lists, ", "), "]", "")
+        formatted.append(pc.if_else(chunk.is_null(), pa.scalar(None, pa.string()), rendered))
+    if isinstance(column, pa.ChunkedArray):
+        return pa.chunked_array(formatted, pa.string())
+    return formatted[0]
+
+
+def _format_nested(value):
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=str)
+    return str(value)
+
+
+def format_arrow_table(table):
+    """Return a copy of an Arrow result table with every column ready for display.
+
+    Temporal, interval, decimal, binary and nested columns become strings; numeric,
+    boolean and string columns are passed through untouched.
+    """
+    columns = [_format_column(column) for column in table.columns]
+    return pa.table(columns, names=table.column_names)
+
+
+def to_records(table):
+    """Build DataTable row dicts from a formatted table, one column conversion at a time"""
+    names = table.column_names
+    columns = [column.to_pylist() for column in table.columns]
+    return [dict(zip(names, row)) for row in zip(*columns)]
@@ -1,9 +1,21 @@
+from collections import OrderedDict
 from databricks import sql
 from databricks.sdk import WorkspaceClient
 from databricks.sdk.core import Config
 from flask import request
-import requests
+import hashlib
 import json
+import jwt
+import os
+import threading
+import time
+
+from cache import LRUTTLCache, background_ttl_cache
+from genie_messages import list_messages
+from pagination import iter_pages, prefetch
+from pool import ConnectionPool
+import rest
+import singleflight
 
 cfg = Config()
 w = WorkspaceClient()
@@ -14,7 +26,44 @@ if not cfg.host:
 if not w:
     print("WARNING: WorkspaceClient not initialized")
 
+# The SP identity does not change while the app is running
+SP_DETAILS_TTL = float(os.getenv("SP_DETAILS_TTL", "3600"))
+
+# SQL connection pool settings, one pool per warehouse http_path
+SQL_POOL_MAX_SIZE = int(os.getenv("SQL_POOL_MAX_SIZE", "8"))
+SQL_POOL_MAX_IDLE = float(os.getenv("SQL_POOL_MAX_IDLE", "600"))
+SQL_POOL_MAX_LIFETIME = float(os.getenv("SQL_POOL_MAX_LIFETIME", "3600"))
+SQL_POOL_CHECKOUT_TIMEOUT = float(os.getenv("SQL_POOL_CHECKOUT_TIMEOUT", "30"))
+SQL_POOL_VALIDATE_AFTER = float(os.getenv("SQL_POOL_VALIDATE_AFTER", "60"))
+
+_sp_pools_lock = threading.Lock()
+_sp_pools = {}
+
+# OBO pools are per token and warehouse; the total bounds OBO connections overall
+SQL_OBO_POOL_MAX_PER_USER = int(os.getenv("SQL_OBO_POOL_MAX_PER_USER", "2"))
+SQL_OBO_POOL_MAX_TOTAL = int(os.getenv("SQL_OBO_POOL_MAX_TOTAL", "32"))
+SQL_OBO_EXPIRY_MARGIN = float(os.getenv("SQL_OBO_EXPIRY_MARGIN", "60"))
+
+_obo_pools_lock = threading.Lock()
+_obo_pools = OrderedDict()
+
+# Genie space and conversation listings, cached per caller identity
+GENIE_LISTING_TTL = float(os.getenv("GENIE_LISTING_TTL", "60"))
+GENIE_LISTING_MAX_ENTRIES = int(os.getenv("GENIE_LISTING_MAX_ENTRIES", "1000"))
+GENIE_LISTING_MAX_BYTES = int(os.getenv("GENIE_LISTING_MAX_BYTES", str(32 * 1024 * 1024)))
 
+genie_listing_cache = LRUTTLCache(
+    "genie_listings",
+    ttl=GENIE_LISTING_TTL,
+    max_entries=GENIE_LISTING_MAX_ENTRIES,
+    max_bytes=GENIE_LISTING_MAX_BYTES,
+)
+
+
+@background_ttl_cache(
+    SP_DETAILS_TTL,
+    cache_if=lambda info: info != "Unknown" and not info.startswith("Error"),
+)
 def fetch_sp_details():
     local_sp_display_info = "Unknown"
     if w:
@@ -36,6 +85,30 @@ def fetch_sp_details():
     return local_sp_display_info
 
 
+def get_workspace_url(path):
+    """Build an absolute workspace URL for a REST path"""
+    host = cfg.host.strip()
+    host = host.replace('https://', '').replace('http://', '').strip('/')
+    return f"https://{host}{path}"
+
+
+def fetch_sp(path):
+    """GET a REST path with Service Principal auth under the retry and circuit breaker policy"""
+    # Sent through the pooled session rather than the SDK client, whose own
+    # retries of a 429 or 503 run for up to five minutes; GENIE_RETRY_* alone
+    # bounds the call, so the breaker sees failures promptly
+    return rest.get_json(get_workspace_url(path), headers=w.config.authenticate(), caller="sp")
+
+
+def fetch_obo(path, user_token):
+    """GET a REST path with an OBO token through the pooled session, with retries and the user's own breaker"""
+    return rest.get_json(
+        get_workspace_url(path),
+        headers={"Authorization": f"Bearer {user_token}"},
+        caller=get_token_identity(user_token),
+    )
+
+
 def get_user_token():
     try:
         headers = request.headers
@@ -52,7 +125,7 @@ def get_user_token():
         return None
 
 
-def get_connection_sp(http_path):
+def _connect_sp(http_path):
     return sql.connect(
         server_hostname=cfg.host,
         http_path=http_path,
@@ -60,7 +133,44 @@ def get_connection_sp(http_path):
     )
 
 
-def get_connection_obo(http_path, user_token):
+def _get_sp_pool(http_path):
+    with _sp_pools_lock:
+        pool = _sp_pools.get(http_path)
+        if pool is None:
+            pool = _sp_pools[http_path] = ConnectionPool(
+                lambda: _connect_sp(http_path),
+                max_size=SQL_POOL_MAX_SIZE,
+                max_idle_time=SQL_POOL_MAX_IDLE,
+                max_lifetime=SQL_POOL_MAX_LIFETIME,
+                checkout_timeout=SQL_POOL_CHECKOUT_TIMEOUT,
+                validate_after=SQL_POOL_VALIDATE_AFTER,
+            )
+        return pool
+
+
+def get_connection_sp(http_path):
+    """Check out a pooled SP connection for a warehouse; close() returns it to the pool"""
+    return _get_sp_pool(http_path).acquire()
+
+
+def get_sql_pool_stats():
+    """Report in-use, idle, wait and create counts for every SQL connection pool"""
+    with _sp_pools_lock:
+        pools = dict(_sp_pools)
+    stats = {f"sp:{http_path}": pool.stats() for http_path, pool in pools.items()}
+
+    # OBO pools are summed so per-token fingerprints are not exposed
+    with _obo_pools_lock:
+        obo_pools = [entry["pool"] for entry in _obo_pools.values()]
+    obo_stats = {"pools": len(obo_pools)}
+    for pool in obo_pools:
+        for field, value in pool.stats().items():
+            obo_stats[field] = obo_stats.get(field, 0) + value
+    stats["obo"] = obo_stats
+    return stats
+
+
+def _connect_obo(http_path, user_token):
     return sql.connect(
         server_hostname=cfg.host,
         http_path=http_path,
@@ -68,10 +178,60 @@ def get_connection_obo(http_path, user_token):
     )
 
 
-def get_genie_spaces_sp():
-    """List Genie spaces using Service Principal auth"""
+def _evict_obo_pools(should_evict):
+    """Remove and close OBO pools whose key and entry match should_evict; caller holds the lock"""
+    for key in [k for k, entry in _obo_pools.items() if should_evict(k, entry)]:
+        _obo_pools.pop(key)["pool"].close_all()
+
+
+def get_connection_obo(http_path, user_token):
+    """Check out a pooled OBO connection for the token and warehouse.
+
+    Pools are keyed by the token's fingerprint and http_path, so a pool only
+    ever holds connections opened with its own token, and another token,
+    whatever its claims, can never reuse or close them. A pool is dropped
+    once its token's 'exp' passes; a user's pool for a replaced token ages
+    out by expiry or as the least recently used.
+    """
+    claims = _decode_token(user_token)
+    expires_at = claims.get("exp") if claims else None
+    if not expires_at:
+        # Without an expiry the connection cannot be pooled safely
+        return _connect_obo(http_path, user_token)
+
+    now = time.time()
+    remaining = expires_at - now - SQL_OBO_EXPIRY_MARGIN
+    if remaining <= 0:
+        return _connect_obo(http_path, user_token)
+
+    key = (token_fingerprint(user_token), http_path)
+    with _obo_pools_lock:
+        _evict_obo_pools(lambda k, entry: entry["expires_at"] - SQL_OBO_EXPIRY_MARGIN <= now)
+        entry = _obo_pools.get(key)
+        if entry is None:
+            while len(_obo_pools) >= max(SQL_OBO_POOL_MAX_TOTAL // SQL_OBO_POOL_MAX_PER_USER, 1):
+                # Make room by closing the least recently used pool
+                _obo_pools.pop(next(iter(_obo_pools)))["pool"].close_all()
+            entry = _obo_pools[key] = {
+                "expires_at": expires_at,
+                "pool": ConnectionPool(
+                    lambda: _connect_obo(http_path, user_token),
+                    max_size=SQL_OBO_POOL_MAX_PER_USER,
+                    max_idle_time=SQL_POOL_MAX_IDLE,
+                    max_lifetime=min(SQL_POOL_MAX_LIFETIME, remaining),
+                    checkout_timeout=SQL_POOL_CHECKOUT_TIMEOUT,
+                    validate_after=SQL_POOL_VALIDATE_AFTER,
+                ),
+            }
+        _obo_pools.move_to_end(key)
+        pool = entry["pool"]
+    return pool.acquire()
+
+
+def _load_genie_spaces_sp():
+    """Fetch Genie spaces using Service Principal auth"""
     try:
-        response = w.api_client.do("GET", "/api/2.0/genie/spaces")
+        response = fetch_sp("/api/2.0/genie/spaces")
         
         # Check if response has 'spaces' key
         if isinstance(response, dict):
@@ -92,53 +252,39 @@ def get_genie_spaces_sp():
         return None
 
 
-def get_genie_spaces_obo(user_token):
-    """List Genie spaces using OBO token"""
+def _load_genie_spaces_obo(user_token):
+    """Fetch Genie spaces using OBO token"""
     if not user_token:
         print("ERROR: No OBO token provided")
         return None
         
     try:
-        # Clean host URL construction
-        host = cfg.host.strip()
-        host = host.replace('https://', '').replace('http://', '').strip('/')
-        url = f"https://{host}/api/2.0/genie/spaces"
-        
-        response = requests.get(url, headers={"Authorization": f"Bearer {user_token}"})
+        json_response = fetch_obo("/api/2.0/genie/spaces", user_token)
         
-        if response.status_code == 200:
-            try:
-                json_response = response.json()
-                
-                if isinstance(json_response, dict) and 'spaces' in json_response:
-                    spaces = json_response['spaces']
-                    print(f"INFO: Found {len(spaces)} Genie spaces using OBO")
-                else:
-                    print("WARNING: OBO response missing 'spaces' key or not a dict")
-                    
-                return json_response
-                
-            except json.JSONDecodeError as je:
-                print(f"ERROR: Failed to parse JSON response: {je}")
-                return None
+        if isinstance(json_response, dict) and 'spaces' in json_response:
+            spaces = json_response['spaces']
+            print(f"INFO: Found {len(spaces)} Genie spaces using OBO")
         else:
-            print(f"ERROR: Genie spaces OBO request failed: HTTP {response.status_code}")
-            return None
+            print("WARNING: OBO response missing 'spaces' key or not a dict")
+            
+        return json_response
             
+    except json.JSONDecodeError as je:
+        print(f"ERROR: Failed to parse JSON response: {je}")
+        return None
     except Exception as e:
         print(f"ERROR: Failed to get Genie spaces with OBO: {e}")
         return None
 
 
-def get_genie_conversations_sp(space_id):
-    """List conversations in a space using Service Principal auth"""
+def _load_genie_conversations_sp(space_id, page_token=None):
+    """Fetch one page of conversations in a space using Service Principal auth"""
     if not space_id:
         print("ERROR: No space_id provided")
         return None
         
     try:
-        endpoint = f"/api/2.0/genie/spaces/{space_id}/conversations"
-        response = w.api_client.do("GET", endpoint)
+        response = next(iter_genie_conversations_sp(space_id, page_token, max_pages=1), None)
         
         # Check if response has 'conversations' key
         if isinstance(response, dict):
@@ -157,8 +303,8 @@ def get_genie_conversations_sp(space_id):
         return None
 
 
-def get_genie_conversations_obo(space_id, user_token):
-    """List conversations in a space using OBO token"""
+def _load_genie_conversations_obo(space_id, user_token, page_token=None):
+    """Fetch one page of conversations in a space using OBO token"""
     if not space_id:
         print("ERROR: No space_id provided")
         return None
@@ -168,39 +314,220 @@ def get_genie_conversations_obo(space_id, user_token):
         return None
         
     try:
-        # Clean host URL construction
-        host = cfg.host.strip()
-        host = host.replace('https://', '').replace('http://', '').strip('/')
-        url = f"https://{host}/api/2.0/genie/spaces/{space_id}/conversations"
-        
-        response = requests.get(url, headers={"Authorization": f"Bearer {user_token}"})
+        json_response = next(iter_genie_conversations_obo(space_id, user_token, page_token, max_pages=1), None)
         
-        if response.status_code == 200:
-            try:
-                json_response = response.json()
-                
-                if isinstance(json_response, dict) and 'conversations' in json_response:
-                    conversations = json_response['conversations']
-                    print(f"INFO: Found {len(conversations)} conversations in space {space_id} using OBO")
-                else:
-                    print("WARNING: OBO conversations response missing 'conversations' key or not a dict")
-                    
-                return json_response
-                
-            except json.JSONDecodeError as je:
-                print(f"ERROR: Failed to parse JSON response: {je}")
-                return None
+        if isinstance(json_response, dict) and 'conversations' in json_response:
+            conversations = json_response['conversations']
+            print(f"INFO: Found {len(conversations)} conversations in space {space_id} using OBO")
         else:
-            print(f"ERROR: Genie conversations OBO request failed: HTTP {response.status_code}")
-            return None
+            print("WARNING: OBO conversations response missing 'conversations' key or not a dict")
+            
+        return json_response
             
+    except json.JSONDecodeError as je:
+        print(f"ERROR: Failed to parse JSON response: {je}")
+        return None
     except Exception as e:
         print(f"ERROR: Failed to get conversations with OBO: {e}")
         return None
 
 
-def get_genie_messages_sp(space_id, conversation_id):
-    """List messages in a conversation using Service Principal auth"""
+def iter_genie_conversations_sp(space_id, page_token=None, page_size=None, max_pages=None):
+    """Yield pages of conversations in a space from page_token on using Service Principal auth"""
+    endpoint = f"/api/2.0/genie/spaces/{space_id}/conversations"
+    return iter_pages(fetch_sp, endpoint, page_size, max_pages, page_token=page_token)
+
+
+def iter_genie_conversations_obo(space_id, user_token, page_token=None, page_size=None, max_pages=None):
+    """Yield pages of conversations in a space from page_token on using OBO token"""
+    endpoint = f"/api/2.0/genie/spaces/{space_id}/conversations"
+    return iter_pages(lambda path: fetch_obo(path, user_token), endpoint, page_size, max_pages, page_token=page_token)
+
+
+def iter_genie_messages_sp(space_id, conversation_id, page_token=None, page_size=None, max_pages=None):
+    """Yield pages of messages in a conversation from page_token on using Service Principal auth"""
+    endpoint = f"/api/2.0/genie/spaces/{space_id}/conversations/{conversation_id}/messages"
+    return iter_pages(fetch_sp, endpoint, page_size, max_pages, page_token=page_token)
+
+
+def iter_genie_messages_obo(space_id, conversation_id, user_token, page_token=None, page_size=None, max_pages=None):
+    """Yield pages of messages in a conversation from page_token on using OBO token"""
+    endpoint = f"/api/2.0/genie/spaces/{space_id}/conversations/{conversation_id}/messages"
+    return iter_pages(
+        lambda path: fetch_obo(path, user_token), endpoint, page_size, max_pages, page_token=page_token
+    )
+
+
+def get_sp_identity():
+    """Cache identity for Service Principal calls, or None if the SP is unknown"""
+    sp_name = fetch_sp_details()
+    if sp_name == "Unknown" or sp_name.startswith("Error"):
+        return None
+    return f"sp:{sp_name}"
+
+
+def _decode_token(user_token):
+    """Read an OBO token's claims without verifying them.
+
+    Unverified claims may only describe the token itself, such as its
+    expiry; they never identify a user, since anyone can forge them.
+    """
+    try:
+        return jwt.decode(user_token, options={"verify_signature": False})
+    except Exception as e:
+        print(f"WARNING: Could not decode OBO token: {e}")
+        return None
+
+
+def token_fingerprint(user_token):
+    return hashlib.sha256(user_token.encode()).hexdigest()
+
+
+def get_token_identity(user_token):
+    """Cache identity for an OBO token: a hash of the whole token, never the token itself.
+
+    Cached results are only ever served to a caller holding the exact token
+    they were loaded with, so a token forged with someone else's claims
+    misses the cache and is checked by Databricks on its own.
+    """
+    if not user_token:
+        return None
+    return f"obo:{token_fingerprint(user_token)}"
+
+
+def _cached_listing(identity, key, result_key, load):
+    """Serve a listing from genie_listing_cache, loading and storing it on a miss"""
+    if identity is None:
+        return load()
+
+    cache_key = (identity,) + key
+    cached = genie_listing_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    # Identical concurrent misses share one upstream request
+    response = singleflight.do(cache_key, load)
+    if response is None:
+        # Upstream failed or its circuit is open; fall back to the last good answer
+        stale = genie_listing_cache.get_stale(cache_key)
+        if stale is not None:
+            print(f"WARNING: Serving cached {key[0]} after upstream failure")
+            return stale
+    # Only keep well-formed responses so permission problems are re-checked
+    if isinstance(response, dict) and result_key in response:
+        genie_listing_cache.set(cache_key, response)
+    return response
+
+
+def get_genie_spaces_sp():
+    """List Genie spaces using Service Principal auth"""
+    return _cached_listing(get_sp_identity(), ("spaces",), "spaces", _load_genie_spaces_sp)
+
+
+def get_genie_spaces_obo(user_token):
+    """List Genie spaces using OBO token"""
+    if not user_token:
+        print("ERROR: No OBO token provided")
+        return None
+
+    return _cached_listing(
+        get_token_identity(user_token),
+        ("spaces",),
+        "spaces",
+        lambda: _load_genie_spaces_obo(user_token),
+    )
+
+
+def _cached_conversations(identity, space_id, page_token, load):
+    """Serve one page of a conversation listing and warm the cache with the page after it"""
+    key = ("conversations", space_id, page_token)
+    response = _cached_listing(identity, key, "conversations", lambda: load(page_token))
+    next_page_token = response.get('next_page_token') if isinstance(response, dict) else None
+    if identity is not None and next_page_token:
+        # Loaded while this page is read, so asking for more is served from the cache
+        prefetch(lambda: _cached_listing(
+            identity,
+            ("conversations", space_id, next_page_token),
+            "conversations",
+            lambda: load(next_page_token),
+        ))
+    return response
+
+
+def get_genie_conversations_sp(space_id, page_token=None):
+    """List one page of conversations in a space using Service Principal auth"""
+    if not space_id:
+        print("ERROR: No space_id provided")
+        return None
+
+    return _cached_conversations(
+        get_sp_identity(),
+        space_id,
+        page_token,
+        lambda token: _load_genie_conversations_sp(space_id, token),
+    )
+
+
+def get_genie_conversations_obo(space_id, user_token, page_token=None):
+    """List one page of conversations in a space using OBO token"""
+    if not space_id:
+        print("ERROR: No space_id provided")
+        return None
+
+    if not user_token:
+        print("ERROR: No OBO token provided")
+        return None
+
+    return _cached_conversations(
+        get_token_identity(user_token),
+        space_id,
+        page_token,
+        lambda token: _load_genie_conversations_obo(space_id, user_token, token),
+    )
+
+
+def get_genie_space_sp(space_id):
+    """Get a single Genie space using Service Principal auth"""
+    try:
+        return fetch_sp(f"/api/2.0/genie/spaces/{space_id}")
+    except Exception as e:
+        print(f"ERROR: Failed to get Genie space {space_id} with Service Principal: {e}")
+        return None
+
+
+def get_genie_space_obo(space_id, user_token):
+    """Get a single Genie space using OBO token"""
+    try:
+        return fetch_obo(f"/api/2.0/genie/spaces/{space_id}", user_token)
+    except Exception as e:
+        print(f"ERROR: Failed to get Genie space {space_id} with OBO: {e}")
+        return None
+
+
+def get_genie_conversation_sp(space_id, conversation_id):
+    """Get a single conversation using Service Principal auth"""
+    try:
+        return fetch_sp(f"/api/2.0/genie/spaces/{space_id}/conversations/{conversation_id}")
+    except Exception as e:
+        print(f"ERROR: Failed to get conversation {conversation_id} with Service Principal: {e}")
+        return None
+
+
+def get_genie_conversation_obo(space_id, conversation_id, user_token):
+    """Get a single conversation using OBO token"""
+    try:
+        return fetch_obo(f"/api/2.0/genie/spaces/{space_id}/conversations/{conversation_id}", user_token)
+    except Exception as e:
+        print(f"ERROR: Failed to get conversation {conversation_id} with OBO: {e}")
+        return None
+
+
+def get_genie_messages_sp(space_id, conversation_id, page_token=None):
+    """List one page of messages in a conversation using Service Principal auth.
+
+    The first page is found through the learned or probed message pattern;
+    a page_token from it continues on the paginated messages endpoint.
+    """
     if not space_id:
         print("ERROR: No space_id provided")
         return None
@@ -210,86 +537,18 @@ def get_genie_messages_sp(space_id, conversation_id):
         return None
         
     try:
-        # Try multiple API patterns for listing messages
-        
-        # Pattern 1: Standard messages endpoint (what we were trying)
-        try:
-            endpoint = f"/api/2.0/genie/spaces/{space_id}/conversations/{conversation_id}/messages"
-            response = w.api_client.do("GET", endpoint)
-            
-            if isinstance(response, dict) and 'messages' in response:
-                messages = response['messages']
-                print(f"INFO: Found {len(messages)} messages using standard endpoint")
-                return response
-            else:
-                print("INFO: Standard messages endpoint didn't return expected format")
-        except Exception as e:
-            print(f"INFO: Standard messages endpoint failed: {e}")
-        
-        # Pattern 2: Try with query parameters for pagination/listing
-        try:
-            endpoint = f"/api/2.0/genie/spaces/{space_id}/conversations/{conversation_id}/messages?limit=100"
-            response = w.api_client.do("GET", endpoint)
-            
-            if isinstance(response, dict) and 'messages' in response:
-                messages = response['messages']
-                print(f"INFO: Found {len(messages)} messages using pagination endpoint")
-                return response
-            else:
-                print("INFO: Pagination endpoint didn't return expected format")
-        except Exception as e:
-            print(f"INFO: Pagination endpoint failed: {e}")
-        
-        # Pattern 3: Try conversation details endpoint (might include messages)
-        try:
-            endpoint = f"/api/2.0/genie/spaces/{space_id}/conversations/{conversation_id}"
-            response = w.api_client.do("GET", endpoint)
-            
-            if isinstance(response, dict):
-                if 'messages' in response:
-                    messages = response['messages']
-                    print(f"INFO: Found {len(messages)} messages in conversation details")
-                    return response
-                elif 'message_count' in response:
-                    print(f"INFO: Conversation has {response['message_count']} messages but no message list")
-                    # Return a structure indicating we found message count but no list
-                    return {
-                        'messages': [],
-                        'message_count': response['message_count'],
-                        'note': 'Message count available but individual messages not accessible via this endpoint'
-                    }
-                else:
-                    print("INFO: Conversation details endpoint didn't include messages")
-            else:
-                print("INFO: Conversation details endpoint didn't return expected format")
-        except Exception as e:
-            print(f"INFO: Conversation details endpoint failed: {e}")
-        
-        # Pattern 4: Try alternative messages endpoint structure
-        try:
-            endpoint = f"/api/2.0/genie/conversations/{conversation_id}/messages"
-            response = w.api_client.do("GET", endpoint)
-            
-            if isinstance(response, dict) and 'messages' in response:
-                messages = response['messages']
-                print(f"INFO: Found {len(messages)} messages using alternative endpoint")
-                return response
-            else:
-                print("INFO: Alternative messages endpoint didn't return expected format")
-        except Exception as e:
-            print(f"INFO: Alternative messages endpoint failed: {e}")
-        
-        # If all patterns fail, return None
-        print("WARNING: All message listing patterns failed - messages endpoint may not be available")
-        return None
-        
+        if page_token:
+            load = lambda: next(iter_genie_messages_sp(space_id, conversation_id, page_token, max_pages=1), None)
+        else:
+            load = lambda: list_messages(fetch_sp, cfg.host, "sp", space_id, conversation_id)
+        return singleflight.do(("sp", "messages", space_id, conversation_id, page_token), load)
     except Exception as e:
         print(f"ERROR: Failed to get messages with Service Principal: {e}")
         return None
 
 
-def get_genie_messages_obo(space_id, conversation_id, user_token):
-    """List messages in a conversation using OBO token"""
+def get_genie_messages_obo(space_id, conversation_id, user_token, page_token=None):
+    """List one page of messages in a conversation using OBO token"""
     if not space_id:
         print("ERROR: No space_id provided")
         return None
@@ -303,99 +562,18 @@ def get_genie_messages_obo(space_id, conversation_id, user_token):
         return None
         
     try:
-        # Clean host URL construction
-        host = cfg.host.strip()
-        host = host.replace('https://', '').replace('http://', '').strip('/')
-        
-        # Try multiple API patterns for listing messages
-        
-        # Pattern 1: Standard messages endpoint (what we were trying)
-        try:
-            url = f"https://{host}/api/2.0/genie/spaces/{space_id}/conversations/{conversation_id}/messages"
-            response = requests.get(url, headers={"Authorization": f"Bearer {user_token}"})
-            
-            if response.status_code == 200:
-                json_response = response.json()
-                if isinstance(json_response, dict) and 'messages' in json_response:
-                    messages = json_response['messages']
-                    print(f"INFO: Found {len(messages)} messages using standard endpoint")
-                    return json_response
-                else:
-                    print("INFO: Standard messages endpoint didn't return expected format")
-            else:
-                print(f"INFO: Standard messages endpoint failed: HTTP {response.status_code}")
-        except Exception as e:
-            print(f"INFO: Standard messages endpoint failed: {e}")
-        
-        # Pattern 2: Try with query parameters for pagination/listing
-        try:
-            url = f"https://{host}/api/2.0/genie/spaces/{space_id}/conversations/{conversation_id}/messages?limit=100"
-            response = requests.get(url, headers={"Authorization": f"Bearer {user_token}"})
-            
-            if response.status_code == 200:
-                json_response = response.json()
-                if isinstance(json_response, dict) and 'messages' in json_response:
-                    messages = json_response['messages']
-                    print(f"INFO: Found {len(messages)} messages using pagination endpoint")
-                    return json_response
-                else:
-                    print("INFO: Pagination endpoint didn't return expected format")
-            else:
-                print(f"INFO: Pagination endpoint failed: HTTP {response.status_code}")
-        except Exception as e:
-            print(f"INFO: Pagination endpoint failed: {e}")
-        
-        # Pattern 3: Try conversation details endpoint (might include messages)
-        try:
-            url = f"https://{host}/api/2.0/genie/spaces/{space_id}/conversations/{conversation_id}"
-            response = requests.get(url, headers={"Authorization": f"Bearer {user_token}"})
-            
-            if response.status_code == 200:
-                json_response = response.json()
-                if isinstance(json_response, dict):
-                    if 'messages' in json_response:
-                        messages = json_response['messages']
-                        print(f"INFO: Found {len(messages)} messages in conversation details")
-                        return json_response
-                    elif 'message_count' in json_response:
-                        print(f"INFO: Conversation has {json_response['message_count']} messages but no message list")
-                        # Return a structure indicating we found message count but no list
-                        return {
-                            'messages': [],
-                            'message_count': json_response['message_count'],
-                            'note': 'Message count available but individual messages not accessible via this endpoint'
-                        }
-                    else:
-                        print("INFO: Conversation details endpoint didn't include messages")
-                else:
-                    print("INFO: Conversation details endpoint didn't return expected format")
-            else:
-                print(f"INFO: Conversation details endpoint failed: HTTP {response.status_code}")
-        except Exception as e:
-            print(f"INFO: Conversation details endpoint failed: {e}")
-        
-        # Pattern 4: Try alternative messages endpoint structure
-        try:
-            url = f"https://{host}/api/2.0/genie/conversations/{conversation_id}/messages"
-            response = requests.get(url, headers={"Authorization": f"Bearer {user_token}"})
-            
-            if response.status_code == 200:
-                json_response = response.json()
-                if isinstance(json_response, dict) and 'messages' in json_response:
-                    messages = json_response['messages']
-                    print(f"INFO: Found {len(messages)} messages using alternative endpoint")
-                    return json_response
-                else:
-                    print("INFO: Alternative messages endpoint didn't return expected format")
-            else:
-                print(f"INFO: Alternative messages endpoint failed: HTTP {response.status_code}")
-        except Exception as e:
-            print(f"INFO: Alternative messages endpoint failed: {e}")
-        
-        # If all patterns fail, return None
-        print("WARNING: All message listing patterns failed - messages endpoint may not be available")
-        return None
-            
+        if page_token:
+            load = lambda: next(
+                iter_genie_messages_obo(space_id, conversation_id, user_token, page_token, max_pages=1), None
+            )
+        else:
+            load = lambda: list_messages(
+                lambda path: fetch_obo(path, user_token), cfg.host, "obo", space_id, conversation_id
+            )
+        identity = get_token_identity(user_token)
+        if identity is None:
+            return load()
+        return singleflight.do((identity, "messages", space_id, conversation_id, page_token), load)
     except Exception as e:
         print(f"ERROR: Failed to get messages with OBO: {e}")
         return None
@@ -0,0 +1,97 @@
+"""Compare the pandas-based result conversion with the Arrow-native one.
+
+Each conversion runs in its own process so peak memory can be read from
+the process's max RSS. Usage:
+
+    python benchmarks/result_conversion.py --rows 100000 --columns 200
+"""
+import argparse
+import datetime
+import decimal
+import os
+import resource
+import subprocess
+import sys
+import time
+
+import pandas as pd
+import pyarrow as pa
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from arrow_format import format_arrow_table, to_records  # noqa: E402
+
+
+def make_table(rows, columns):
+    """Synthetic result with a mix of the column types a warehouse returns"""
+    base = datetime.datetime(2024, 1, 1)
+    generators = [
+        lambda i: pa.array(range(i, i + rows), pa.int64()),
+        lambda i: pa.array([float(n) / 7 for n in range(rows)], pa.float64()),
+        lambda i: pa.array([f"value-{n % 1000}" for n in range(rows)], pa.string()),
+        lambda i: pa.array([base + datetime.timedelta(seconds=n) for n in range(rows)], pa.timestamp("us")),
+        lambda i: pa.array([decimal.Decimal(n) / 100 for n in range(rows)], pa.decimal128(12, 2)),
+        lambda i: pa.array([base.date() + datetime.timedelta(days=n % 365) for n in range(rows)], pa.date32()),
+        lambda i: pa.array([[n, n + 1] for n in range(rows)], pa.list_(pa.int64())),
+        lambda i: pa.array([f"b{n % 100}".encode() for n in range(rows)], pa.binary()),
+    ]
+    arrays = [generators[i % len(generators)](i) for i in range(columns)]
+    return pa.table(arrays, names=[f"c{i}" for i in range(columns)])
+
+
+def convert_pandas(table):
+    """The previous run_query conversion followed by the callbacks' to_dict"""
+    df = table.to_pandas()
+    for col in df.columns:
+        if pd.api.types.is_datetime64_any_dtype(df[col]) or pd.api.types.is_timedelta64_dtype(df[col]):
+            try:
+                df[col] = pd.to_datetime(df[col]).dt.strftime("%Y-%m-%d %H:%M:%S")
+            except Exception:
+                df[col] = df[col].astype(str)
+        elif isinstance(df[col].dtype, (pd.ArrowDtype)):
+            df[col] = df[col].astype(str)
+        elif not pd.api.types.is_numeric_dtype(df[col]) and not pd.api.types.is_string_dtype(df[col]):
+            df[col] = df[col].astype(str)
+    return df.to_dict("records")
+
+
+def convert_arrow(table):
+    return to_records(format_arrow_table(table))
+
+
+def run_one(mode, rows, columns):
+    table = make_table(rows, columns)
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    records = convert_pandas(table) if mode == "pandas" else convert_arrow(table)
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    assert len(records) == rows
+    # ru_maxrss is reported in kilobytes on Linux
+    print(f"{elapsed:.3f} {(peak - baseline) / 1024:.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--columns", type=int, default=200)
+    parser.add_argument("--mode", choices=["pandas", "arrow"])
+    args = parser.parse_args()
+
+    if args.mode:
+        run_one(args.mode, args.rows, args.columns)
+        return
+
+    print(f"{args.rows} rows x {args.columns} columns")
+    for mode in ("pandas", "arrow"):
+        output = subprocess.run(
+            [sys.executable, __file__, "--mode", mode, "--rows", str(args.rows), "--columns", str(args.columns)],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout.split()
+        print(f"  {mode:<7} {float(output[0]):8.2f}s  peak +{float(output[1]):8.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
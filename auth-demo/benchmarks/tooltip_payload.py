@@ -0,0 +1,62 @@
+"""Compare the JSON size of per-cell tooltips with tooltips for long cells only.
+
+The rows are built with the same synthetic table as result_conversion.py
+and serialized the way a callback response carries them. Usage:
+
+    python benchmarks/tooltip_payload.py --rows 1000 --columns 50
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from arrow_format import format_arrow_table, to_records  # noqa: E402
+from result_conversion import make_table  # noqa: E402
+from utils import TOOLTIP_MIN_LENGTH, build_tooltips  # noqa: E402
+
+
+def all_cell_tooltips(records):
+    """The previous tooltip_data, one markdown tooltip for every cell"""
+    return [
+        {
+            column: {"value": str(value), "type": "markdown"}
+            for column, value in row.items()
+        }
+        for row in records
+    ]
+
+
+def measure(build, records):
+    start = time.perf_counter()
+    tooltips = build(records)
+    payload = json.dumps(tooltips)
+    return len(payload), time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--columns", type=int, default=50)
+    parser.add_argument("--min-length", type=int, default=TOOLTIP_MIN_LENGTH)
+    args = parser.parse_args()
+
+    records = to_records(format_arrow_table(make_table(args.rows, args.columns)))
+    data_bytes = len(json.dumps(records))
+    print(f"{args.rows} rows x {args.columns} columns, data {data_bytes / 1024:,.1f} KiB")
+    for name, build in (
+        ("all cells", all_cell_tooltips),
+        (f">= {args.min_length} chars", lambda rows: build_tooltips(rows, args.min_length)),
+    ):
+        size, elapsed = measure(build, records)
+        total = data_bytes + size
+        print(
+            f"  {name:<14} tooltips {size / 1024:10,.1f} KiB  "
+            f"data+tooltips {total / 1024:10,.1f} KiB  {elapsed * 1000:8.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
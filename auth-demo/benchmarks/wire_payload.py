@@ -0,0 +1,62 @@
+"""Compare callback payload size and serialization time across wire formats.
+
+Rows are built with the same synthetic table as result_conversion.py and
+serialized with plotly's encoder, which Dash uses for callback responses,
+once with the standard-library engine and once with orjson. Each payload
+is then compressed as the Flask server would. Usage:
+
+    python benchmarks/wire_payload.py --rows 1000 --columns 50
+"""
+import argparse
+import gzip
+import os
+import sys
+import time
+
+import brotli
+from plotly.io.json import to_json_plotly
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from arrow_format import format_arrow_table, to_records  # noqa: E402
+from result_conversion import make_table  # noqa: E402
+import wire  # noqa: E402
+
+
+def timed(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return result, (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--columns", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    table = format_arrow_table(make_table(args.rows, args.columns))
+    records = to_records(table)
+    columnar = {"columns": table.column_names, "values": [column.to_pylist() for column in table.columns]}
+    assert columnar == wire.to_table_payload(table.column_names, records)
+
+    print(f"{args.rows} rows x {args.columns} columns")
+    print(f"  {'payload':<9} {'engine':<7} {'json':>10} {'encode':>9} {'gzip':>10} {'brotli':>10} {'compress':>9}")
+    for name, payload in (("records", {"data": records}), ("columnar", {"data": columnar})):
+        for engine in ("json", "orjson"):
+            body, encode = timed(lambda: to_json_plotly(payload, engine=engine).encode(), args.repeat)
+            gzipped, gzip_time = timed(lambda: gzip.compress(body, compresslevel=wire.WIRE_GZIP_LEVEL), args.repeat)
+            brotlied, brotli_time = timed(
+                lambda: brotli.compress(body, quality=wire.WIRE_BROTLI_QUALITY, mode=brotli.MODE_TEXT), args.repeat
+            )
+            print(
+                f"  {name:<9} {engine:<7} {len(body) / 1024:8,.1f}Ki {encode * 1000:7.1f}ms "
+                f"{len(gzipped) / 1024:8,.1f}Ki {len(brotlied) / 1024:8,.1f}Ki "
+                f"{gzip_time * 1000:4.1f}/{brotli_time * 1000:.1f}ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+from collections import OrderedDict
+import functools
+import json
+import threading
+import time
+
+import singleflight
+
+_stats_lock = threading.Lock()
+_stats = {}
+
+
+def _count(name, field):
+    with _stats_lock:
+        _stats[name][field] += 1
+
+
+def get_cache_stats():
+    """Report hit/miss counters for every registered cache"""
+    with _stats_lock:
+        return {name: dict(counts) for name, counts in _stats.items()}
+
+
+def background_ttl_cache(ttl, cache_if=None):
+    """Memoize a zero-argument function process-wide for ttl seconds.
+
+    Once a value exists it is always served immediately; an expired value is
+    refreshed on a background thread while callers keep getting the last one.
+    Results rejected by cache_if are returned but not kept. The wrapped
+    function gets an invalidate() hook that forces the next call to reload.
+    """
+    def decorator(func):
+        name = func.__name__
+        lock = threading.Lock()
+        state = {"has_value": False, "value": None, "expires_at": 0.0, "refreshing": False}
+        with _stats_lock:
+            _stats[name] = {"hits": 0, "misses": 0, "stale_hits": 0, "refreshes": 0}
+
+        def store(value):
+            if cache_if is None or cache_if(value):
+                with lock:
+                    state.update(has_value=True, value=value, expires_at=time.monotonic() + ttl)
+
+        def refresh():
+            try:
+                store(func())
+                _count(name, "refreshes")
+            except Exception as e:
+                print(f"ERROR: Background refresh of {name} failed: {e}")
+            finally:
+                with lock:
+                    state["refreshing"] = False
+
+        @functools.wraps(func)
+        def wrapper():
+            with lock:
+                has_value = state["has_value"]
+                value = state["value"]
+                expired = time.monotonic() >= state["expires_at"]
+                start_refresh = has_value and expired and not state["refreshing"]
+                if start_refresh:
+                    state["refreshing"] = True
+
+            if not has_value:
+                _count(name, "misses")
+                # Concurrent cold callers share a single load
+                def load():
+                    result = func()
+                    store(result)
+                    return result
+                return singleflight.do(("ttl_cache", name), load)
+
+            if start_refresh:
+                threading.Thread(target=refresh, name=f"refresh-{name}", daemon=True).start()
+            _count(name, "stale_hits" if expired else "hits")
+            return value
+
+        def invalidate():
+            with lock:
+                state.update(has_value=False, value=None, expires_at=0.0)
+
+        wrapper.invalidate = invalidate
+        return wrapper
+
+    return decorator
+
+
+class LRUTTLCache:
+    """Thread-safe LRU cache whose entries expire after ttl seconds.
+
+    Size is bounded both by entry count and by the approximate JSON size of
+    the stored values.
+    """
+
+    def __init__(self, name, ttl, max_entries, max_bytes):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+        with _stats_lock:
+            _stats[name] = {
+                "hits": 0,
+                "misses": 0,
+                "stale_hits": 0,
+                "evictions": 0,
+                "entries": 0,
+                "bytes": 0,
+                "hit_bytes": 0,
+            }
+
+    def get(self, key):
+        # Expired entries are kept until evicted so get_stale() can still serve them
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() >= entry[1]:
+                self._update_stats(misses=1)
+                return None
+            self._entries.move_to_end(key)
+            # hit_bytes counts what hits saved from being fetched again
+            self._update_stats(hits=1, hit_bytes=entry[2])
+            return entry[0]
+
+    def get_stale(self, key):
+        """Return a value even if its TTL has passed, for use when the source is unavailable"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._update_stats(stale_hits=1, hit_bytes=entry[2])
+            return entry[0]
+
+    def set(self, key, value):
+        size = _estimate_size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, time.monotonic() + self.ttl, size)
+            self._bytes += size
+            evicted = 0
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                evicted += 1
+            self._update_stats(evictions=evicted)
+
+    def invalidate(self, match=None):
+        """Drop every entry, or only those whose key satisfies match(key)"""
+        with self._lock:
+            for key in [k for k in self._entries if match is None or match(k)]:
+                self._remove(key)
+            self._update_stats()
+
+    def _remove(self, key):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def _update_stats(self, **increments):
+        with _stats_lock:
+            counts = _stats[self.name]
+            for field, amount in increments.items():
+                counts[field] += amount
+            counts["entries"] = len(self._entries)
+            counts["bytes"] = self._bytes
+
+
+def _estimate_size(value):
+    try:
+        return len(json.dumps(value, default=str))
+    except (TypeError, ValueError):
+        return len(str(value))
@@ -1,11 +1,85 @@
 import dash
 import dash_mantine_components as dmc
-from dash import Input, Output, callback, html
+from dash import Input, Output, State, callback, ctx, html
 import jwt
 import json
 
 from auth import fetch_sp_details
-from sql import fetch_warehouses
+from sql import fetch_warehouse_states, fetch_warehouses, find_running_warehouse, get_warehouse_state, start_eta
+
+
+# The initial load is split so the identity panel paints from request headers
+# alone while the warehouse list and SP name load in their own requests
+@callback(
+    [
+        Output("sql-http-path", "data"),
+        Output("sql-http-path", "value"),
+        Output("sql-http-path", "placeholder"),
+    ],
+    Input("initial-load-trigger", "children"),
+    Input("warehouse-state-interval", "n_intervals"),
+)
+def update_warehouses(_, n_intervals):
+    wh_options, wh_value = fetch_warehouses()
+    states = fetch_warehouse_states() or {}
+    wh_options = [
+        {**option, "label": f"{option['label']} · {states[option['value']]['state']}"}
+        if option.get("value") in states
+        else option
+        for option in wh_options
+    ]
+    # Refreshing the states must not change the user's selection
+    if ctx.triggered_id == "warehouse-state-interval":
+        return wh_options, dash.no_update, dash.no_update
+    # Start on a running warehouse when there is one, to avoid a cold start
+    running = find_running_warehouse()
+    return wh_options, running[0] if running else wh_value, "Select a warehouse"
+
+
+@callback(
+    [
+        Output("warehouse-state", "children"),
+        Output("use-running-warehouse", "children"),
+        Output("use-running-warehouse", "style"),
+        Output("running-warehouse-suggestion", "data"),
+    ],
+    Input("sql-http-path", "value"),
+    Input("warehouse-state-interval", "n_intervals"),
+)
+def update_warehouse_state(http_path, n_intervals):
+    info = get_warehouse_state(http_path) if http_path else None
+    if info is None:
+        return "", "", {"display": "none"}, None
+    state = info["state"]
+    if state == "RUNNING":
+        return "Warehouse is running.", "", {"display": "none"}, None
+    message = f"Warehouse is {state.lower()}; queries wait until it is running (about {start_eta(info['id']):.0f}s)."
+    running = find_running_warehouse(exclude=http_path)
+    if running is None:
+        return message, "", {"display": "none"}, None
+    return message, f"Use {running[1]} (running)", {"display": "inline-block"}, running[0]
+
+
+@callback(
+    Output("sql-http-path", "value", allow_duplicate=True),
+    Input("use-running-warehouse", "n_clicks"),
+    State("running-warehouse-suggestion", "data"),
+    prevent_initial_call=True,
+)
+def use_running_warehouse(n_clicks, http_path):
+    return http_path or dash.no_update
+
+
+@callback(
+    [
+        Output("sp-name-display", "children"),
+        Output("sp-name-display-genie", "children"),
+    ],
+    Input("initial-load-trigger", "children"),
+)
+def update_sp_name(_):
+    sp_name = fetch_sp_details()
+    return sp_name, sp_name
 
 
 @callback(
@@ -17,15 +91,11 @@ from sql import fetch_warehouses
         Output("run-query-obo", "disabled"),
         Output("obo-token-store", "data"),
         Output("obo-username", "children"),
-        Output("sql-http-path", "data"),
-        Output("sql-http-path", "value"),
-        Output("sp-name-display", "children"),
         Output("jwt-raw-token", "children"),
         Output("jwt-decoded", "children"),
         Output("jwt-scopes-list", "children"),
         Output("accordion-container", "style"),
         # Genie-specific outputs
-        Output("sp-name-display-genie", "children"),
         Output("obo-username-genie", "children"),
         Output("obo-token-status-genie", "children"),
         Output("obo-token-status-genie", "color"),
@@ -34,13 +104,7 @@ from sql import fetch_warehouses
     ],
     Input("initial-load-trigger", "children"),
 )
-def update_header_and_warehouses(_):
-    # Call fetch_warehouses() and get the results directly
-    wh_options, wh_value = fetch_warehouses()
-
-    # Call fetch_sp_details() and get the result directly
-    sp_name = fetch_sp_details()
-
+def update_header(_):
     header_username_display = ["User: ", dmc.Code("Unknown")]
     obo_status_msg = "Checking OBO status..."
     obo_color = "gray"
@@ -142,14 +206,10 @@ def update_header_and_warehouses(_):
         obo_disabled,  # run-query-obo disabled
         {"token": obo_token} if has_token else {"token": None},  # obo-token-store data
         obo_username,  # obo-username
-        wh_options,  # sql-http-path data
-        wh_value,  # sql-http-path value
-        sp_name,  # sp-name-display
         jwt_raw,  # jwt-raw-token
         jwt_decoded,  # jwt-decoded
         jwt_scopes_list,  # jwt-scopes-list
         accordion_style,  # accordion-container style
-        sp_name,  # sp-name-display-genie
         obo_username,  # OBO username for Genie section
         obo_status_msg,  # OBO status message for Genie section
         obo_color,  # OBO color for Genie section
@@ -1,9 +1,28 @@
 import dash
 import dash_mantine_components as dmc
-from dash import Input, Output, State, callback, html
+from dash import Input, Output, Patch, State, callback, html
+
+from auth import (
+    get_genie_conversations_obo,
+    get_genie_conversations_sp,
+    get_genie_space_obo,
+    get_genie_space_sp,
+    get_genie_spaces_obo,
+    get_genie_spaces_sp,
+    get_sp_identity,
+    get_token_identity,
+    get_user_token,
+)
+from genie_index import get_conversation_id, get_space_id, record_conversations, record_spaces, resolve_space_title
+from jobs import BACKGROUND_POLL_INTERVAL
+from utils import create_genie_list, create_genie_list_items
 
-from auth import get_genie_spaces_sp, get_genie_spaces_obo, get_genie_conversations_sp, get_genie_conversations_obo, get_user_token
-from utils import create_genie_list
+
+def _next_page(next_page_token, space_id, shown):
+    """Page store data and "Load more" button style once shown conversations are listed"""
+    if not next_page_token:
+        return None, {"display": "none"}
+    return {"space_id": space_id, "next_page_token": next_page_token, "shown": shown}, {"display": "block"}
 
 
 @callback(
@@ -19,6 +38,11 @@ from utils import create_genie_list
         Output("alert-genie-sp", "hide"),
     ],
     Input("list-spaces-sp", "n_clicks"),
+    running=[
+        (Output("list-spaces-sp", "loading"), True, False),
+    ],
+    background=True,
+    interval=BACKGROUND_POLL_INTERVAL,
     prevent_initial_call=True,
 )
 def list_spaces_sp_callback(n_clicks):
@@ -67,6 +91,7 @@ def list_spaces_sp_callback(n_clicks):
         
         # Check for proper response structure
         if isinstance(spaces_data, dict) and 'spaces' in spaces_data and len(spaces_data['spaces']) > 0:
+            record_spaces(get_sp_identity(), spaces_data['spaces'])
             spaces_list = create_genie_list(spaces_data['spaces'])
             alert_msg = [
                 "Success! Found ",
@@ -79,7 +104,7 @@ def list_spaces_sp_callback(n_clicks):
             # Enable conversations button if spaces found
             conversations_disabled = len(spaces_data['spaces']) == 0
             # Create dropdown options for spaces
-            space_options = [{"label": space.get('title', 'Unknown Space'), "value": space.get('id') or space.get('space_id') or space.get('_id') or space.get('genie_space_id')} for space in spaces_data['spaces']]
+            space_options = [{"label": space.get('title', 'Unknown Space'), "value": get_space_id(space)} for space in spaces_data['spaces']]
             space_selector_style = {"display": "block"}
             
             return spaces_list, container_style, conversations_disabled, space_options, space_selector_style, alert_msg, alert_color, alert_title, False
@@ -136,12 +161,19 @@ def list_spaces_sp_callback(n_clicks):
         Output("conversation-selector-sp", "data"),
         Output("conversation-selector-sp", "style"),
         Output("list-messages-sp", "disabled"),
+        Output("conversations-page-sp", "data"),
+        Output("more-conversations-sp", "style"),
         Output("alert-genie-sp", "children", allow_duplicate=True),
         Output("alert-genie-sp", "color", allow_duplicate=True),
         Output("alert-genie-sp", "title", allow_duplicate=True),
     ],
     Input("list-conversations-sp", "n_clicks"),
     State("space-selector-sp", "value"),
+    running=[
+        (Output("list-conversations-sp", "loading"), True, False),
+    ],
+    background=True,
+    interval=BACKGROUND_POLL_INTERVAL,
     prevent_initial_call=True,
 )
 def list_conversations_sp_callback(n_clicks, selected_space_id):
@@ -153,27 +185,24 @@ def list_conversations_sp_callback(n_clicks, selected_space_id):
         alert_msg = "Please select a space first."
         alert_color = "yellow"
         alert_title = "No Space Selected"
-        return "", {"display": "none"}, alert_msg, alert_color, alert_title
+        return "", {"display": "none"}, dash.no_update, dash.no_update, dash.no_update, None, {"display": "none"}, alert_msg, alert_color, alert_title
     
     container_style = {"display": "none"}
     
     try:
-        # Get space details to find the name
-        spaces_data = get_genie_spaces_sp()
-        space_name = "Unknown Space"
-        if spaces_data and 'spaces' in spaces_data:
-            for space in spaces_data['spaces']:
-                space_id = space.get('id') or space.get('space_id') or space.get('_id') or space.get('genie_space_id')
-                if space_id == selected_space_id:
-                    space_name = space.get('title', 'Unknown Space')
-                    break
+        # Resolve the space name from the title index
+        identity = get_sp_identity()
+        space_name = resolve_space_title(
+            identity, selected_space_id, lambda: get_genie_space_sp(selected_space_id)
+        )
         
         conv_data = get_genie_conversations_sp(selected_space_id)
         if conv_data and 'conversations' in conv_data:
+            record_conversations(identity, selected_space_id, conv_data['conversations'])
             conversations_list = create_genie_list(conv_data['conversations'], 'title', 'id')
             
             # Create dropdown options for conversations
-            conversation_options = [{"label": conv.get('title', 'Unknown Conversation'), "value": conv.get('id') or conv.get('conversation_id') or conv.get('_id') or conv.get('genie_conversation_id')} for conv in conv_data['conversations']]
+            conversation_options = [{"label": conv.get('title', 'Unknown Conversation'), "value": get_conversation_id(conv)} for conv in conv_data['conversations']]
             conversation_selector_style = {"display": "block"}
             messages_disabled = len(conv_data['conversations']) == 0
             
@@ -184,21 +213,26 @@ def list_conversations_sp_callback(n_clicks, selected_space_id):
                 dmc.Code(space_name),
                 " using Service Principal credentials.",
             ]
+            page_state, more_style = _next_page(
+                conv_data.get('next_page_token'), selected_space_id, len(conv_data['conversations'])
+            )
+            if page_state:
+                alert_msg += [html.Br(), "More conversations can be loaded below the list."]
             alert_color = "green"
             alert_title = "Conversations Retrieved"
             container_style = {"display": "block"}
-            return conversations_list, container_style, conversation_options, conversation_selector_style, messages_disabled, alert_msg, alert_color, alert_title
+            return conversations_list, container_style, conversation_options, conversation_selector_style, messages_disabled, page_state, more_style, alert_msg, alert_color, alert_title
         else:
             alert_msg = f"No conversations found in space {space_name}."
             alert_color = "yellow"
             alert_title = "No Conversations"
             conversation_selector_style = {"display": "none"}
-            return "", container_style, [], conversation_selector_style, True, alert_msg, alert_color, alert_title
+            return "", container_style, [], conversation_selector_style, True, None, {"display": "none"}, alert_msg, alert_color, alert_title
     except Exception as e:
         alert_msg = ["Error retrieving conversations with Service Principal: ", dmc.Code(str(e))]
         alert_color = "red"
         alert_title = "Error"
-        return "", container_style, alert_msg, alert_color, alert_title
+        return "", container_style, dash.no_update, dash.no_update, dash.no_update, None, {"display": "none"}, alert_msg, alert_color, alert_title
 
 
 @callback(
@@ -214,6 +248,11 @@ def list_conversations_sp_callback(n_clicks, selected_space_id):
         Output("alert-genie-obo", "hide"),
     ],
     Input("list-spaces-obo", "n_clicks"),
+    running=[
+        (Output("list-spaces-obo", "loading"), True, False),
+    ],
+    background=True,
+    interval=BACKGROUND_POLL_INTERVAL,
     prevent_initial_call=True,
 )
 def list_spaces_obo_callback(n_clicks):
@@ -256,6 +295,7 @@ def list_spaces_obo_callback(n_clicks):
         
         # Check for proper response structure
         if isinstance(spaces_data, dict) and 'spaces' in spaces_data and len(spaces_data['spaces']) > 0:
+            record_spaces(get_token_identity(user_token), spaces_data['spaces'])
             spaces_list = create_genie_list(spaces_data['spaces'])
             alert_msg = [
                 "Success! Found ",
@@ -268,7 +308,7 @@ def list_spaces_obo_callback(n_clicks):
             # Enable conversations button if spaces found
             conversations_disabled = len(spaces_data['spaces']) == 0
             # Create dropdown options for spaces
-            space_options = [{"label": space.get('title', 'Unknown Space'), "value": space.get('id') or space.get('space_id') or space.get('_id') or space.get('genie_space_id')} for space in spaces_data['spaces']]
+            space_options = [{"label": space.get('title', 'Unknown Space'), "value": get_space_id(space)} for space in spaces_data['spaces']]
             space_selector_style = {"display": "block"}
             
             return spaces_list, container_style, conversations_disabled, space_options, space_selector_style, alert_msg, alert_color, alert_title, False
@@ -325,12 +365,19 @@ def list_spaces_obo_callback(n_clicks):
         Output("conversation-selector-obo", "data"),
         Output("conversation-selector-obo", "style"),
         Output("list-messages-obo", "disabled"),
+        Output("conversations-page-obo", "data"),
+        Output("more-conversations-obo", "style"),
         Output("alert-genie-obo", "children", allow_duplicate=True),
         Output("alert-genie-obo", "color", allow_duplicate=True),
         Output("alert-genie-obo", "title", allow_duplicate=True),
     ],
     Input("list-conversations-obo", "n_clicks"),
     State("space-selector-obo", "value"),
+    running=[
+        (Output("list-conversations-obo", "loading"), True, False),
+    ],
+    background=True,
+    interval=BACKGROUND_POLL_INTERVAL,
     prevent_initial_call=True,
 )
 def list_conversations_obo_callback(n_clicks, selected_space_id):
@@ -342,7 +389,7 @@ def list_conversations_obo_callback(n_clicks, selected_space_id):
         alert_msg = "Please select a space first."
         alert_color = "yellow"
         alert_title = "No Space Selected"
-        return "", {"display": "none"}, alert_msg, alert_color, alert_title
+        return "", {"display": "none"}, dash.no_update, dash.no_update, dash.no_update, None, {"display": "none"}, alert_msg, alert_color, alert_title
     
     container_style = {"display": "none"}
     
@@ -356,24 +403,21 @@ def list_conversations_obo_callback(n_clicks, selected_space_id):
             ]
             alert_color = "red"
             alert_title = "OBO Token Missing"
-            return "", container_style, alert_msg, alert_color, alert_title
+            return "", container_style, dash.no_update, dash.no_update, dash.no_update, None, {"display": "none"}, alert_msg, alert_color, alert_title
             
-        # Get space details to find the name
-        spaces_data = get_genie_spaces_obo(user_token)
-        space_name = "Unknown Space"
-        if spaces_data and 'spaces' in spaces_data:
-            for space in spaces_data['spaces']:
-                space_id = space.get('id') or space.get('space_id') or space.get('_id') or space.get('genie_space_id')
-                if space_id == selected_space_id:
-                    space_name = space.get('title', 'Unknown Space')
-                    break
+        # Resolve the space name from the title index
+        identity = get_token_identity(user_token)
+        space_name = resolve_space_title(
+            identity, selected_space_id, lambda: get_genie_space_obo(selected_space_id, user_token)
+        )
         
         conv_data = get_genie_conversations_obo(selected_space_id, user_token)
         if conv_data and 'conversations' in conv_data:
+            record_conversations(identity, selected_space_id, conv_data['conversations'])
             conversations_list = create_genie_list(conv_data['conversations'], 'title', 'id')
             
             # Create dropdown options for conversations
-            conversation_options = [{"label": conv.get('title', 'Unknown Conversation'), "value": conv.get('id') or conv.get('conversation_id') or conv.get('_id') or conv.get('genie_conversation_id')} for conv in conv_data['conversations']]
+            conversation_options = [{"label": conv.get('title', 'Unknown Conversation'), "value": get_conversation_id(conv)} for conv in conv_data['conversations']]
             conversation_selector_style = {"display": "block"}
             messages_disabled = len(conv_data['conversations']) == 0
             
@@ -384,18 +428,118 @@ def list_conversations_obo_callback(n_clicks, selected_space_id):
                 dmc.Code(space_name),
                 " using OBO authorization.",
             ]
+            page_state, more_style = _next_page(
+                conv_data.get('next_page_token'), selected_space_id, len(conv_data['conversations'])
+            )
+            if page_state:
+                alert_msg += [html.Br(), "More conversations can be loaded below the list."]
             alert_color = "green"
             alert_title = "Conversations Retrieved"
             container_style = {"display": "block"}
-            return conversations_list, container_style, conversation_options, conversation_selector_style, messages_disabled, alert_msg, alert_color, alert_title
+            return conversations_list, container_style, conversation_options, conversation_selector_style, messages_disabled, page_state, more_style, alert_msg, alert_color, alert_title
         else:
             alert_msg = f"No conversations found in space {space_name} with OBO authorization."
             alert_color = "yellow"
             alert_title = "No Conversations"
             conversation_selector_style = {"display": "none"}
-            return "", container_style, [], conversation_selector_style, True, alert_msg, alert_color, alert_title
+            return "", container_style, [], conversation_selector_style, True, None, {"display": "none"}, alert_msg, alert_color, alert_title
     except Exception as e:
         alert_msg = ["Error retrieving conversations with OBO: ", dmc.Code(str(e))]
         alert_color = "red"
         alert_title = "Error"
-        return "", container_style, alert_msg, alert_color, alert_title
+        return "", container_style, dash.no_update, dash.no_update, dash.no_update, None, {"display": "none"}, alert_msg, alert_color, alert_title
+
+
+def _append_conversations(identity, page_state, conv_data, auth_label):
+    """Outputs that append a further page of conversations to the list and the selector"""
+    space_id = page_state["space_id"]
+    if not conv_data or 'conversations' not in conv_data:
+        alert_msg = f"Could not load more conversations with {auth_label}; try again."
+        return dash.no_update, dash.no_update, dash.no_update, dash.no_update, alert_msg, "red", "Error"
+
+    conversations = conv_data['conversations']
+    record_conversations(identity, space_id, conversations)
+    conversations_list = Patch()
+    conversations_list["props"]["children"].extend(create_genie_list_items(conversations, 'title', 'id'))
+    conversation_options = Patch()
+    conversation_options.extend(
+        [{"label": conv.get('title', 'Unknown Conversation'), "value": get_conversation_id(conv)} for conv in conversations]
+    )
+    shown = page_state.get("shown", 0) + len(conversations)
+    new_state, more_style = _next_page(conv_data.get('next_page_token'), space_id, shown)
+    alert_msg = ["Showing ", html.B(f"{shown}"), f" conversations using {auth_label}."]
+    if new_state is None:
+        alert_msg.append(" All conversations are loaded.")
+    return conversations_list, conversation_options, new_state, more_style, alert_msg, "green", "Conversations Retrieved"
+
+
+@callback(
+    [
+        Output("conversations-output-sp", "children", allow_duplicate=True),
+        Output("conversation-selector-sp", "data", allow_duplicate=True),
+        Output("conversations-page-sp", "data", allow_duplicate=True),
+        Output("more-conversations-sp", "style", allow_duplicate=True),
+        Output("alert-genie-sp", "children", allow_duplicate=True),
+        Output("alert-genie-sp", "color", allow_duplicate=True),
+        Output("alert-genie-sp", "title", allow_duplicate=True),
+    ],
+    Input("more-conversations-sp", "n_clicks"),
+    State("conversations-page-sp", "data"),
+    running=[
+        (Output("more-conversations-sp", "loading"), True, False),
+    ],
+    background=True,
+    interval=BACKGROUND_POLL_INTERVAL,
+    prevent_initial_call=True,
+)
+def more_conversations_sp_callback(n_clicks, page_state):
+    """Append the next page of conversations using Service Principal credentials"""
+    if not n_clicks or not page_state:
+        return dash.no_update
+
+    try:
+        conv_data = get_genie_conversations_sp(page_state["space_id"], page_state["next_page_token"])
+        return _append_conversations(get_sp_identity(), page_state, conv_data, "Service Principal credentials")
+    except Exception as e:
+        alert_msg = ["Error retrieving more conversations with Service Principal: ", dmc.Code(str(e))]
+        return dash.no_update, dash.no_update, dash.no_update, dash.no_update, alert_msg, "red", "Error"
+
+
+@callback(
+    [
+        Output("conversations-output-obo", "children", allow_duplicate=True),
+        Output("conversation-selector-obo", "data", allow_duplicate=True),
+        Output("conversations-page-obo", "data", allow_duplicate=True),
+        Output("more-conversations-obo", "style", allow_duplicate=True),
+        Output("alert-genie-obo", "children", allow_duplicate=True),
+        Output("alert-genie-obo", "color", allow_duplicate=True),
+        Output("alert-genie-obo", "title", allow_duplicate=True),
+    ],
+    Input("more-conversations-obo", "n_clicks"),
+    State("conversations-page-obo", "data"),
+    running=[
+        (Output("more-conversations-obo", "loading"), True, False),
+    ],
+    background=True,
+    interval=BACKGROUND_POLL_INTERVAL,
+    prevent_initial_call=True,
+)
+def more_conversations_obo_callback(n_clicks, page_state):
+    """Append the next page of conversations using On-Behalf-Of (OBO) credentials"""
+    if not n_clicks or not page_state:
+        return dash.no_update
+
+    try:
+        user_token = get_user_token()
+        if not user_token:
+            alert_msg = [
+                "Error: ",
+                dmc.InlineCodeHighlight(code="X-Forwarded-Access-Token"),
+                " not found. Cannot access Genie API with OBO.",
+            ]
+            return dash.no_update, dash.no_update, dash.no_update, dash.no_update, alert_msg, "red", "OBO Token Missing"
+        conv_data = get_genie_conversations_obo(page_state["space_id"], user_token, page_state["next_page_token"])
+        return _append_conversations(get_token_identity(user_token), page_state, conv_data, "OBO authorization")
+    except Exception as e:
+        alert_msg = ["Error retrieving more conversations with OBO: ", dmc.Code(str(e))]
+        return dash.no_update, dash.no_update, dash.no_update, dash.no_update, alert_msg, "red", "Error"
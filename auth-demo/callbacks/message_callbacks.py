@@ -1,15 +1,44 @@
 import dash
 import dash_mantine_components as dmc
-from dash import Input, Output, State, callback, html
+from dash import Input, Output, Patch, State, callback, html
 
-from auth import get_genie_messages_sp, get_genie_messages_obo, get_genie_spaces_sp, get_genie_spaces_obo, get_user_token
-from utils import create_genie_messages_list
+from auth import (
+    get_genie_conversation_obo,
+    get_genie_conversation_sp,
+    get_genie_messages_obo,
+    get_genie_messages_sp,
+    get_genie_space_obo,
+    get_genie_space_sp,
+    get_sp_identity,
+    get_token_identity,
+    get_user_token,
+)
+from genie_index import resolve_conversation_title, resolve_space_title
+from jobs import BACKGROUND_POLL_INTERVAL
+from utils import create_genie_message_cards, create_genie_messages_list
+
+
+def _next_page(messages_data, space_id, conversation_id, shown):
+    """Page store data and "Load more" button style once shown messages are listed"""
+    next_page_token = messages_data.get('next_page_token') if isinstance(messages_data, dict) else None
+    # A count-only answer has no list to append further messages to
+    if not next_page_token or not shown:
+        return None, {"display": "none"}
+    state = {
+        "space_id": space_id,
+        "conversation_id": conversation_id,
+        "next_page_token": next_page_token,
+        "shown": shown,
+    }
+    return state, {"display": "block"}
 
 
 @callback(
     [
         Output("messages-output-sp", "children"),
         Output("messages-container-sp", "style"),
+        Output("messages-page-sp", "data"),
+        Output("more-messages-sp", "style"),
         Output("alert-genie-sp", "children", allow_duplicate=True),
         Output("alert-genie-sp", "color", allow_duplicate=True),
         Output("alert-genie-sp", "title", allow_duplicate=True),
@@ -17,6 +46,11 @@ from utils import create_genie_messages_list
     Input("list-messages-sp", "n_clicks"),
     State("space-selector-sp", "value"),
     State("conversation-selector-sp", "value"),
+    running=[
+        (Output("list-messages-sp", "loading"), True, False),
+    ],
+    background=True,
+    interval=BACKGROUND_POLL_INTERVAL,
     prevent_initial_call=True,
 )
 def list_messages_sp_callback(n_clicks, selected_space_id, selected_conversation_id):
@@ -28,41 +62,35 @@ def list_messages_sp_callback(n_clicks, selected_space_id, selected_conversation
         alert_msg = "Please select a space first."
         alert_color = "yellow"
         alert_title = "No Space Selected"
-        return "", {"display": "none"}, alert_msg, alert_color, alert_title
+        return "", {"display": "none"}, None, {"display": "none"}, alert_msg, alert_color, alert_title
     
     if not selected_conversation_id:
         alert_msg = "Please select a conversation first."
         alert_color = "yellow"
         alert_title = "No Conversation Selected"
-        return "", {"display": "none"}, alert_msg, alert_color, alert_title
+        return "", {"display": "none"}, None, {"display": "none"}, alert_msg, alert_color, alert_title
     
     container_style = {"display": "none"}
     
     try:
-        # Get space and conversation details to find the names
-        spaces_data = get_genie_spaces_sp()
-        space_name = "Unknown Space"
-        conversation_name = "Unknown Conversation"
-        
-        if spaces_data and 'spaces' in spaces_data:
-            for space in spaces_data['spaces']:
-                space_id = space.get('id') or space.get('space_id') or space.get('_id') or space.get('genie_space_id')
-                if space_id == selected_space_id:
-                    space_name = space.get('title', 'Unknown Space')
-                    # Get conversations to find conversation name
-                    from auth import get_genie_conversations_sp
-                    convs_data = get_genie_conversations_sp(selected_space_id)
-                    if convs_data and 'conversations' in convs_data:
-                        for conv in convs_data['conversations']:
-                            conv_id = conv.get('id') or conv.get('conversation_id') or conv.get('_id') or conv.get('genie_conversation_id')
-                            if conv_id == selected_conversation_id:
-                                conversation_name = conv.get('title', 'Unknown Conversation')
-                                break
-                    break
+        # Resolve display names from the title index
+        identity = get_sp_identity()
+        space_name = resolve_space_title(
+            identity, selected_space_id, lambda: get_genie_space_sp(selected_space_id)
+        )
+        conversation_name = resolve_conversation_title(
+            identity,
+            selected_space_id,
+            selected_conversation_id,
+            lambda: get_genie_conversation_sp(selected_space_id, selected_conversation_id),
+        )
         
         messages_data = get_genie_messages_sp(selected_space_id, selected_conversation_id)
         if messages_data and 'messages' in messages_data:
             messages_list = create_genie_messages_list(messages_data['messages'])
+            page_state, more_style = _next_page(
+                messages_data, selected_space_id, selected_conversation_id, len(messages_data['messages'])
+            )
             alert_msg = [
                 "Success! Found ",
                 html.B(f"{len(messages_data['messages'])}"),
@@ -75,23 +103,27 @@ def list_messages_sp_callback(n_clicks, selected_space_id, selected_conversation
             alert_color = "green"
             alert_title = "Messages Retrieved"
             container_style = {"display": "block"}
-            return messages_list, container_style, alert_msg, alert_color, alert_title
+            if page_state:
+                alert_msg += [html.Br(), "More messages can be loaded below the list."]
+            return messages_list, container_style, page_state, more_style, alert_msg, alert_color, alert_title
         else:
             alert_msg = f"No messages found in conversation {conversation_name} in space {space_name}."
             alert_color = "yellow"
             alert_title = "No Messages"
-            return "", container_style, alert_msg, alert_color, alert_title
+            return "", container_style, None, {"display": "none"}, alert_msg, alert_color, alert_title
     except Exception as e:
         alert_msg = ["Error retrieving messages with Service Principal: ", dmc.Code(str(e))]
         alert_color = "red"
         alert_title = "Error"
-        return "", container_style, alert_msg, alert_color, alert_title
+        return "", container_style, None, {"display": "none"}, alert_msg, alert_color, alert_title
 
 
 @callback(
     [
         Output("messages-output-obo", "children"),
         Output("messages-container-obo", "style"),
+        Output("messages-page-obo", "data"),
+        Output("more-messages-obo", "style"),
         Output("alert-genie-obo", "children", allow_duplicate=True),
         Output("alert-genie-obo", "color", allow_duplicate=True),
         Output("alert-genie-obo", "title", allow_duplicate=True),
@@ -99,6 +131,11 @@ def list_messages_sp_callback(n_clicks, selected_space_id, selected_conversation
     Input("list-messages-obo", "n_clicks"),
     State("space-selector-obo", "value"),
     State("conversation-selector-obo", "value"),
+    running=[
+        (Output("list-messages-obo", "loading"), True, False),
+    ],
+    background=True,
+    interval=BACKGROUND_POLL_INTERVAL,
     prevent_initial_call=True,
 )
 def list_messages_obo_callback(n_clicks, selected_space_id, selected_conversation_id):
@@ -110,13 +147,13 @@ def list_messages_obo_callback(n_clicks, selected_space_id, selected_conversatio
         alert_msg = "Please select a space first."
         alert_color = "yellow"
         alert_title = "No Space Selected"
-        return "", {"display": "none"}, alert_msg, alert_color, alert_title
+        return "", {"display": "none"}, None, {"display": "none"}, alert_msg, alert_color, alert_title
     
     if not selected_conversation_id:
         alert_msg = "Please select a conversation first."
         alert_color = "yellow"
         alert_title = "No Conversation Selected"
-        return "", {"display": "none"}, alert_msg, alert_color, alert_title
+        return "", {"display": "none"}, None, {"display": "none"}, alert_msg, alert_color, alert_title
     
     container_style = {"display": "none"}
     
@@ -130,32 +167,26 @@ def list_messages_obo_callback(n_clicks, selected_space_id, selected_conversatio
             ]
             alert_color = "red"
             alert_title = "OBO Token Missing"
-            return "", container_style, alert_msg, alert_color, alert_title
+            return "", container_style, None, {"display": "none"}, alert_msg, alert_color, alert_title
         
-        # Get space and conversation details to find the names
-        spaces_data = get_genie_spaces_obo(user_token)
-        space_name = "Unknown Space"
-        conversation_name = "Unknown Conversation"
-        
-        if spaces_data and 'spaces' in spaces_data:
-            for space in spaces_data['spaces']:
-                space_id = space.get('id') or space.get('space_id') or space.get('_id') or space.get('genie_space_id')
-                if space_id == selected_space_id:
-                    space_name = space.get('title', 'Unknown Space')
-                    # Get conversations to find conversation name
-                    from auth import get_genie_conversations_obo
-                    convs_data = get_genie_conversations_obo(selected_space_id, user_token)
-                    if convs_data and 'conversations' in convs_data:
-                        for conv in convs_data['conversations']:
-                            conv_id = conv.get('id') or conv.get('conversation_id') or conv.get('_id') or conv.get('genie_conversation_id')
-                            if conv_id == selected_conversation_id:
-                                conversation_name = conv.get('title', 'Unknown Conversation')
-                                break
-                    break
+        # Resolve display names from the title index
+        identity = get_token_identity(user_token)
+        space_name = resolve_space_title(
+            identity, selected_space_id, lambda: get_genie_space_obo(selected_space_id, user_token)
+        )
+        conversation_name = resolve_conversation_title(
+            identity,
+            selected_space_id,
+            selected_conversation_id,
+            lambda: get_genie_conversation_obo(selected_space_id, selected_conversation_id, user_token),
+        )
         
         messages_data = get_genie_messages_obo(selected_space_id, selected_conversation_id, user_token)
         if messages_data and 'messages' in messages_data:
             messages_list = create_genie_messages_list(messages_data['messages'])
+            page_state, more_style = _next_page(
+                messages_data, selected_space_id, selected_conversation_id, len(messages_data['messages'])
+            )
             alert_msg = [
                 "Success! Found ",
                 html.B(f"{len(messages_data['messages'])}"),
@@ -168,14 +199,109 @@ def list_messages_obo_callback(n_clicks, selected_space_id, selected_conversatio
             alert_color = "green"
             alert_title = "Messages Retrieved"
             container_style = {"display": "block"}
-            return messages_list, container_style, alert_msg, alert_color, alert_title
+            if page_state:
+                alert_msg += [html.Br(), "More messages can be loaded below the list."]
+            return messages_list, container_style, page_state, more_style, alert_msg, alert_color, alert_title
         else:
             alert_msg = f"No messages found in conversation {conversation_name} in space {space_name} with OBO authorization."
             alert_color = "yellow"
             alert_title = "No Messages"
-            return "", container_style, alert_msg, alert_color, alert_title
+            return "", container_style, None, {"display": "none"}, alert_msg, alert_color, alert_title
     except Exception as e:
         alert_msg = ["Error retrieving messages with OBO: ", dmc.Code(str(e))]
         alert_color = "red"
         alert_title = "Error"
-        return "", container_style, alert_msg, alert_color, alert_title
+        return "", container_style, None, {"display": "none"}, alert_msg, alert_color, alert_title
+
+
+def _append_messages(page_state, messages_data, auth_label):
+    """Outputs that append a further page of messages to the list"""
+    if not messages_data or 'messages' not in messages_data:
+        alert_msg = f"Could not load more messages with {auth_label}; try again."
+        return dash.no_update, dash.no_update, dash.no_update, alert_msg, "red", "Error"
+
+    messages = messages_data['messages']
+    messages_list = Patch()
+    messages_list["props"]["children"].extend(create_genie_message_cards(messages))
+    shown = page_state.get("shown", 0) + len(messages)
+    new_state, more_style = _next_page(
+        messages_data, page_state["space_id"], page_state["conversation_id"], shown
+    )
+    alert_msg = ["Showing ", html.B(f"{shown}"), f" messages using {auth_label}."]
+    if new_state is None:
+        alert_msg.append(" All messages are loaded.")
+    return messages_list, new_state, more_style, alert_msg, "green", "Messages Retrieved"
+
+
+@callback(
+    [
+        Output("messages-output-sp", "children", allow_duplicate=True),
+        Output("messages-page-sp", "data", allow_duplicate=True),
+        Output("more-messages-sp", "style", allow_duplicate=True),
+        Output("alert-genie-sp", "children", allow_duplicate=True),
+        Output("alert-genie-sp", "color", allow_duplicate=True),
+        Output("alert-genie-sp", "title", allow_duplicate=True),
+    ],
+    Input("more-messages-sp", "n_clicks"),
+    State("messages-page-sp", "data"),
+    running=[
+        (Output("more-messages-sp", "loading"), True, False),
+    ],
+    background=True,
+    interval=BACKGROUND_POLL_INTERVAL,
+    prevent_initial_call=True,
+)
+def more_messages_sp_callback(n_clicks, page_state):
+    """Append the next page of messages using Service Principal credentials"""
+    if not n_clicks or not page_state:
+        return dash.no_update
+
+    try:
+        messages_data = get_genie_messages_sp(
+            page_state["space_id"], page_state["conversation_id"], page_state["next_page_token"]
+        )
+        return _append_messages(page_state, messages_data, "Service Principal credentials")
+    except Exception as e:
+        alert_msg = ["Error retrieving more messages with Service Principal: ", dmc.Code(str(e))]
+        return dash.no_update, dash.no_update, dash.no_update, alert_msg, "red", "Error"
+
+
+@callback(
+    [
+        Output("messages-output-obo", "children", allow_duplicate=True),
+        Output("messages-page-obo", "data", allow_duplicate=True),
+        Output("more-messages-obo", "style", allow_duplicate=True),
+        Output("alert-genie-obo", "children", allow_duplicate=True),
+        Output("alert-genie-obo", "color", allow_duplicate=True),
+        Output("alert-genie-obo", "title", allow_duplicate=True),
+    ],
+    Input("more-messages-obo", "n_clicks"),
+    State("messages-page-obo", "data"),
+    running=[
+        (Output("more-messages-obo", "loading"), True, False),
+    ],
+    background=True,
+    interval=BACKGROUND_POLL_INTERVAL,
+    prevent_initial_call=True,
+)
+def more_messages_obo_callback(n_clicks, page_state):
+    """Append the next page of messages using On-Behalf-Of (OBO) credentials"""
+    if not n_clicks or not page_state:
+        return dash.no_update
+
+    try:
+        user_token = get_user_token()
+        if not user_token:
+            alert_msg = [
+                "Error: ",
+                dmc.InlineCodeHighlight(code="X-Forwarded-Access-Token"),
+                " not found. Cannot access Genie API with OBO.",
+            ]
+            return dash.no_update, dash.no_update, dash.no_update, alert_msg, "red", "OBO Token Missing"
+        messages_data = get_genie_messages_obo(
+            page_state["space_id"], page_state["conversation_id"], user_token, page_state["next_page_token"]
+        )
+        return _append_messages(page_state, messages_data, "OBO authorization")
+    except Exception as e:
+        alert_msg = ["Error retrieving more messages with OBO: ", dmc.Code(str(e))]
+        return dash.no_update, dash.no_update, dash.no_update, alert_msg, "red", "Error"
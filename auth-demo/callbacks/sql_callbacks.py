@@ -1,14 +1,25 @@
+import uuid
+
 import dash
 import dash_mantine_components as dmc
-from dash import Input, Output, State, callback, html
+from dash import Input, Output, State, callback, clientside_callback, ctx, html, set_props
 
-from auth import cfg, get_connection_obo, get_connection_sp
-from sql import run_query
+from auth import cfg, get_connection_obo, get_connection_sp, get_sp_identity, get_token_identity
+from jobs import BACKGROUND_POLL_INTERVAL, sql_manager
+from sql import (
+    RESULT_BLOCK_SIZE,
+    QueryCancelledError,
+    cancel_queries,
+    fetch_page,
+    get_query_progress,
+)
+from utils import build_tooltips
+from wire import to_table_payload
 
 
 @callback(
     [
-        Output("table-output-sp", "data"),
+        Output("table-data-sp", "data"),
         Output("table-output-sp", "columns"),
         Output("table-output-sp", "tooltip_data"),
         Output("alert-sp", "children"),
@@ -18,21 +29,65 @@ from sql import run_query
         Output("table-container-sp", "style"),
         Output("loading-overlay-sp", "visible"),
         Output("run-query-sp", "loading"),
+        Output("table-output-sp", "page_current"),
+        Output("table-output-sp", "page_count"),
+        Output("table-output-sp", "sort_by"),
+        Output("table-output-sp", "filter_query"),
     ],
     Input("run-query-sp", "n_clicks"),
+    Input("refresh-query-sp", "n_clicks"),
+    Input("table-output-sp", "page_current"),
+    Input("table-output-sp", "sort_by"),
+    Input("table-output-sp", "filter_query"),
+    State("table-output-sp", "page_size"),
     State("sql-http-path", "value"),
     State("table-name-input", "value"),
+    State("query-session-store", "data"),
     running=[
         (Output("run-query-sp", "loading"), True, False),
+        (Output("cancel-query-sp", "disabled"), False, True),
+        (Output("refresh-query-sp", "disabled"), True, False),
     ],
+    background=True,
+    manager=sql_manager,
+    cancel=[Input("cancel-query-sp", "n_clicks")],
+    progress=[
+        Output("warehouse-wait-sp", "children"),
+        Output("warehouse-wait-bar-sp", "value"),
+        Output("warehouse-wait-bar-sp", "style"),
+    ],
+    progress_default=["", 0, {"display": "none"}],
+    interval=BACKGROUND_POLL_INTERVAL,
     prevent_initial_call=True,
 )
-def run_sp_query_callback(n_clicks, http_path, table_name):
+def run_sp_query_callback(
+    set_progress,
+    n_clicks,
+    refresh_clicks,
+    page_current,
+    sort_by,
+    filter_query,
+    page_size,
+    http_path,
+    table_name,
+    query_session,
+):
     container_style = {"display": "none"}
     loading_visible = False
 
     if not n_clicks or not http_path or not table_name:
-        return dash.no_update + (False, False)
+        return (dash.no_update,) * 8 + (False, False) + (dash.no_update,) * 4
+
+    # A new run clears sorting and filtering, and any change other than paging
+    # starts again from the first page
+    new_run = ctx.triggered_id == "run-query-sp"
+    if new_run:
+        sort_by, filter_query = [], ""
+    # Refresh re-reads the current page from the warehouse, bypassing cached results
+    refresh = ctx.triggered_id == "refresh-query-sp"
+    keep_page = refresh or "table-output-sp.page_current" in ctx.triggered_prop_ids
+    page = (page_current or 0) if keep_page else 0
+    sort_outputs = ([], "") if new_run else (dash.no_update, dash.no_update)
 
     if not cfg:
         return (
@@ -50,40 +105,50 @@ def run_sp_query_callback(n_clicks, http_path, table_name):
             container_style,
             False,
             False,
-        )
+            0,
+            None,
+        ) + sort_outputs
 
     loading_visible = True
 
     alert_hide = False
 
     try:
-        conn = get_connection_sp(http_path)
-        df = run_query(table_name, conn)
-        conn.close()
+        session = (query_session, "sp") if query_session else None
+        column_names, data, has_more = fetch_page(
+            table_name,
+            lambda: get_connection_sp(http_path),
+            get_sp_identity(),
+            http_path,
+            page,
+            page_size,
+            sort_by,
+            filter_query,
+            session=session,
+            refresh=refresh,
+            on_wait=_warehouse_progress(set_progress),
+            on_queue=_queue_alert("alert-sp"),
+        )
         loading_visible = False
+        # The total is only known once the last page has been reached
+        page_count = None if has_more else page + 1
 
-        if not df.empty:
-            data = df.to_dict("records")
-            columns = [{"name": i, "id": i} for i in df.columns]
-            tooltips = [
-                {
-                    column: {"value": str(value), "type": "markdown"}
-                    for column, value in row.items()
-                }
-                for row in data
-            ]
+        columns = [{"name": i, "id": i} for i in column_names]
+
+        if data:
+            tooltips = build_tooltips(data)
             alert_msg = [
-                "Success! Fetched ",
-                html.B(f"{len(df)}"),
-                " rows from ",
+                "Success! Showing rows ",
+                html.B(f"{page * page_size + 1}–{page * page_size + len(data)}"),
+                " from ",
                 dmc.Code(f"{table_name}"),
                 " using the service principal's permissions.",
-            ]
+            ] + _paging_note(sort_by, page, page_size)
             alert_color = "green"
             alert_title = "Success"
             container_style = {"display": "block"}
             return (
-                data,
+                to_table_payload(column_names, data),
                 columns,
                 tooltips,
                 alert_msg,
@@ -93,7 +158,9 @@ def run_sp_query_callback(n_clicks, http_path, table_name):
                 container_style,
                 loading_visible,
                 False,
-            )
+                page,
+                page_count,
+            ) + sort_outputs
         else:
             alert_msg = [
                 "Query ran successfully using Service Principal but returned no data from ",
@@ -103,9 +170,10 @@ def run_sp_query_callback(n_clicks, http_path, table_name):
             alert_color = "yellow"
             alert_title = "No Data"
             container_style = {"display": "block"}
+            # Keep the columns so a filter that matches nothing can be edited
             return (
                 [],
-                [],
+                columns,
                 [],
                 alert_msg,
                 alert_color,
@@ -114,7 +182,28 @@ def run_sp_query_callback(n_clicks, http_path, table_name):
                 container_style,
                 loading_visible,
                 False,
-            )
+                page,
+                page_count,
+            ) + sort_outputs
+
+    except QueryCancelledError:
+        alert_msg = "Query cancelled."
+        alert_color = "yellow"
+        alert_title = "Cancelled"
+        container_style = {"display": "none"} if new_run else {"display": "block"}
+        table_outputs = ([], [], []) if new_run else (dash.no_update,) * 3
+        return (
+            *table_outputs,
+            alert_msg,
+            alert_color,
+            alert_hide,
+            alert_title,
+            container_style,
+            False,
+            False,
+            0,
+            None,
+        ) + sort_outputs
 
     except Exception as e:
         alert_msg = [
@@ -124,10 +213,10 @@ def run_sp_query_callback(n_clicks, http_path, table_name):
         alert_color = "red"
         alert_title = "Error"
         container_style = {"display": "block"}
+        # A bad sort or filter leaves the current table in place to be corrected
+        table_outputs = ([], [], []) if new_run else (dash.no_update,) * 3
         return (
-            [],
-            [],
-            [],
+            *table_outputs,
             alert_msg,
             alert_color,
             alert_hide,
@@ -135,12 +224,14 @@ def run_sp_query_callback(n_clicks, http_path, table_name):
             container_style,
             False,
             False,
-        )
+            0,
+            None,
+        ) + sort_outputs
 
 
 @callback(
     [
-        Output("table-output-obo", "data"),
+        Output("table-data-obo", "data"),
         Output("table-output-obo", "columns"),
         Output("table-output-obo", "tooltip_data"),
         Output("alert-obo", "children"),
@@ -150,22 +241,67 @@ def run_sp_query_callback(n_clicks, http_path, table_name):
         Output("table-container-obo", "style"),
         Output("loading-overlay-obo", "visible"),
         Output("run-query-obo", "loading"),
+        Output("table-output-obo", "page_current"),
+        Output("table-output-obo", "page_count"),
+        Output("table-output-obo", "sort_by"),
+        Output("table-output-obo", "filter_query"),
     ],
     Input("run-query-obo", "n_clicks"),
+    Input("refresh-query-obo", "n_clicks"),
+    Input("table-output-obo", "page_current"),
+    Input("table-output-obo", "sort_by"),
+    Input("table-output-obo", "filter_query"),
+    State("table-output-obo", "page_size"),
     State("sql-http-path", "value"),
     State("table-name-input", "value"),
     State("obo-token-store", "data"),
+    State("query-session-store", "data"),
     running=[
         (Output("run-query-obo", "loading"), True, False),
+        (Output("cancel-query-obo", "disabled"), False, True),
+        (Output("refresh-query-obo", "disabled"), True, False),
+    ],
+    background=True,
+    manager=sql_manager,
+    cancel=[Input("cancel-query-obo", "n_clicks")],
+    progress=[
+        Output("warehouse-wait-obo", "children"),
+        Output("warehouse-wait-bar-obo", "value"),
+        Output("warehouse-wait-bar-obo", "style"),
     ],
+    progress_default=["", 0, {"display": "none"}],
+    interval=BACKGROUND_POLL_INTERVAL,
     prevent_initial_call=True,
 )
-def run_obo_query_callback(n_clicks, http_path, table_name, obo_data):
+def run_obo_query_callback(
+    set_progress,
+    n_clicks,
+    refresh_clicks,
+    page_current,
+    sort_by,
+    filter_query,
+    page_size,
+    http_path,
+    table_name,
+    obo_data,
+    query_session,
+):
     container_style = {"display": "none"}
     loading_visible = False
 
     if not n_clicks or not http_path or not table_name:
-        return dash.no_update + (False, False)
+        return (dash.no_update,) * 8 + (False, False) + (dash.no_update,) * 4
+
+    # A new run clears sorting and filtering, and any change other than paging
+    # starts again from the first page
+    new_run = ctx.triggered_id == "run-query-obo"
+    if new_run:
+        sort_by, filter_query = [], ""
+    # Refresh re-reads the current page from the warehouse, bypassing cached results
+    refresh = ctx.triggered_id == "refresh-query-obo"
+    keep_page = refresh or "table-output-obo.page_current" in ctx.triggered_prop_ids
+    page = (page_current or 0) if keep_page else 0
+    sort_outputs = ([], "") if new_run else (dash.no_update, dash.no_update)
 
     if not obo_data or not obo_data.get("token"):
         return (
@@ -181,7 +317,9 @@ def run_obo_query_callback(n_clicks, http_path, table_name, obo_data):
             container_style,
             False,
             False,
-        )
+            0,
+            None,
+        ) + sort_outputs
 
     loading_visible = True
 
@@ -189,33 +327,42 @@ def run_obo_query_callback(n_clicks, http_path, table_name, obo_data):
 
     try:
         user_token = obo_data.get("token")
-        conn = get_connection_obo(http_path, user_token)
-        df = run_query(table_name, conn)
-        conn.close()
+        session = (query_session, "obo") if query_session else None
+        column_names, data, has_more = fetch_page(
+            table_name,
+            lambda: get_connection_obo(http_path, user_token),
+            # Cached rows are only reused for the exact token that read them
+            get_token_identity(user_token),
+            http_path,
+            page,
+            page_size,
+            sort_by,
+            filter_query,
+            session=session,
+            refresh=refresh,
+            on_wait=_warehouse_progress(set_progress),
+            on_queue=_queue_alert("alert-obo"),
+        )
         loading_visible = False
+        # The total is only known once the last page has been reached
+        page_count = None if has_more else page + 1
 
-        if not df.empty:
-            data = df.to_dict("records")
-            columns = [{"name": i, "id": i} for i in df.columns]
-            tooltips = [
-                {
-                    column: {"value": str(value), "type": "markdown"}
-                    for column, value in row.items()
-                }
-                for row in data
-            ]
+        columns = [{"name": i, "id": i} for i in column_names]
+
+        if data:
+            tooltips = build_tooltips(data)
             alert_msg = [
-                "Success! Fetched ",
-                html.B(f"{len(df)}"),
-                " rows from ",
+                "Success! Showing rows ",
+                html.B(f"{page * page_size + 1}–{page * page_size + len(data)}"),
+                " from ",
                 dmc.Code(f"{table_name}"),
                 " using your OBO identity.",
-            ]
+            ] + _paging_note(sort_by, page, page_size)
             alert_color = "green"
             alert_title = "Success"
             container_style = {"display": "block"}
             return (
-                data,
+                to_table_payload(column_names, data),
                 columns,
                 tooltips,
                 alert_msg,
@@ -225,7 +372,9 @@ def run_obo_query_callback(n_clicks, http_path, table_name, obo_data):
                 container_style,
                 loading_visible,
                 False,
-            )
+                page,
+                page_count,
+            ) + sort_outputs
         else:
             alert_msg = [
                 "Query ran successfully using OBO but returned no data from ",
@@ -235,9 +384,10 @@ def run_obo_query_callback(n_clicks, http_path, table_name, obo_data):
             alert_color = "yellow"
             alert_title = "No Data"
             container_style = {"display": "block"}
+            # Keep the columns so a filter that matches nothing can be edited
             return (
                 [],
-                [],
+                columns,
                 [],
                 alert_msg,
                 alert_color,
@@ -246,7 +396,28 @@ def run_obo_query_callback(n_clicks, http_path, table_name, obo_data):
                 container_style,
                 loading_visible,
                 False,
-            )
+                page,
+                page_count,
+            ) + sort_outputs
+
+    except QueryCancelledError:
+        alert_msg = "Query cancelled."
+        alert_color = "yellow"
+        alert_title = "Cancelled"
+        container_style = {"display": "none"} if new_run else {"display": "block"}
+        table_outputs = ([], [], []) if new_run else (dash.no_update,) * 3
+        return (
+            *table_outputs,
+            alert_msg,
+            alert_color,
+            alert_hide,
+            alert_title,
+            container_style,
+            False,
+            False,
+            0,
+            None,
+        ) + sort_outputs
 
     except Exception as e:
         alert_msg = [
@@ -256,10 +427,10 @@ def run_obo_query_callback(n_clicks, http_path, table_name, obo_data):
         alert_color = "red"
         alert_title = "Error"
         container_style = {"display": "block"}
+        # A bad sort or filter leaves the current table in place to be corrected
+        table_outputs = ([], [], []) if new_run else (dash.no_update,) * 3
         return (
-            [],
-            [],
-            [],
+            *table_outputs,
             alert_msg,
             alert_color,
             alert_hide,
@@ -267,4 +438,190 @@ def run_obo_query_callback(n_clicks, http_path, table_name, obo_data):
             container_style,
             False,
             False,
-        )
+            0,
+            None,
+        ) + sort_outputs
+
+
+# Queries are cancelled per browser page load, not per identity, so users
+# sharing the service principal never cancel each other's runs
+@callback(
+    Output("query-session-store", "data"),
+    Input("initial-load-trigger", "children"),
+    State("query-session-store", "data"),
+)
+def init_query_session(_, query_session):
+    return query_session or uuid.uuid4().hex
+
+
+@callback(
+    Input("cancel-query-sp", "n_clicks"),
+    State("query-session-store", "data"),
+    prevent_initial_call=True,
+)
+def cancel_sp_query_callback(n_clicks, query_session):
+    if query_session:
+        cancel_queries((query_session, "sp"))
+
+
+@callback(
+    Input("cancel-query-obo", "n_clicks"),
+    State("query-session-store", "data"),
+    prevent_initial_call=True,
+)
+def cancel_obo_query_callback(n_clicks, query_session):
+    if query_session:
+        cancel_queries((query_session, "obo"))
+
+
+# Leaving the page cancels this session's runs; sendBeacon still delivers during unload
+clientside_callback(
+    """
+    function(querySession) {
+        if (querySession && !window._querySessionBeacon) {
+            window._querySessionBeacon = true;
+            window.addEventListener("pagehide", function() {
+                navigator.sendBeacon("_cancel_queries/" + querySession);
+            });
+        }
+    }
+    """,
+    Input("query-session-store", "data"),
+)
+
+
+# A run for a table or warehouse the user has since moved away from is abandoned
+@callback(
+    Input("table-name-input", "value"),
+    Input("sql-http-path", "value"),
+    State("query-session-store", "data"),
+    prevent_initial_call=True,
+)
+def cancel_superseded_queries(table_name, http_path, query_session):
+    if query_session:
+        cancel_queries((query_session, "sp"))
+        cancel_queries((query_session, "obo"))
+
+
+# Rows arrive as column arrays when WIRE_COLUMNAR is on and are rebuilt in the browser
+_EXPAND_TABLE_DATA = """
+function(payload) {
+    if (!payload || Array.isArray(payload)) {
+        return payload || [];
+    }
+    const rows = [];
+    const length = payload.values.length ? payload.values[0].length : 0;
+    for (let i = 0; i < length; i++) {
+        const row = {};
+        payload.columns.forEach(function(column, j) {
+            row[column] = payload.values[j][i];
+        });
+        rows.push(row);
+    }
+    return rows;
+}
+"""
+
+clientside_callback(
+    _EXPAND_TABLE_DATA,
+    Output("table-output-sp", "data"),
+    Input("table-data-sp", "data"),
+)
+
+clientside_callback(
+    _EXPAND_TABLE_DATA,
+    Output("table-output-obo", "data"),
+    Input("table-data-obo", "data"),
+)
+
+
+def _warehouse_progress(set_progress):
+    """on_wait for fetch_page that shows the warehouse's state and estimated wait"""
+
+    def on_wait(warehouse_wait):
+        if warehouse_wait is None:
+            set_progress(("", 0, {"display": "none"}))
+            return
+        state, waited, expected = warehouse_wait
+        eta = max(expected - waited, 0)
+        message = f"Warehouse is {state.lower()}; query queued, about {eta:.0f}s left…"
+        # The bar never fills while the warehouse is still starting, however long it takes
+        percent = min(max(100 * waited / expected, 5), 95) if expected else 50
+        set_progress((message, percent, {"display": "block"}))
+
+    return on_wait
+
+
+def _queue_alert(alert_id):
+    """on_queue for fetch_page that shows the run's place in the admission queue in the alert"""
+
+    def on_queue(queue_position):
+        if queue_position is None:
+            set_props(alert_id, {"children": "A query slot is free; fetching rows…", "title": "Running"})
+            return
+        position, depth = queue_position
+        set_props(alert_id, {
+            "children": [
+                "Other queries are using every slot on this warehouse. Your query is ",
+                html.B(f"number {position} of {depth}"),
+                " in the queue and starts as soon as a slot frees up.",
+            ],
+            "color": "blue",
+            "title": "Queued",
+            "hide": False,
+        })
+
+    return on_queue
+
+
+def _paging_note(sort_by, page, page_size):
+    """Alert text for unsorted pages that come from a later block statement than the first page"""
+    if sort_by or (page + 1) * page_size <= RESULT_BLOCK_SIZE:
+        return []
+    return [
+        html.Br(),
+        f"Rows past the first {RESULT_BLOCK_SIZE:,} are read by a separate query, and without a sort "
+        "the warehouse may return them in a different order, so rows can repeat or be missing. "
+        "Sort by a unique column to page through the whole table reliably.",
+    ]
+
+
+def _format_progress(progress):
+    if not progress:
+        return ""
+    if progress.get("cancelled"):
+        return f"Cancelled after {progress['rows']:,} rows · {progress['elapsed']:.1f}s"
+    if progress.get("queue_position") and not progress["done"]:
+        position, depth = progress["queue_position"]
+        return f"Queued behind other queries · position {position} of {depth}"
+    status = "Fetched" if progress["done"] else "Fetching…"
+    return f"{status} {progress['rows']:,} rows · {progress['bytes'] / 1024:,.1f} KB · {progress['elapsed']:.1f}s"
+
+
+# The interval is switched on while a run is in flight and polls until the
+# streamed block has finished arriving, even after the first page is shown
+@callback(
+    Output("query-progress-sp", "children"),
+    Output("query-progress-interval-sp", "disabled"),
+    Input("query-progress-interval-sp", "n_intervals"),
+    Input("run-query-sp", "loading"),
+    State("query-session-store", "data"),
+    prevent_initial_call=True,
+)
+def poll_sp_query_progress(n_intervals, loading, query_session):
+    # Progress is per page load, since every user of the service principal shares its identity
+    progress = get_query_progress((query_session, "sp")) if query_session else None
+    return _format_progress(progress), not loading and (progress is None or progress["done"])
+
+
+@callback(
+    Output("query-progress-obo", "children"),
+    Output("query-progress-interval-obo", "disabled"),
+    Input("query-progress-interval-obo", "n_intervals"),
+    Input("run-query-obo", "loading"),
+    State("query-session-store", "data"),
+    prevent_initial_call=True,
+)
+def poll_obo_query_progress(n_intervals, loading, query_session):
+    progress = get_query_progress((query_session, "obo")) if query_session else None
+    return _format_progress(progress), not loading and (progress is None or progress["done"])
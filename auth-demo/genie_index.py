@@ -0,0 +1,64 @@
+import os
+
+from cache import LRUTTLCache
+
+# Titles seen while listing spaces and conversations, per caller identity
+GENIE_INDEX_TTL = float(os.getenv("GENIE_INDEX_TTL", "3600"))
+GENIE_INDEX_MAX_ENTRIES = int(os.getenv("GENIE_INDEX_MAX_ENTRIES", "50000"))
+
+_titles = LRUTTLCache(
+    "genie_title_index",
+    ttl=GENIE_INDEX_TTL,
+    max_entries=GENIE_INDEX_MAX_ENTRIES,
+    max_bytes=GENIE_INDEX_MAX_ENTRIES * 256,
+)
+
+
+def get_space_id(space):
+    return space.get('id') or space.get('space_id') or space.get('_id') or space.get('genie_space_id')
+
+
+def get_conversation_id(conv):
+    return conv.get('id') or conv.get('conversation_id') or conv.get('_id') or conv.get('genie_conversation_id')
+
+
+def record_spaces(identity, spaces):
+    """Index space titles from a spaces listing"""
+    if identity is None:
+        return
+    for space in spaces or []:
+        space_id = get_space_id(space)
+        if space_id and space.get('title'):
+            _titles.set((identity, "space", space_id), space['title'])
+
+
+def record_conversations(identity, space_id, conversations):
+    """Index conversation titles from a conversations listing"""
+    if identity is None:
+        return
+    for conv in conversations or []:
+        conv_id = get_conversation_id(conv)
+        if conv_id and conv.get('title'):
+            _titles.set((identity, "conversation", space_id, conv_id), conv['title'])
+
+
+def _resolve(identity, key, load):
+    title = _titles.get((identity,) + key) if identity is not None else None
+    if title is not None:
+        return title
+
+    details = load()
+    title = details.get('title') if isinstance(details, dict) else None
+    if title and identity is not None:
+        _titles.set((identity,) + key, title)
+    return title
+
+
+def resolve_space_title(identity, space_id, load):
+    """Look up a space title, falling back to load() for a single space on a miss"""
+    return _resolve(identity, ("space", space_id), load) or "Unknown Space"
+
+
+def resolve_conversation_title(identity, space_id, conversation_id, load):
+    """Look up a conversation title, falling back to load() for a single conversation on a miss"""
+    return _resolve(identity, ("conversation", space_id, conversation_id), load) or "Unknown Conversation"
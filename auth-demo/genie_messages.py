@@ -0,0 +1,232 @@
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import os
+import threading
+import time
+
+from pagination import GENIE_PAGE_SIZE
+from rest import CircuitOpenError
+
+# Known message listing endpoints, in the order they are probed
+MESSAGE_PATTERNS = {
+    "standard": (
+        "standard endpoint",
+        "/api/2.0/genie/spaces/{space_id}/conversations/{conversation_id}/messages",
+    ),
+    "pagination": (
+        "pagination endpoint",
+        "/api/2.0/genie/spaces/{space_id}/conversations/{conversation_id}/messages?page_size={page_size}",
+    ),
+    "conversation_details": (
+        "conversation details",
+        "/api/2.0/genie/spaces/{space_id}/conversations/{conversation_id}",
+    ),
+    "alternative": (
+        "alternative endpoint",
+        "/api/2.0/genie/conversations/{conversation_id}/messages",
+    ),
+}
+
+# How long a learned pattern is trusted before it is probed again
+PATTERN_TTL = float(os.getenv("GENIE_PATTERN_TTL", "3600"))
+
+# Probe all patterns in parallel when there is no learned pattern to use
+RACE_ENABLED = os.getenv("GENIE_PATTERN_RACE", "true").lower() == "true"
+RACE_WORKERS = int(os.getenv("GENIE_PATTERN_RACE_WORKERS", "8"))
+
+_race_executor = ThreadPoolExecutor(max_workers=RACE_WORKERS, thread_name_prefix="genie-race")
+_lock = threading.Lock()
+_learned = {}
+_stats = {
+    name: {"attempts": 0, "wins": 0, "failures": 0, "cache_hits": 0}
+    for name in MESSAGE_PATTERNS
+}
+
+
+def _count(name, field):
+    with _lock:
+        _stats[name][field] += 1
+
+
+def get_learned_pattern(host, auth_mode):
+    """Return the remembered pattern for a workspace host and auth mode, if still fresh"""
+    with _lock:
+        entry = _learned.get((host, auth_mode))
+        if not entry:
+            return None
+        name, expires_at = entry
+        if time.monotonic() >= expires_at:
+            del _learned[(host, auth_mode)]
+            return None
+        return name
+
+
+def remember_pattern(host, auth_mode, name):
+    with _lock:
+        _learned[(host, auth_mode)] = (name, time.monotonic() + PATTERN_TTL)
+
+
+def forget_pattern(host, auth_mode):
+    with _lock:
+        _learned.pop((host, auth_mode), None)
+
+
+def get_pattern_stats():
+    """Report per-pattern usage counters and the currently learned patterns"""
+    with _lock:
+        return {
+            "patterns": {name: dict(counts) for name, counts in _stats.items()},
+            "learned": {
+                f"{host} ({auth_mode})": name
+                for (host, auth_mode), (name, _) in _learned.items()
+            },
+        }
+
+
+def parse_messages_response(name, response):
+    """Return a messages payload for a pattern's response, or None if it has no messages"""
+    label = MESSAGE_PATTERNS[name][0]
+    if not isinstance(response, dict):
+        print(f"INFO: {label.capitalize()} didn't return expected format")
+        return None
+
+    if 'messages' in response:
+        print(f"INFO: Found {len(response['messages'])} messages using {label}")
+        return response
+
+    if name == "conversation_details" and 'message_count' in response:
+        print(f"INFO: Conversation has {response['message_count']} messages but no message list")
+        # Return a structure indicating we found message count but no list
+        return {
+            'messages': [],
+            'message_count': response['message_count'],
+            'note': 'Message count available but individual messages not accessible via this endpoint'
+        }
+
+    print(f"INFO: {label.capitalize()} didn't include messages")
+    return None
+
+
+def try_pattern(name, fetch, space_id, conversation_id):
+    """Request a single pattern with fetch(path) and parse the result.
+
+    Raises CircuitOpenError if the pattern's endpoint is failing fast.
+    """
+    label, template = MESSAGE_PATTERNS[name]
+    path = template.format(space_id=space_id, conversation_id=conversation_id, page_size=GENIE_PAGE_SIZE)
+    _count(name, "attempts")
+    try:
+        result = parse_messages_response(name, fetch(path))
+    except CircuitOpenError:
+        # Failing fast says nothing about whether the pattern works
+        raise
+    except Exception as e:
+        print(f"INFO: {label.capitalize()} failed: {e}")
+        result = None
+
+    if result is None:
+        _count(name, "failures")
+    return result
+
+
+def race_patterns(names, fetch, space_id, conversation_id):
+    """Request several patterns at once and return (name, result) for the first with messages.
+
+    A pattern whose circuit is open is skipped; CircuitOpenError is raised
+    only if every pattern was rejected that way.
+    """
+    futures = {
+        _race_executor.submit(try_pattern, name, fetch, space_id, conversation_id): name
+        for name in names
+    }
+    # A count-only answer from the details endpoint is kept as a fallback in
+    # case a pattern with an actual message list is still in flight
+    fallback = (None, None)
+    rejected = []
+    pending = set(futures)
+    try:
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    result = future.result()
+                except CircuitOpenError as e:
+                    rejected.append(e)
+                    continue
+                if result is None:
+                    continue
+                if 'note' not in result:
+                    return futures[future], result
+                if fallback[0] is None:
+                    fallback = (futures[future], result)
+        if fallback[0] is None and rejected and len(rejected) == len(futures):
+            raise rejected[0]
+        return fallback
+    finally:
+        # Slower requests that already started finish in the background and are ignored
+        for future in pending:
+            future.cancel()
+
+
+def probe_patterns(names, fetch, space_id, conversation_id):
+    """Try patterns one after another and return (name, result) for the first that works.
+
+    A pattern whose circuit is open is skipped; CircuitOpenError is raised
+    only if every pattern was rejected that way.
+    """
+    rejected = []
+    for name in names:
+        try:
+            result = try_pattern(name, fetch, space_id, conversation_id)
+        except CircuitOpenError as e:
+            rejected.append(e)
+            continue
+        if result is not None:
+            return name, result
+    if rejected and len(rejected) == len(names):
+        raise rejected[0]
+    return None, None
+
+
+def list_messages(fetch, host, auth_mode, space_id, conversation_id):
+    """List messages, using the learned pattern first and re-probing when it fails.
+
+    Patterns whose circuit is open are passed over; CircuitOpenError is
+    raised only when every pattern was rejected that way.
+    """
+    learned = get_learned_pattern(host, auth_mode)
+    learned_rejected = None
+    if learned:
+        try:
+            result = try_pattern(learned, fetch, space_id, conversation_id)
+        except CircuitOpenError as e:
+            # The pattern may still be right, so it is kept for when the circuit closes
+            print(f"INFO: Learned message pattern '{learned}' is failing fast, trying the others")
+            learned_rejected = e
+        else:
+            if result is not None:
+                _count(learned, "cache_hits")
+                return result
+            print(f"INFO: Learned message pattern '{learned}' failed, re-probing")
+            forget_pattern(host, auth_mode)
+
+    names = [name for name in MESSAGE_PATTERNS if name != learned]
+    try:
+        if RACE_ENABLED:
+            name, result = race_patterns(names, fetch, space_id, conversation_id)
+        else:
+            name, result = probe_patterns(names, fetch, space_id, conversation_id)
+    except CircuitOpenError:
+        if learned and learned_rejected is None:
+            # The learned pattern was reachable, it just found no messages
+            name, result = None, None
+        else:
+            raise
+
+    if result is not None:
+        _count(name, "wins")
+        remember_pattern(host, auth_mode, name)
+        return result
+
+    # If all patterns fail, return None
+    print("WARNING: All message listing patterns failed - messages endpoint may not be available")
+    return None
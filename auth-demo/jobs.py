@@ -0,0 +1,232 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+import os
+import threading
+import time
+import traceback
+import uuid
+
+import dash
+import flask
+from dash.background_callback.managers import BaseBackgroundCallbackManager
+from dash.exceptions import PreventUpdate
+
+# Job functions rebuild the callback context the way Dash's own managers do,
+# which needs private Dash modules. Only these versions have been checked, and
+# pyproject.toml pins dash to match; widen both together after running
+# tests/test_jobs.py against the new version
+SUPPORTED_DASH = ((3, 0), (3, 1))
+
+
+def check_dash_version(version):
+    """Raise if the private Dash modules jobs.py relies on are not known to work in version"""
+    low, high = SUPPORTED_DASH
+    try:
+        major_minor = tuple(int(part) for part in version.split(".")[:2])
+    except ValueError:
+        major_minor = None
+    if major_minor is None or not low <= major_minor < high:
+        raise RuntimeError(
+            f"jobs.ThreadPoolManager supports dash>={low[0]}.{low[1]},<{high[0]}.{high[1]}, "
+            f"found {version}; check its private imports before widening SUPPORTED_DASH"
+        )
+
+
+check_dash_version(dash.__version__)
+
+from dash._callback_context import context_value
+from dash._utils import AttributeDict
+from dash.background_callback._proxy_set_props import ProxySetProps
+
+# SQL and Genie jobs run on separate pools: a SQL job can hold its thread for
+# minutes while a warehouse starts, and must not stall Genie listings
+BACKGROUND_WORKERS = int(os.getenv("BACKGROUND_WORKERS", "8"))
+BACKGROUND_SQL_WORKERS = int(os.getenv("BACKGROUND_SQL_WORKERS", "8"))
+BACKGROUND_RESULT_TTL = float(os.getenv("BACKGROUND_RESULT_TTL", "300"))
+# How often the browser polls a running background callback, in milliseconds
+BACKGROUND_POLL_INTERVAL = int(os.getenv("BACKGROUND_POLL_INTERVAL", "250"))
+
+
+class _Job:
+    def __init__(self):
+        self.future = None
+        self.submitted_at = time.monotonic()
+        self.started_at = None
+
+
+class ThreadPoolManager(BaseBackgroundCallbackManager):
+    """Run background callbacks on a bounded thread pool inside this process.
+
+    The Flask request that starts a job returns at once and the browser polls
+    for the result, so a slow warehouse or Genie call holds a pool thread
+    instead of a server worker. Jobs share this process's connection pools,
+    caches and in-flight queries, and run inside a copy of the starting
+    request's context so OBO headers stay readable. A thread cannot be
+    killed, so terminating a job only discards its result; the callback
+    itself stops any warehouse statement through query cancellation.
+    """
+
+    def __init__(self, max_workers, result_ttl, name="background-callback"):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self.max_workers = max_workers
+        self.result_ttl = result_ttl
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._results = {}
+        self._progress = {}
+        self._updated_props = {}
+        self._stats = {"submitted": 0, "completed": 0, "cancelled": 0, "errors": 0, "expired": 0}
+        super().__init__(None)
+
+    def build_cache_key(self, fn, args, cache_args_to_ignore, triggered):
+        # Results are never shared: two users clicking with identical
+        # arguments must not read each other's OBO results
+        return f"{super().build_cache_key(fn, args, cache_args_to_ignore, triggered)}-{uuid.uuid4().hex}"
+
+    def terminate_job(self, job):
+        if job is None:
+            return
+        with self._lock:
+            entry = self._jobs.pop(job, None)
+            if entry is not None and not entry.future.done():
+                entry.future.cancel()
+                self._stats["cancelled"] += 1
+
+    def terminate_unhealthy_job(self, job):
+        return False
+
+    def job_running(self, job):
+        # A job stays registered until its result is read or it is terminated,
+        # so a result stored between get_result and this check is not lost
+        with self._lock:
+            return job in self._jobs
+
+    def make_job_fn(self, fn, progress, key=None):
+        return _make_job_fn(fn, self, progress)
+
+    def call_job_fn(self, key, job_fn, args, context):
+        job = uuid.uuid4().hex
+        entry = _Job()
+        run = flask.copy_current_request_context(lambda: job_fn(key, job, args, context))
+        with self._lock:
+            self._expire()
+            self._jobs[job] = entry
+            self._stats["submitted"] += 1
+            entry.future = self._executor.submit(run)
+        return job
+
+    def get_progress(self, key):
+        with self._lock:
+            return self._progress.pop(key, None)
+
+    def result_ready(self, key):
+        with self._lock:
+            return key in self._results
+
+    def get_result(self, key, job):
+        with self._lock:
+            result = self._results.pop(key, None)
+            if result is None:
+                return self.UNDEFINED
+            self._progress.pop(key, None)
+        if job:
+            self.terminate_job(job)
+        return result[0]
+
+    def get_updated_props(self, key):
+        with self._lock:
+            return self._updated_props.pop(key, {})
+
+    def stats(self):
+        with self._lock:
+            running = sum(1 for entry in self._jobs.values() if entry.started_at and not entry.future.done())
+            return {
+                **self._stats,
+                "max_workers": self.max_workers,
+                "running": running,
+                "queued": sum(1 for entry in self._jobs.values() if entry.started_at is None),
+                "unread_results": len(self._results),
+            }
+
+    def _start(self, job):
+        with self._lock:
+            entry = self._jobs.get(job)
+            if entry is None:
+                return False
+            entry.started_at = time.monotonic()
+            return True
+
+    def _finish(self, job, key, output, errored):
+        with self._lock:
+            # A terminated job's result is dropped; nobody is polling for it
+            if job not in self._jobs:
+                return
+            self._results[key] = (output, time.monotonic())
+            self._stats["errors" if errored else "completed"] += 1
+
+    def _set_progress(self, key, value):
+        with self._lock:
+            self._progress[key] = value
+
+    def _set_props(self, key, component_id, props):
+        with self._lock:
+            self._updated_props.setdefault(key, {}).setdefault(component_id, {}).update(props)
+
+    def _expire(self):
+        """Drop results and jobs a browser stopped polling for; called with the lock held"""
+        cutoff = time.monotonic() - self.result_ttl
+        for key in [key for key, (_, stored_at) in self._results.items() if stored_at < cutoff]:
+            del self._results[key]
+            self._progress.pop(key, None)
+            self._updated_props.pop(key, None)
+            self._stats["expired"] += 1
+        for job in [job for job, entry in self._jobs.items() if entry.future.done() and entry.submitted_at < cutoff]:
+            del self._jobs[job]
+
+
+def _make_job_fn(fn, manager, progress):
+    def job_fn(result_key, job, user_callback_args, context):
+        if not manager._start(job):
+            return
+
+        def _set_progress(progress_value):
+            if not isinstance(progress_value, (list, tuple)):
+                progress_value = [progress_value]
+            manager._set_progress(result_key, progress_value)
+
+        maybe_progress = [_set_progress] if progress else []
+
+        def run():
+            c = AttributeDict(**context)
+            c.ignore_register_page = False
+            c.updated_props = ProxySetProps(lambda _id, props: manager._set_props(result_key, _id, props))
+            context_value.set(c)
+            errored = False
+            try:
+                if isinstance(user_callback_args, dict):
+                    output = fn(*maybe_progress, **user_callback_args)
+                elif isinstance(user_callback_args, (list, tuple)):
+                    output = fn(*maybe_progress, *user_callback_args)
+                else:
+                    output = fn(*maybe_progress, user_callback_args)
+            except PreventUpdate:
+                output = {"_dash_no_update": "_dash_no_update"}
+            except Exception as err:
+                print(f"Error in background callback: {err}")
+                errored = True
+                output = {"background_callback_error": {"msg": str(err), "tb": traceback.format_exc()}}
+            manager._finish(job, result_key, output, errored)
+
+        copy_context().run(run)
+
+    return job_fn
+
+
+# The app's default manager runs Genie jobs; SQL callbacks pass sql_manager
+manager = ThreadPoolManager(BACKGROUND_WORKERS, BACKGROUND_RESULT_TTL, "background-genie")
+sql_manager = ThreadPoolManager(BACKGROUND_SQL_WORKERS, BACKGROUND_RESULT_TTL, "background-sql")
+
+
+def get_background_job_stats():
+    """Report submitted, running, queued and cancelled background callback jobs per pool"""
+    return {"genie": manager.stats(), "sql": sql_manager.stats()}
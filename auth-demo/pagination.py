@@ -0,0 +1,60 @@
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+import os
+
+# Page size for paginated Genie list endpoints
+GENIE_PAGE_SIZE = int(os.getenv("GENIE_PAGE_SIZE", "100"))
+PREFETCH_WORKERS = int(os.getenv("GENIE_PREFETCH_WORKERS", "4"))
+
+_prefetch_executor = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="genie-prefetch")
+
+
+def iter_pages(fetch, path, page_size=None, max_pages=None, prefetch=True, page_token=None):
+    """Yield raw response pages from a paginated list endpoint.
+
+    fetch(path) performs the GET, starting at page_token when one is given.
+    While the caller works on one page the next one is requested in the
+    background; closing the generator early abandons any request still in
+    flight.
+    """
+    page_size = page_size or GENIE_PAGE_SIZE
+
+    def load(page_token):
+        params = {"page_size": page_size}
+        if page_token:
+            params["page_token"] = page_token
+        return fetch(f"{path}?{urlencode(params)}")
+
+    pending = None
+    try:
+        page = load(page_token)
+        pages = 0
+        while True:
+            pages += 1
+            page_token = page.get("next_page_token") if isinstance(page, dict) else None
+            has_next = bool(page_token) and (max_pages is None or pages < max_pages)
+            if has_next and prefetch:
+                pending = _prefetch_executor.submit(load, page_token)
+
+            yield page
+
+            if not has_next:
+                return
+            page = pending.result() if pending is not None else load(page_token)
+            pending = None
+    finally:
+        if pending is not None:
+            pending.cancel()
+
+
+def iter_items(fetch, path, result_key, page_size=None, max_pages=None, prefetch=True, page_token=None):
+    """Yield individual items under result_key across all pages"""
+    for page in iter_pages(fetch, path, page_size, max_pages, prefetch, page_token):
+        if not isinstance(page, dict):
+            return
+        yield from page.get(result_key, [])
+
+
+def prefetch(func):
+    """Run func on the prefetch threads, for warming a cache with the page after the one served"""
+    return _prefetch_executor.submit(func)
@@ -0,0 +1,161 @@
+import threading
+import time
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no pooled connection becomes available within the checkout timeout"""
+
+
+class _Entry:
+    def __init__(self, conn):
+        self.conn = conn
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+
+class PooledConnection:
+    """A checked-out connection; close() hands it back to its pool instead of closing it"""
+
+    def __init__(self, pool, entry):
+        self._pool = pool
+        self._entry = entry
+        self._released = False
+
+    def cursor(self, *args, **kwargs):
+        return self._entry.conn.cursor(*args, **kwargs)
+
+    def close(self):
+        if not self._released:
+            self._released = True
+            self._pool.release(self._entry)
+
+    def discard(self):
+        """Close the underlying connection instead of returning it to the pool"""
+        if not self._released:
+            self._released = True
+            self._pool.release(self._entry, discard=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __getattr__(self, name):
+        return getattr(self._entry.conn, name)
+
+
+class ConnectionPool:
+    """Bounded, thread-safe pool of connections created by connect().
+
+    Idle connections are reused most-recently-used first. A connection is
+    dropped when it exceeds max_idle_time or max_lifetime, and one that has
+    been idle longer than validate_after is checked with SELECT 1 before it
+    is handed out. acquire() waits up to checkout_timeout for a free slot.
+    """
+
+    def __init__(self, connect, max_size, max_idle_time, max_lifetime, checkout_timeout, validate_after):
+        self._connect = connect
+        self.max_size = max_size
+        self.max_idle_time = max_idle_time
+        self.max_lifetime = max_lifetime
+        self.checkout_timeout = checkout_timeout
+        self.validate_after = validate_after
+        self._cond = threading.Condition()
+        self._idle = []
+        self._in_use = 0
+        self._stats = {"checkouts": 0, "creates": 0, "waits": 0, "timeouts": 0, "discards": 0}
+
+    def acquire(self):
+        deadline = time.monotonic() + self.checkout_timeout
+        waited = False
+        while True:
+            entry = None
+            with self._cond:
+                while not self._idle and self._in_use >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats["timeouts"] += 1
+                        raise PoolTimeoutError(
+                            f"No SQL connection available after {self.checkout_timeout:g}s "
+                            f"({self._in_use} in use)"
+                        )
+                    if not waited:
+                        waited = True
+                        self._stats["waits"] += 1
+                    self._cond.wait(remaining)
+                if self._idle:
+                    entry = self._idle.pop()
+                self._in_use += 1
+
+            if entry is None:
+                return PooledConnection(self, self._create())
+            if self._is_usable(entry):
+                with self._cond:
+                    self._stats["checkouts"] += 1
+                return PooledConnection(self, entry)
+            self.release(entry, discard=True)
+
+    def release(self, entry, discard=False):
+        now = time.monotonic()
+        if not discard and now - entry.created_at >= self.max_lifetime:
+            discard = True
+        with self._cond:
+            self._in_use -= 1
+            if discard:
+                self._stats["discards"] += 1
+            else:
+                entry.last_used = now
+                self._idle.append(entry)
+            self._cond.notify()
+        if discard:
+            _close_quietly(entry.conn)
+
+    def close_all(self):
+        """Close every idle connection; checked-out ones are closed when released"""
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self.max_lifetime = 0
+        for entry in idle:
+            _close_quietly(entry.conn)
+
+    def stats(self):
+        with self._cond:
+            return dict(self._stats, in_use=self._in_use, idle=len(self._idle), max_size=self.max_size)
+
+    def _create(self):
+        try:
+            conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._stats["creates"] += 1
+            self._stats["checkouts"] += 1
+        return _Entry(conn)
+
+    def _is_usable(self, entry):
+        now = time.monotonic()
+        if now - entry.created_at >= self.max_lifetime or now - entry.last_used >= self.max_idle_time:
+            return False
+        if not getattr(entry.conn, "open", True):
+            return False
+        if now - entry.last_used < self.validate_after:
+            return True
+        try:
+            with entry.conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+                cursor.fetchall()
+            return True
+        except Exception as e:
+            print(f"INFO: Dropping pooled SQL connection that failed liveness check: {e}")
+            return False
+
+
+def _close_quietly(conn):
+    try:
+        conn.close()
+    except Exception as e:
+        print(f"WARNING: Error closing pooled SQL connection: {e}")
@@ -0,0 +1,85 @@
+from concurrent.futures import ThreadPoolExecutor
+import os
+import threading
+import time
+
+from auth import fetch_sp_details, get_connection_sp
+from sql import fetch_warehouses
+
+PREWARM = os.getenv("PREWARM", "false").lower() == "true"
+# Defaults to the first warehouse in the selector
+PREWARM_WAREHOUSE = os.getenv("PREWARM_WAREHOUSE", "")
+PREWARM_SQL_CONNECTIONS = int(os.getenv("PREWARM_SQL_CONNECTIONS", "2"))
+PREWARM_WAKE_WAREHOUSE = os.getenv("PREWARM_WAKE_WAREHOUSE", "false").lower() == "true"
+
+_lock = threading.Lock()
+_state = {"status": "disabled" if not PREWARM else "pending", "steps": {}, "elapsed": None}
+
+
+def _step(name, func):
+    """Run one prewarm step and record its outcome; a failed step does not stop the others"""
+    start = time.monotonic()
+    try:
+        result = func()
+        outcome = {"ok": True}
+    except Exception as e:
+        print(f"WARNING: Prewarm step {name} failed: {e}")
+        result = None
+        outcome = {"ok": False, "error": str(e)}
+    outcome["elapsed"] = round(time.monotonic() - start, 2)
+    with _lock:
+        _state["steps"][name] = outcome
+    return result
+
+
+def _open_sql_connections(http_path):
+    conns = []
+    try:
+        for _ in range(PREWARM_SQL_CONNECTIONS):
+            conns.append(get_connection_sp(http_path))
+        if PREWARM_WAKE_WAREHOUSE and conns:
+            # A trivial statement starts a stopped warehouse before the first user needs it
+            with conns[0].cursor() as cursor:
+                cursor.execute("SELECT 1")
+                cursor.fetchall()
+    finally:
+        # Closing hands the open sessions back to the pool as idle connections
+        for conn in conns:
+            conn.close()
+
+
+def _run():
+    start = time.monotonic()
+    # The two control-plane calls are independent, so they fill their caches concurrently
+    with ThreadPoolExecutor(max_workers=2, thread_name_prefix="prewarm") as executor:
+        executor.submit(_step, "sp_identity", fetch_sp_details)
+        warehouses = executor.submit(_step, "warehouses", fetch_warehouses)
+    http_path = PREWARM_WAREHOUSE
+    if not http_path and warehouses.result():
+        http_path = warehouses.result()[1]
+    if http_path and PREWARM_SQL_CONNECTIONS > 0:
+        _step("sql_connections", lambda: _open_sql_connections(http_path))
+    with _lock:
+        _state["status"] = "ready"
+        _state["elapsed"] = round(time.monotonic() - start, 2)
+    print(f"INFO: Prewarm finished in {_state['elapsed']}s")
+
+
+def start_prewarm():
+    """Start the prewarm stage on a background thread when PREWARM is enabled"""
+    with _lock:
+        if _state["status"] != "pending":
+            return
+        _state["status"] = "running"
+    threading.Thread(target=_run, name="prewarm", daemon=True).start()
+
+
+def get_prewarm_state():
+    """Report prewarm status and the outcome of each step; ready once every step has run"""
+    with _lock:
+        return {**_state, "steps": dict(_state["steps"])}
+
+
+def is_ready():
+    with _lock:
+        return _state["status"] in ("disabled", "ready")
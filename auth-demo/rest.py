@@ -0,0 +1,244 @@
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+import os
+import random
+import re
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Pool sizing and timeouts for direct REST calls (SP and OBO Genie requests go through here)
+POOL_CONNECTIONS = int(os.getenv("GENIE_HTTP_POOL_CONNECTIONS", "4"))
+POOL_MAXSIZE = int(os.getenv("GENIE_HTTP_POOL_MAXSIZE", "32"))
+CONNECT_TIMEOUT = float(os.getenv("GENIE_HTTP_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.getenv("GENIE_HTTP_READ_TIMEOUT", "30"))
+
+# A single adapter owns the urllib3 connection pools, so every thread shares
+# the same keep-alive connections while keeping its own Session object.
+_adapter = HTTPAdapter(
+    pool_connections=POOL_CONNECTIONS,
+    pool_maxsize=POOL_MAXSIZE,
+    pool_block=False,
+)
+_local = threading.local()
+
+
+def get_session():
+    """Return the calling thread's Session, backed by the shared connection pool"""
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        session.mount("https://", _adapter)
+        session.mount("http://", _adapter)
+        session.headers.update({"Connection": "keep-alive"})
+        _local.session = session
+    return session
+
+
+def get(url, headers=None, timeout=None):
+    """GET a URL through the pooled session with the configured timeouts"""
+    return get_session().get(
+        url,
+        headers=headers,
+        timeout=timeout or (CONNECT_TIMEOUT, READ_TIMEOUT),
+    )
+
+
+def get_session_stats():
+    """Report request and connection counts for the shared pool"""
+    total_requests = 0
+    total_connections = 0
+    pools = _adapter.poolmanager.pools
+    for key in pools.keys():
+        pool = pools.get(key)
+        if pool is None:
+            continue
+        total_requests += pool.num_requests
+        total_connections += pool.num_connections
+
+    reused = max(total_requests - total_connections, 0)
+    return {
+        "requests": total_requests,
+        "connections_opened": total_connections,
+        "connections_reused": reused,
+        "reuse_ratio": round(reused / total_requests, 3) if total_requests else 0.0,
+        "pool_maxsize": POOL_MAXSIZE,
+    }
+
+
+# Retry and circuit breaker policy for Genie REST calls
+RETRY_MAX_ATTEMPTS = int(os.getenv("GENIE_RETRY_MAX_ATTEMPTS", "3"))
+RETRY_BASE_DELAY = float(os.getenv("GENIE_RETRY_BASE_DELAY", "0.5"))
+RETRY_MAX_DELAY = float(os.getenv("GENIE_RETRY_MAX_DELAY", "8"))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("GENIE_BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_TIMEOUT = float(os.getenv("GENIE_BREAKER_RESET_TIMEOUT", "30"))
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+# Breakers beyond this many are pruned of those that are closed and clean
+BREAKER_MAX_ENTRIES = int(os.getenv("GENIE_BREAKER_MAX_ENTRIES", "1000"))
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an endpoint whose circuit breaker is open"""
+
+
+class _CircuitBreaker:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_progress = False
+        self.rejected = 0
+
+    def before_call(self, endpoint):
+        with self.lock:
+            if self.opened_at is None:
+                return
+            # After the reset timeout a single trial call is let through
+            if time.monotonic() - self.opened_at >= BREAKER_RESET_TIMEOUT and not self.trial_in_progress:
+                self.trial_in_progress = True
+                return
+            self.rejected += 1
+        raise CircuitOpenError(f"Circuit open for {endpoint}, failing fast")
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_progress = False
+
+    def record_response(self):
+        """A non-transient error shows the endpoint is up, but only settles a half-open trial"""
+        with self.lock:
+            if self.trial_in_progress:
+                self.failures = 0
+                self.opened_at = None
+                self.trial_in_progress = False
+
+    def record_failure(self, endpoint):
+        with self.lock:
+            self.failures += 1
+            if self.trial_in_progress or self.failures >= BREAKER_FAILURE_THRESHOLD:
+                if self.opened_at is None or self.trial_in_progress:
+                    print(f"WARNING: Opening circuit for {endpoint} after {self.failures} failures")
+                self.opened_at = time.monotonic()
+            self.trial_in_progress = False
+
+
+_breakers_lock = threading.Lock()
+_breakers = {}
+
+
+def _get_breaker(key):
+    with _breakers_lock:
+        breaker = _breakers.get(key)
+        if breaker is None:
+            if len(_breakers) >= BREAKER_MAX_ENTRIES:
+                for old_key in [k for k, b in _breakers.items() if b.opened_at is None and not b.failures]:
+                    del _breakers[old_key]
+            breaker = _breakers[key] = _CircuitBreaker()
+        return breaker
+
+
+def _breaker_label(caller, endpoint):
+    return endpoint if caller is None else f"{caller} {endpoint}"
+
+
+def endpoint_key(url):
+    """Normalize a URL or path to its endpoint, replacing ids so they share one breaker"""
+    path = urlsplit(url).path
+    return re.sub(r"/(spaces|conversations|messages)/[^/]+", r"/\1/{id}", path)
+
+
+def _status_code(error):
+    response = getattr(error, "response", None)
+    return getattr(response, "status_code", None)
+
+
+def _is_transient(error):
+    if isinstance(error, (requests.ConnectionError, requests.Timeout, TimeoutError)):
+        return True
+    if isinstance(error, requests.HTTPError):
+        return _status_code(error) in RETRYABLE_STATUS
+    return False
+
+
+def _retry_after(error):
+    """Seconds requested by a Retry-After header, if the error carries one"""
+    response = getattr(error, "response", None)
+    value = response.headers.get("Retry-After") if response is not None else None
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+def call_with_policy(endpoint, attempt, retries=None, caller=None):
+    """Run attempt() with bounded jittered retries and the endpoint's circuit breaker.
+
+    Each caller identity has its own breaker per endpoint, so one user being
+    throttled does not fail fast for every other user or the service principal.
+
+    Transient failures (connection errors, 429 and 5xx) are retried with
+    exponential backoff, honouring Retry-After up to RETRY_MAX_DELAY. Other
+    errors are raised straight away and neither count against the breaker
+    nor reset its run of failures, except that they close a half-open one.
+    """
+    retries = RETRY_MAX_ATTEMPTS - 1 if retries is None else retries
+    label = _breaker_label(caller, endpoint)
+    breaker = _get_breaker((caller, endpoint))
+    breaker.before_call(label)
+
+    for attempt_number in range(retries + 1):
+        try:
+            result = attempt()
+        except Exception as e:
+            if not _is_transient(e):
+                breaker.record_response()
+                raise
+            delay = _retry_after(e)
+            if delay is None:
+                delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt_number))
+            if attempt_number == retries or delay > RETRY_MAX_DELAY:
+                breaker.record_failure(label)
+                raise
+            print(f"INFO: Transient failure on {label} ({e}), retrying in {delay:.2f}s")
+            time.sleep(delay)
+            continue
+        breaker.record_success()
+        return result
+
+
+def get_json(url, headers=None, retries=None, caller=None):
+    """GET a URL and decode its JSON body under the retry and circuit breaker policy for caller"""
+    def attempt():
+        response = get(url, headers=headers)
+        if response.status_code != 200:
+            raise requests.HTTPError(f"HTTP {response.status_code}", response=response)
+        return response.json()
+
+    return call_with_policy(endpoint_key(url), attempt, retries, caller)
+
+
+def get_breaker_stats():
+    """Report consecutive failures, state and fail-fast counts per caller and endpoint"""
+    with _breakers_lock:
+        breakers = dict(_breakers)
+    stats = {}
+    for (caller, endpoint), breaker in breakers.items():
+        with breaker.lock:
+            stats[_breaker_label(caller, endpoint)] = {
+                "state": "closed" if breaker.opened_at is None else "open",
+                "failures": breaker.failures,
+                "rejected": breaker.rejected,
+            }
+    return stats
@@ -0,0 +1,144 @@
+import glob
+import hashlib
+import os
+import tempfile
+import threading
+import time
+
+import pyarrow as pa
+
+# Unset disables the store; every worker process on a node should share the same directory
+RESULT_STORE_DIR = os.getenv("RESULT_STORE_DIR", "")
+RESULT_STORE_TTL = float(os.getenv("RESULT_STORE_TTL", "300"))
+RESULT_STORE_MAX_BYTES = int(os.getenv("RESULT_STORE_MAX_BYTES", str(1024 * 1024 * 1024)))
+
+_SUFFIX = ".arrow"
+
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "expired": 0, "writes": 0, "evictions": 0, "errors": 0}
+
+
+def _count(field, amount=1):
+    with _stats_lock:
+        _stats[field] += amount
+
+
+def enabled():
+    return bool(RESULT_STORE_DIR)
+
+
+def _digest(value):
+    return hashlib.sha256(repr(value).encode("utf-8")).hexdigest()
+
+
+def _path(key):
+    # The table prefix is hashed separately so a table's files can be found
+    # for invalidation; hashing also keeps identities out of file names
+    return os.path.join(RESULT_STORE_DIR, f"{_digest(key[:3])}-{_digest(key[3:])}{_SUFFIX}")
+
+
+def get(key):
+    """Return (table, has_more) for key memory-mapped from the store, or None.
+
+    The table's buffers point into the mapped file, so reading it copies
+    nothing until its values are converted.
+    """
+    if not enabled():
+        return None
+    path = _path(key)
+    try:
+        source = pa.memory_map(path)
+        table = pa.ipc.open_file(source).read_all()
+    except FileNotFoundError:
+        _count("misses")
+        return None
+    except Exception as e:
+        print(f"WARNING: Could not read stored result {path}: {e}")
+        _count("errors")
+        return None
+
+    metadata = table.schema.metadata or {}
+    created_at = float(metadata.get(b"created_at", b"0"))
+    if time.time() - created_at >= RESULT_STORE_TTL:
+        _remove(path)
+        _count("expired")
+        return None
+    # The modification time orders files for eviction, most recently read last
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    _count("hits")
+    return table, metadata.get(b"has_more") == b"true"
+
+
+def put(key, table, has_more):
+    """Write table for key atomically, then evict the least recently used files over the size limit"""
+    if not enabled():
+        return
+    metadata = {"created_at": str(time.time()), "has_more": "true" if has_more else "false"}
+    table = table.replace_schema_metadata(metadata)
+    tmp_path = None
+    try:
+        os.makedirs(RESULT_STORE_DIR, mode=0o700, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=RESULT_STORE_DIR, suffix=".tmp")
+        with os.fdopen(fd, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        # Readers in other processes see either the old file or the complete new one
+        os.replace(tmp_path, _path(key))
+        _count("writes")
+    except Exception as e:
+        print(f"WARNING: Could not store result: {e}")
+        _count("errors")
+        if tmp_path is not None:
+            _remove(tmp_path)
+        return
+    _evict()
+
+
+def invalidate(table_key):
+    """Remove every stored block whose key starts with table_key (identity, http_path, table)"""
+    if not enabled():
+        return
+    for path in glob.glob(os.path.join(RESULT_STORE_DIR, f"{_digest(tuple(table_key))}-*{_SUFFIX}")):
+        _remove(path)
+
+
+def _evict():
+    files = []
+    # A file not read for a whole TTL is past its TTL too, since reads only move mtime forward
+    cutoff = time.time() - RESULT_STORE_TTL
+    for path in glob.glob(os.path.join(RESULT_STORE_DIR, f"*{_SUFFIX}")):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        if stat.st_mtime < cutoff:
+            _remove(path)
+            _count("expired")
+            continue
+        files.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in files)
+    evicted = 0
+    for _, size, path in sorted(files):
+        if total <= RESULT_STORE_MAX_BYTES:
+            break
+        _remove(path)
+        total -= size
+        evicted += 1
+    if evicted:
+        _count("evictions", evicted)
+
+
+def _remove(path):
+    # Another worker may have removed it first
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def get_result_store_stats():
+    """Report hit/miss, write and eviction counters for this process's use of the store"""
+    with _stats_lock:
+        return {"enabled": enabled(), **_stats}
@@ -0,0 +1,55 @@
+import threading
+
+_lock = threading.Lock()
+_in_flight = {}
+_stats = {"calls": 0, "executed": 0, "coalesced": 0, "in_flight": 0}
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def do(key, func):
+    """Run func() once for all concurrent callers sharing the same key.
+
+    The first caller executes func; callers arriving while it runs wait for
+    it and receive the same result (or exception).
+    """
+    with _lock:
+        _stats["calls"] += 1
+        call = _in_flight.get(key)
+        leader = call is None
+        if leader:
+            call = _Call()
+            _in_flight[key] = call
+            _stats["executed"] += 1
+            _stats["in_flight"] = len(_in_flight)
+        else:
+            _stats["coalesced"] += 1
+
+    if not leader:
+        call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    try:
+        call.result = func()
+        return call.result
+    except Exception as e:
+        call.error = e
+        raise
+    finally:
+        with _lock:
+            del _in_flight[key]
+            _stats["in_flight"] = len(_in_flight)
+        call.done.set()
+
+
+def get_single_flight_stats():
+    """Report how many calls were executed versus coalesced onto another caller"""
+    with _lock:
+        return dict(_stats)
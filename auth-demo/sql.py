@@ -1,68 +1,564 @@
-import pandas as pd
+from collections import OrderedDict
+import os
+import threading
+import time
+import uuid
 
+import pyarrow as pa
+
+from admission import FairLimiter
+from arrow_format import format_arrow_table, to_records
 from auth import w
+from cache import LRUTTLCache, background_ttl_cache
+from table_query import build_order_by, build_where
+import result_store
+import singleflight
+
+# One warehouse listing serves both the selector and the warehouse states
+WAREHOUSE_STATE_TTL = float(os.getenv("WAREHOUSE_STATE_TTL", "15"))
+WAREHOUSE_POLL_INTERVAL = float(os.getenv("WAREHOUSE_POLL_INTERVAL", "5"))
+WAREHOUSE_START_TIMEOUT = float(os.getenv("WAREHOUSE_START_TIMEOUT", "600"))
+# Assumed start time until one has been observed for a warehouse
+WAREHOUSE_START_ETA = float(os.getenv("WAREHOUSE_START_ETA", "120"))
+
+# Result rows are fetched and cached in blocks that DataTable pages are cut from.
+# Each block is one statement read through a single cursor, so its pages are
+# consistent with each other; pages are returned as their rows stream in, so a
+# large block does not delay the first page
+RESULT_BLOCK_SIZE = int(os.getenv("RESULT_BLOCK_SIZE", "1000"))
+RESULT_BLOCK_TTL = float(os.getenv("RESULT_BLOCK_TTL", "300"))
+RESULT_BLOCK_CACHE_BYTES = int(os.getenv("RESULT_BLOCK_CACHE_BYTES", str(128 * 1024 * 1024)))
+# Blocks are streamed from the warehouse in Arrow batches of this many rows
+RESULT_STREAM_BATCH_ROWS = int(os.getenv("RESULT_STREAM_BATCH_ROWS", "50"))
+
+# Admission control for warehouse statements, fair across query sessions
+SQL_MAX_CONCURRENT = int(os.getenv("SQL_MAX_CONCURRENT", "16"))
+SQL_MAX_CONCURRENT_PER_WAREHOUSE = int(os.getenv("SQL_MAX_CONCURRENT_PER_WAREHOUSE", "8"))
+SQL_ADMISSION_TIMEOUT = float(os.getenv("SQL_ADMISSION_TIMEOUT", "300"))
+
+query_limiter = FairLimiter(SQL_MAX_CONCURRENT, SQL_MAX_CONCURRENT_PER_WAREHOUSE, SQL_ADMISSION_TIMEOUT)
+
+result_blocks = LRUTTLCache(
+    "result_blocks",
+    ttl=RESULT_BLOCK_TTL,
+    max_entries=10000,
+    max_bytes=RESULT_BLOCK_CACHE_BYTES,
+)
+
+
+# Only cache a successful listing so errors are retried on the next refresh
+@background_ttl_cache(WAREHOUSE_STATE_TTL, cache_if=lambda result: result[1] is None)
+def fetch_warehouse_listing():
+    """(each warehouse's http_path mapped to its id, name and state, error message or None)"""
+    if not w:
+        return None, "SDK Not Configured"
+    try:
+        return {
+            wh.odbc_params.path: {
+                "id": wh.id,
+                "name": wh.name,
+                "state": wh.state.value if wh.state else "UNKNOWN",
+            }
+            for wh in w.warehouses.list()
+            if wh.odbc_params and wh.odbc_params.path
+        }, None
+    except Exception as e:
+        print(f"Error fetching warehouses: {e}")
+        return None, f"Error fetching: {e}"
 
 
 def fetch_warehouses():
-    warehouse_options = []
-    warehouse_options_initial = None
-    if w:
-        try:
-            warehouses = w.warehouses.list()
-            warehouse_list = sorted(
-                [wh for wh in warehouses if wh.odbc_params and wh.odbc_params.path],
-                key=lambda x: x.name,
+    """Selector options for the warehouses, sorted by name, and the first one's http_path"""
+    warehouses, error = fetch_warehouse_listing()
+    if error is not None:
+        return [{"label": error, "value": "", "disabled": True}], None
+    if not warehouses:
+        return [{"label": "No warehouses found", "value": "", "disabled": True}], None
+    warehouse_options = [
+        {"label": info["name"], "value": http_path}
+        for http_path, info in sorted(warehouses.items(), key=lambda item: item[1]["name"])
+    ]
+    return warehouse_options, warehouse_options[0]["value"]
+
+
+def fetch_warehouse_states():
+    """Map each warehouse's http_path to its id, name and state, or None on error"""
+    return fetch_warehouse_listing()[0]
+
+
+def get_warehouse_state(http_path):
+    """Cached id, name and state of the warehouse at http_path, or None if unknown"""
+    return (fetch_warehouse_states() or {}).get(http_path)
+
+
+def find_running_warehouse(exclude=None):
+    """A RUNNING warehouse other than exclude, as (http_path, name), or None"""
+    for http_path, info in sorted((fetch_warehouse_states() or {}).items(), key=lambda item: item[1]["name"]):
+        if info["state"] == "RUNNING" and http_path != exclude:
+            return http_path, info["name"]
+    return None
+
+
+class WarehouseUnavailableError(Exception):
+    """Raised when a warehouse is being deleted or did not start in time"""
+
+
+# States a query is held in until the warehouse reaches RUNNING
+_WAITABLE_STATES = ("STARTING", "STOPPED", "STOPPING")
+
+_start_lock = threading.Lock()
+# Observed seconds from STOPPED or STARTING to RUNNING, per warehouse id
+_start_durations = {}
+
+
+def _poll_warehouse_state(warehouse_id):
+    # Every caller waiting on the same warehouse shares one poll
+    info = singleflight.do(("warehouse_state", warehouse_id), lambda: w.warehouses.get(warehouse_id))
+    return info.state.value if info.state else "UNKNOWN"
+
+
+def _start_warehouse(warehouse_id):
+    try:
+        w.warehouses.start(warehouse_id)
+    except Exception as e:
+        # Opening a session auto-starts the warehouse anyway, if slower to report
+        print(f"INFO: Could not start warehouse {warehouse_id}: {e}")
+
+
+def start_eta(warehouse_id):
+    with _start_lock:
+        return _start_durations.get(warehouse_id, WAREHOUSE_START_ETA)
+
+
+def wait_for_warehouse(http_path, on_wait=None, cancelled=None):
+    """Hold a query until the warehouse at http_path is RUNNING.
+
+    A STOPPED warehouse is started first. While it starts, on_wait(state,
+    waited, expected) is called every WAREHOUSE_POLL_INTERVAL seconds with
+    the seconds waited so far and the warehouse's expected start time.
+    An unknown warehouse or state is let through, since the query itself
+    reports any problem. Raises QueryCancelledError once the cancelled
+    event is set.
+    """
+    info = get_warehouse_state(http_path)
+    if not w or info is None:
+        return
+    warehouse_id = info["id"]
+    state = info["state"]
+    if state in ("DELETING", "DELETED"):
+        raise WarehouseUnavailableError(f"Warehouse {info['name']} is {state.lower()}")
+    if state not in _WAITABLE_STATES:
+        return
+
+    if cancelled is None:
+        cancelled = threading.Event()
+    started = time.monotonic()
+    # A start time is only learned from a start that was seen in progress,
+    # not from a cached state the warehouse had already left
+    observed_start = False
+    if state in ("STOPPED", "STOPPING"):
+        _start_warehouse(warehouse_id)
+    while True:
+        state = _poll_warehouse_state(warehouse_id)
+        waited = time.monotonic() - started
+        if state not in _WAITABLE_STATES and state not in ("DELETING", "DELETED"):
+            break
+        if state in ("DELETING", "DELETED"):
+            raise WarehouseUnavailableError(f"Warehouse {info['name']} is {state.lower()}")
+        if waited >= WAREHOUSE_START_TIMEOUT:
+            raise WarehouseUnavailableError(
+                f"Warehouse {info['name']} did not start within {WAREHOUSE_START_TIMEOUT:g}s"
             )
-            if warehouse_list:
-                warehouse_options = [
-                    {"label": wh.name, "value": wh.odbc_params.path}
-                    for wh in warehouse_list
-                ]
-                warehouse_options_initial = warehouse_options[0]["value"]
-            else:
-                warehouse_options = [
-                    {"label": "No warehouses found", "value": "", "disabled": True}
-                ]
+        observed_start = observed_start or state in ("STOPPED", "STARTING")
+        if on_wait is not None:
+            on_wait(state, waited, start_eta(warehouse_id))
+        if cancelled.wait(WAREHOUSE_POLL_INTERVAL):
+            raise QueryCancelledError("Query was cancelled")
+
+    if observed_start:
+        with _start_lock:
+            _start_durations[warehouse_id] = time.monotonic() - started
+    fetch_warehouse_listing.invalidate()
+
+
+def _build_query(table_name, limit, offset=0, where="", order_by=""):
+    query = f"SELECT * FROM {table_name}"
+    if where:
+        query += f" WHERE {where}"
+    if order_by:
+        query += f" ORDER BY {order_by}"
+    query += f" LIMIT {int(limit)}"
+    if offset:
+        query += f" OFFSET {int(offset)}"
+    return query
 
-        except Exception as e:
-            print(f"Error fetching warehouses: {e}")
-            warehouse_options = [
-                {"label": f"Error fetching: {e}", "value": "", "disabled": True}
-            ]
-    else:
-        warehouse_options = [
-            {"label": "SDK Not Configured", "value": "", "disabled": True}
-        ]
 
-    return warehouse_options, warehouse_options_initial
+def normalize_table_name(table_name):
+    return ".".join(part.strip().strip("`").lower() for part in table_name.strip().split("."))
 
 
-def run_query(table_name, conn):
-    if not table_name or not conn:
-        return pd.DataFrame()
+class QueryCancelledError(Exception):
+    """Raised to callers waiting on a query that was cancelled"""
 
-    query = f"SELECT * FROM {table_name} LIMIT 1000"
+
+class _BlockStream:
+    """One block query whose Arrow batches are formatted on a worker thread as they arrive"""
+
+    def __init__(self, key):
+        self.key = key
+        self.cond = threading.Condition()
+        self.columns = []
+        self.records = []
+        # Formatted batches are only kept to be written to the shared result store
+        self.tables = [] if result_store.enabled() else None
+        self.bytes = 0
+        self.started_at = time.monotonic()
+        self.finished_at = None
+        self.error = None
+        self.done = False
+        self.cursor = None
+        self.cancelled = False
+        # Set on cancel, so a wait for the warehouse to start ends at once
+        self.cancel_event = threading.Event()
+        # (state, waited, expected) while waiting for the warehouse to start
+        self.warehouse_wait = None
+        # (position, depth) while waiting for an admission slot
+        self.queue_position = None
+        # Sessions currently waiting on this stream, by wait token
+        self.waiters = {}
+
+    def attach(self, cursor):
+        """Record the running cursor; raise if the stream was cancelled before it started"""
+        with self.cond:
+            self.cursor = cursor
+            if self.cancelled:
+                raise QueryCancelledError("Query was cancelled")
+
+    def cancel(self):
+        with self.cond:
+            if self.done or self.cancelled:
+                return
+            self.cancelled = True
+            self.cancel_event.set()
+            cursor = self.cursor
+        if cursor is not None:
+            try:
+                cursor.cancel()
+            except Exception as e:
+                print(f"WARNING: Error cancelling SQL statement: {e}")
+
+    def set_warehouse_wait(self, state=None, waited=None, expected=None):
+        with self.cond:
+            self.warehouse_wait = (state, waited, expected) if state is not None else None
+            self.cond.notify_all()
+
+    def set_queue_position(self, position=None, depth=None):
+        with self.cond:
+            self.queue_position = (position, depth) if position is not None else None
+            self.cond.notify_all()
+
+    def add(self, table, nbytes):
+        records = to_records(table)
+        with self.cond:
+            self.columns = table.column_names
+            self.records.extend(records)
+            if self.tables is not None:
+                self.tables.append(table)
+            self.bytes += nbytes
+            self.cond.notify_all()
+
+    def finish(self, error=None):
+        with self.cond:
+            self.error = error
+            self.done = True
+            self.finished_at = time.monotonic()
+            self.cond.notify_all()
+
+    def wait_for(self, rows, session=None, on_wait=None, on_queue=None):
+        """Wait until rows records have arrived or the query ended; return (columns, records, done)
+
+        on_wait(warehouse_wait) and on_queue(queue_position) are called
+        whenever the stream's wait for its warehouse to start or its place in
+        the admission queue changes.
+        """
+        token = object()
+        reported_wait = reported_queue = None
+        with self.cond:
+            if session is not None:
+                self.waiters[token] = session
+            try:
+                while not self.done and len(self.records) < rows:
+                    if on_wait is not None and self.warehouse_wait != reported_wait:
+                        reported_wait = self.warehouse_wait
+                        on_wait(reported_wait)
+                    if on_queue is not None and self.queue_position != reported_queue:
+                        reported_queue = self.queue_position
+                        on_queue(reported_queue)
+                    self.cond.wait()
+            finally:
+                self.waiters.pop(token, None)
+            if self.error is not None:
+                raise self.error
+            if on_wait is not None and reported_wait is not None:
+                on_wait(None)
+            if on_queue is not None and reported_queue is not None:
+                on_queue(None)
+            return self.columns, self.records[:rows], self.done
+
+    def progress(self):
+        with self.cond:
+            end = self.finished_at or time.monotonic()
+            return {
+                "rows": len(self.records),
+                "bytes": self.bytes,
+                "elapsed": round(end - self.started_at, 2),
+                "done": self.done,
+                "cancelled": self.cancelled,
+                "queue_position": self.queue_position,
+            }
+
+
+_streams_lock = threading.Lock()
+_streams = {}
+# Most recent block stream (or its final progress) per query session
+_latest_progress = OrderedDict()
+_LATEST_PROGRESS_MAX = 1000
+
+
+def _run_stream(stream, table_name, connect, block_index, where, order_by, params, cache, session=None):
+    query = _build_query(table_name, RESULT_BLOCK_SIZE + 1, block_index * RESULT_BLOCK_SIZE, where, order_by)
+    error = None
+    conn = None
+    ticket = None
     try:
+        identity, http_path = stream.key[:2]
+        # Only a block that is actually read from the warehouse waits for it
+        # to start, and a starting warehouse holds no admission slot
+        wait_for_warehouse(http_path, stream.set_warehouse_wait, stream.cancel_event)
+        stream.set_warehouse_wait()
+        # Queues are per query session, since every user of the service
+        # principal shares its identity
+        ticket = query_limiter.acquire(
+            (identity, session),
+            http_path,
+            on_position=stream.set_queue_position,
+            should_abort=lambda: stream.cancelled,
+        )
+        stream.set_queue_position()
+        # Queueing time is not part of the statement's elapsed time
+        stream.started_at = time.monotonic()
+        conn = connect()
         with conn.cursor() as cursor:
-            cursor.execute(query)
-            df = cursor.fetchall_arrow().to_pandas()
-            for col in df.columns:
-                if pd.api.types.is_datetime64_any_dtype(
-                    df[col]
-                ) or pd.api.types.is_timedelta64_dtype(df[col]):
-                    try:
-                        df[col] = pd.to_datetime(df[col]).dt.strftime(
-                            "%Y-%m-%d %H:%M:%S"
-                        )
-                    except Exception:
-                        df[col] = df[col].astype(str)
-                elif isinstance(df[col].dtype, (pd.ArrowDtype)):
-                    df[col] = df[col].astype(str)
-                elif not pd.api.types.is_numeric_dtype(
-                    df[col]
-                ) and not pd.api.types.is_string_dtype(df[col]):
-                    df[col] = df[col].astype(str)
-            return df
+            stream.attach(cursor)
+            cursor.execute(query, params or None)
+            while not stream.cancelled:
+                batch = cursor.fetchmany_arrow(RESULT_STREAM_BATCH_ROWS)
+                stream.add(format_arrow_table(batch), batch.nbytes)
+                if batch.num_rows == 0:
+                    break
     except Exception as e:
-        print(f"Error running query '{query}': {e}")
-        raise
+        if not stream.cancelled:
+            print(f"Error running query '{query}': {e}")
+        error = e
+    finally:
+        if conn is not None:
+            # A connection whose statement was cancelled is not handed back to the pool
+            if stream.cancelled:
+                getattr(conn, "discard", conn.close)()
+            else:
+                conn.close()
+        if ticket is not None:
+            query_limiter.release(ticket)
+
+    if stream.cancelled:
+        print(f"INFO: Cancelled query '{query}'")
+        error = QueryCancelledError("Query was cancelled")
+
+    stream.finish(error)
+    # One extra row was requested to tell whether anything follows this block
+    if error is None and cache:
+        has_more = len(stream.records) > RESULT_BLOCK_SIZE
+        result_blocks.set(stream.key, {
+            "columns": stream.columns,
+            "records": stream.records[:RESULT_BLOCK_SIZE],
+            "has_more": has_more,
+        })
+        if stream.tables:
+            try:
+                table = pa.concat_tables(stream.tables, promote_options="permissive")
+            except pa.ArrowInvalid as e:
+                print(f"WARNING: Could not combine result batches for the result store: {e}")
+            else:
+                result_store.put(stream.key, table.slice(0, RESULT_BLOCK_SIZE), has_more)
+    with _streams_lock:
+        if _streams.get(stream.key) is stream:
+            del _streams[stream.key]
+        # Sessions still showing this stream keep its final progress, not its rows
+        final = None
+        for session, latest in list(_latest_progress.items()):
+            if latest is stream:
+                final = final or stream.progress()
+                _latest_progress[session] = final
+
+
+def _get_stream(key, table_name, connect, block_index, where, order_by, params, cache, session=None):
+    """Join the in-flight stream for key or start a new one on a worker thread"""
+    with _streams_lock:
+        stream = _streams.get(key)
+        # A cancelled stream that has not wound down yet is replaced, not joined
+        joined = stream is not None and not stream.cancelled
+        if not joined:
+            stream = _streams[key] = _BlockStream(key)
+        if session is not None:
+            _latest_progress.pop(session, None)
+            _latest_progress[session] = stream
+            while len(_latest_progress) > _LATEST_PROGRESS_MAX:
+                _latest_progress.popitem(last=False)
+    if joined:
+        return stream
+    threading.Thread(
+        target=_run_stream,
+        args=(stream, table_name, connect, block_index, where, order_by, params, cache, session),
+        daemon=True,
+    ).start()
+    return stream
+
+
+def cancel_queries(session, keep=()):
+    """Cancel the block queries session is waiting on, except those in keep.
+
+    A query another session is also waiting on keeps running; only this
+    session's wait on it is abandoned. A query still waiting for its
+    warehouse to start is cancelled the same way.
+    """
+    cancelled = []
+    with _streams_lock:
+        streams = [stream for key, stream in _streams.items() if key not in keep]
+    for stream in streams:
+        with stream.cond:
+            tokens = [token for token, waiter in stream.waiters.items() if waiter == session]
+            if not tokens:
+                continue
+            for token in tokens:
+                del stream.waiters[token]
+            if stream.waiters:
+                continue
+        stream.cancel()
+        cancelled.append(stream)
+    return len(cancelled)
+
+
+def invalidate_results(identity, http_path, table_name):
+    """Drop the cached blocks of table_name for identity on http_path, whatever their sort or filter"""
+    prefix = (identity, http_path, normalize_table_name(table_name))
+    result_blocks.invalidate(lambda key: key[:3] == prefix)
+    result_store.invalidate(prefix)
+
+
+def get_query_admission_stats():
+    """Report running statements, queue depth and admission wait times"""
+    return query_limiter.stats()
+
+
+def get_query_progress(session):
+    """Rows, Arrow bytes and seconds for the latest block streamed for session"""
+    with _streams_lock:
+        latest = _latest_progress.get(session)
+    if isinstance(latest, _BlockStream):
+        return latest.progress()
+    return latest
+
+
+def fetch_page(
+    table_name,
+    connect,
+    identity,
+    http_path,
+    page,
+    page_size,
+    sort_by=None,
+    filter_query=None,
+    session=None,
+    refresh=False,
+    on_wait=None,
+    on_queue=None,
+):
+    """Return (columns, records, has_more) for one DataTable page.
+
+    Rows are read from the warehouse in blocks of RESULT_BLOCK_SIZE with
+    LIMIT/OFFSET and cached per identity, so paging within a block costs no
+    query and connect() is only called when a block is missing. Since a
+    cached block is returned without connecting, identity must prove the
+    caller's access: the service principal's, or a fingerprint of the OBO
+    token from auth.get_token_identity, never a claim read from the token. Missing
+    blocks are streamed in Arrow batches and the page is returned as soon as
+    its rows have arrived. Keyset pagination is not used because arbitrary
+    tables have no known unique key.
+    The DataTable's sort_by and filter_query are run on the warehouse as
+    ORDER BY and a parameterized WHERE clause. Without a sort the warehouse
+    does not guarantee the same row order between block statements, so
+    unsorted pages past the first block may repeat or skip rows; no order is
+    imposed because it would sort the whole table for every block. A call made for session
+    cancels the queries that session's earlier calls are still waiting on,
+    and get_query_progress(session) reports the block it last streamed.
+    Without an identity, blocks are neither cached nor shared with other
+    calls, since nothing shows that they were read with the same access.
+    With refresh, every cached block of the table for this identity and
+    warehouse is dropped first, so all pages are read from the warehouse again.
+    A block read from the warehouse first waits for it to be RUNNING;
+    on_wait((state, waited, expected)) reports that wait while it lasts and
+    on_wait(None) once it is over. Cached pages never wait. Likewise
+    on_queue((position, depth)) reports a block's place in the admission
+    queue and on_queue(None) that it was admitted.
+    """
+    where, params = build_where(filter_query)
+    order_by = build_order_by(sort_by)
+    query_key = (where, tuple(sorted(params.items())), order_by)
+    start = page * page_size
+    end = start + page_size
+    block_indexes = range(start // RESULT_BLOCK_SIZE, (end - 1) // RESULT_BLOCK_SIZE + 1)
+    owner = identity or ("unidentified", uuid.uuid4().hex)
+    keys = [
+        (owner, http_path, normalize_table_name(table_name), query_key, RESULT_BLOCK_SIZE, block_index)
+        for block_index in block_indexes
+    ]
+    if session is not None:
+        cancel_queries(session, keep=keys)
+    if refresh:
+        invalidate_results(identity, http_path, table_name)
+
+    columns = []
+    records = []
+    has_more = False
+    for block_index, key in zip(block_indexes, keys):
+        offset = block_index * RESULT_BLOCK_SIZE
+        block = result_blocks.get(key) if identity else None
+        if block is None and identity:
+            # Another worker process may already have fetched this block
+            stored = result_store.get(key)
+            if stored is not None:
+                table, stored_more = stored
+                block = {"columns": table.column_names, "records": to_records(table), "has_more": stored_more}
+                result_blocks.set(key, block)
+        if block is not None:
+            block_columns, block_records = block["columns"], block["records"]
+            block_more = block["has_more"]
+        else:
+            # Only wait for the rows this page needs plus one; the rest of the
+            # block keeps streaming into the cache in the background
+            stream = _get_stream(
+                key, table_name, connect, block_index, where, order_by, params, bool(identity), session
+            )
+            block_columns, block_records, done = stream.wait_for(
+                min(end - offset + 1, RESULT_BLOCK_SIZE + 1), session, on_wait, on_queue
+            )
+            # Once the stream is done its records no longer change
+            block_more = not done or len(stream.records) > RESULT_BLOCK_SIZE
+            block_records = block_records[:RESULT_BLOCK_SIZE]
+
+        columns = block_columns
+        records.extend(block_records[max(start - offset, 0):end - offset])
+        has_more = len(block_records) > end - offset or block_more
+        if not block_more:
+            break
+    return columns, records, has_more
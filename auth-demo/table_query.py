@@ -0,0 +1,197 @@
+import re
+
+
+class FilterSyntaxError(ValueError):
+    """Raised when a DataTable filter_query cannot be translated to SQL"""
+
+
+_TOKEN = re.compile(
+    r"""
+    \s*(?:
+        (?P<column>\{(?:\\.|[^\\}])*\})
+      | (?P<string>"(?:\\.|[^\\"])*"|'(?:\\.|[^\\'])*'|`(?:\\.|[^\\`])*`)
+      | (?P<paren>[()])
+      | (?P<symbol>&&|\|\||[is]?(?:<=|>=|!=|=|<|>)|!)
+      | (?P<word>[^\s(){}"'`&|<>=!]+)
+    )
+    """,
+    re.VERBOSE,
+)
+
+# Relational operators by their word and symbol spellings
+_RELATIONAL = {
+    "=": "=", "eq": "=",
+    "!=": "!=", "ne": "!=",
+    "<": "<", "lt": "<",
+    "<=": "<=", "le": "<=",
+    ">": ">", "gt": ">",
+    ">=": ">=", "ge": ">=",
+    "contains": "contains",
+    "datestartswith": "datestartswith",
+}
+
+_NUMBER = re.compile(r"^-?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?$")
+
+
+def quote_identifier(name):
+    """Quote a column name as a Databricks SQL identifier"""
+    return "`" + str(name).replace("`", "``") + "`"
+
+
+def _unescape(text):
+    return re.sub(r"\\(.)", r"\1", text)
+
+
+def _tokenize(filter_query):
+    tokens = []
+    position = 0
+    text = filter_query.rstrip()
+    while position < len(text):
+        match = _TOKEN.match(text, position)
+        if not match or match.end() == position:
+            raise FilterSyntaxError(f"Unexpected character in filter at position {position}")
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind in ("column", "string"):
+            value = _unescape(value[1:-1])
+        tokens.append((kind, value))
+        position = match.end()
+    return tokens
+
+
+def _like_pattern(value, prefix_only=False):
+    escaped = str(value).replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return escaped + "%" if prefix_only else "%" + escaped + "%"
+
+
+class _Parser:
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.position = 0
+        self.params = {}
+
+    def peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else (None, None)
+
+    def take(self):
+        token = self.peek()
+        if token[0] is None:
+            raise FilterSyntaxError("Filter ended unexpectedly")
+        self.position += 1
+        return token
+
+    def param(self, value):
+        name = f"f{len(self.params)}"
+        self.params[name] = value
+        return f":{name}"
+
+    def parse(self):
+        clause = self.parse_or()
+        if self.peek()[0] is not None:
+            raise FilterSyntaxError(f"Unexpected '{self.peek()[1]}' in filter")
+        return clause
+
+    def parse_or(self):
+        parts = [self.parse_and()]
+        while self.peek()[1] in ("||", "or"):
+            self.take()
+            parts.append(self.parse_and())
+        return parts[0] if len(parts) == 1 else "(" + " OR ".join(parts) + ")"
+
+    def parse_and(self):
+        parts = [self.parse_not()]
+        while self.peek()[1] in ("&&", "and"):
+            self.take()
+            parts.append(self.parse_not())
+        return parts[0] if len(parts) == 1 else "(" + " AND ".join(parts) + ")"
+
+    def parse_not(self):
+        if self.peek()[1] == "!":
+            self.take()
+            return f"(NOT {self.parse_not()})"
+        if self.peek()[0] == "paren" and self.peek()[1] == "(":
+            self.take()
+            clause = self.parse_or()
+            if self.take() != ("paren", ")"):
+                raise FilterSyntaxError("Missing ')' in filter")
+            return clause
+        return self.parse_comparison()
+
+    def column(self):
+        kind, name = self.take()
+        if kind != "column":
+            raise FilterSyntaxError(f"Expected a {{column}} in filter, got '{name}'")
+        return quote_identifier(name)
+
+    def operand(self):
+        kind, value = self.take()
+        if kind == "string":
+            return value
+        if kind == "word":
+            if _NUMBER.match(value):
+                number = float(value)
+                return int(number) if number.is_integer() and re.match(r"^-?\d+$", value) else number
+            return value
+        raise FilterSyntaxError(f"Expected a value in filter, got '{value}'")
+
+    def parse_comparison(self):
+        column = self.column()
+        kind, word = self.take()
+        if word == "is":
+            return self.parse_unary(column)
+
+        operator = word.lower()
+        case_insensitive = False
+        if kind in ("word", "symbol") and operator[:1] in ("i", "s") and operator[1:] in _RELATIONAL:
+            case_insensitive = operator[0] == "i"
+            operator = operator[1:]
+        if operator not in _RELATIONAL:
+            raise FilterSyntaxError(f"Unsupported filter operator '{word}'")
+        operator = _RELATIONAL[operator]
+        value = self.operand()
+
+        if operator in ("contains", "datestartswith"):
+            pattern = self.param(_like_pattern(value, prefix_only=operator == "datestartswith"))
+            target = f"CAST({column} AS STRING)"
+            if case_insensitive:
+                return f"lower({target}) LIKE lower({pattern})"
+            return f"{target} LIKE {pattern}"
+        if case_insensitive and isinstance(value, str):
+            return f"lower(CAST({column} AS STRING)) {operator} lower({self.param(value)})"
+        return f"{column} {operator} {self.param(value)}"
+
+    def parse_unary(self, column):
+        negate = False
+        if self.peek()[1] == "not":
+            self.take()
+            negate = True
+        _, check = self.take()
+        if check == "nil":
+            clause = f"{column} IS NULL"
+        elif check == "blank":
+            clause = f"({column} IS NULL OR trim(CAST({column} AS STRING)) = '')"
+        else:
+            raise FilterSyntaxError(f"Unsupported filter check 'is {check}'")
+        return f"(NOT {clause})" if negate else clause
+
+
+def build_where(filter_query):
+    """Translate a DataTable filter_query into a WHERE condition and its parameters.
+
+    Values are bound as named parameters and column names are quoted, so the
+    result is safe to run as-is. Returns ("", {}) for an empty filter.
+    """
+    if not filter_query or not filter_query.strip():
+        return "", {}
+    parser = _Parser(_tokenize(filter_query))
+    return parser.parse(), parser.params
+
+
+def build_order_by(sort_by):
+    """Translate a DataTable sort_by list into an ORDER BY expression"""
+    parts = []
+    for item in sort_by or []:
+        name = item.get("column_id")
+        direction = "DESC" if item.get("direction") == "desc" else "ASC"
+        parts.append(f"{quote_identifier(name)} {direction}")
+    return ", ".join(parts)
@@ -0,0 +1,5 @@
+import os
+
+# auth builds its SDK clients on import; no test reaches a real workspace
+os.environ.setdefault("DATABRICKS_HOST", "https://stub.cloud.databricks.com")
+os.environ.setdefault("DATABRICKS_TOKEN", "stub-token")
@@ -0,0 +1,34 @@
+import json
+
+import pyarrow as pa
+
+from arrow_format import format_arrow_table, to_records
+
+
+def test_fixed_size_binary_renders_as_hex_like_binary():
+    table = pa.table({
+        "digest": pa.array([b"\x00\xff", None], pa.binary(2)),
+        "blob": pa.array([b"\x00\xff", None], pa.binary()),
+    })
+
+    records = to_records(format_arrow_table(table))
+    assert records == [{"digest": "00ff", "blob": "00ff"}, {"digest": None, "blob": None}]
+
+
+def test_intervals_render_as_strings():
+    table = pa.table({"gap": pa.array([pa.MonthDayNano([1, 2, 3]), None], pa.month_day_nano_interval())})
+
+    records = to_records(format_arrow_table(table))
+    assert isinstance(records[0]["gap"], str)
+    assert "months=1" in records[0]["gap"]
+    assert records[1]["gap"] is None
+
+
+def test_records_are_json_serializable():
+    table = pa.table({
+        "digest": pa.array([b"\x01\x02"], pa.binary(2)),
+        "gap": pa.array([pa.MonthDayNano([0, 1, 0])], pa.month_day_nano_interval()),
+        "digests": pa.array([[b"\x01\x02", None]], pa.list_(pa.binary(2))),
+    })
+
+    json.dumps(to_records(format_arrow_table(table)))
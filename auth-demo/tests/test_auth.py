@@ -0,0 +1,53 @@
+import time
+
+import jwt
+import pytest
+
+import auth
+
+
+class FakeConnection:
+    def __init__(self, token):
+        self.token = token
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture(autouse=True)
+def fresh_pools(monkeypatch):
+    monkeypatch.setattr(auth, "_obo_pools", auth.OrderedDict())
+    monkeypatch.setattr(auth, "_connect_obo", lambda http_path, user_token: FakeConnection(user_token))
+
+
+def token(sub, signed=True):
+    claims = {"sub": sub, "exp": int(time.time()) + 3600}
+    if signed:
+        return jwt.encode(claims, "stub-signing-key-of-sufficient-length", algorithm="HS256")
+    return jwt.encode(claims, key=None, algorithm="none")
+
+
+def test_forged_token_neither_reuses_nor_closes_another_users_pool():
+    victim = token("victim@example.com")
+    held = auth.get_connection_obo("/sql/wh", victim)
+
+    forged = auth.get_connection_obo("/sql/wh", token("victim@example.com", signed=False))
+    assert forged.token != victim
+    assert not held.closed
+    assert len(auth._obo_pools) == 2
+
+    held.close()
+    assert auth.get_connection_obo("/sql/wh", victim).token == victim
+
+
+def test_expired_pools_are_dropped(monkeypatch):
+    now = time.time()
+    held = auth.get_connection_obo("/sql/wh", token("a@example.com"))
+    held.close()
+    monkeypatch.setattr(auth.time, "time", lambda: now + 7200)
+
+    later = jwt.encode({"exp": int(now) + 10800}, "stub-signing-key-of-sufficient-length", algorithm="HS256")
+    auth.get_connection_obo("/sql/wh", later)
+    assert len(auth._obo_pools) == 1
+    assert held._entry.conn.closed
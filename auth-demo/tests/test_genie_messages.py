@@ -0,0 +1,77 @@
+import pytest
+
+import genie_messages
+from rest import CircuitOpenError
+
+MESSAGES = {"messages": [{"id": "m1", "content": "hello"}]}
+
+
+def fake_fetch(open_patterns=(), working="alternative"):
+    """fetch(path) that fails fast for open_patterns and only has messages at the working pattern"""
+    paths = {
+        name: template.split("?")[0].format(space_id="s", conversation_id="c")
+        for name, (_, template) in genie_messages.MESSAGE_PATTERNS.items()
+    }
+    calls = []
+
+    def fetch(path):
+        name = next(name for name, prefix in paths.items() if path.split("?")[0] == prefix and (
+            ("?" in path) == (name == "pagination")
+        ))
+        calls.append(name)
+        if name in open_patterns:
+            raise CircuitOpenError(f"Circuit open for {name}")
+        if name == working:
+            return MESSAGES
+        return {"unexpected": True}
+
+    fetch.calls = calls
+    return fetch
+
+
+@pytest.fixture(autouse=True)
+def fresh_patterns(monkeypatch):
+    monkeypatch.setattr(genie_messages, "_learned", {})
+
+
+@pytest.mark.parametrize("race", [True, False])
+def test_open_pattern_is_skipped(monkeypatch, race):
+    monkeypatch.setattr(genie_messages, "RACE_ENABLED", race)
+    fetch = fake_fetch(open_patterns={"standard", "pagination"})
+
+    assert genie_messages.list_messages(fetch, "host", "sp", "s", "c") == MESSAGES
+    assert genie_messages.get_learned_pattern("host", "sp") == "alternative"
+
+
+@pytest.mark.parametrize("race", [True, False])
+def test_raises_only_when_every_pattern_is_open(monkeypatch, race):
+    monkeypatch.setattr(genie_messages, "RACE_ENABLED", race)
+    fetch = fake_fetch(open_patterns=set(genie_messages.MESSAGE_PATTERNS))
+
+    with pytest.raises(CircuitOpenError):
+        genie_messages.list_messages(fetch, "host", "sp", "s", "c")
+
+
+@pytest.mark.parametrize("race", [True, False])
+def test_failed_patterns_without_open_circuits_return_none(monkeypatch, race):
+    monkeypatch.setattr(genie_messages, "RACE_ENABLED", race)
+    fetch = fake_fetch(open_patterns={"standard"}, working=None)
+
+    assert genie_messages.list_messages(fetch, "host", "sp", "s", "c") is None
+
+
+def test_open_learned_pattern_falls_back_and_is_replaced():
+    genie_messages.remember_pattern("host", "obo", "standard")
+    fetch = fake_fetch(open_patterns={"standard"})
+
+    assert genie_messages.list_messages(fetch, "host", "obo", "s", "c") == MESSAGES
+    assert fetch.calls[0] == "standard"
+    assert genie_messages.get_learned_pattern("host", "obo") == "alternative"
+
+
+def test_open_learned_pattern_is_kept_when_nothing_else_works():
+    genie_messages.remember_pattern("host", "obo", "standard")
+    fetch = fake_fetch(open_patterns={"standard"}, working=None)
+
+    assert genie_messages.list_messages(fetch, "host", "obo", "s", "c") is None
+    assert genie_messages.get_learned_pattern("host", "obo") == "standard"
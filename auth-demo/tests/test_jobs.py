@@ -0,0 +1,125 @@
+import json
+import threading
+import time
+
+import dash
+import flask
+import pytest
+from dash import Input, Output, html, set_props
+
+import jobs
+from jobs import ThreadPoolManager, check_dash_version
+
+BODY = {
+    "output": "out.children",
+    "outputs": {"id": "out", "property": "children"},
+    "inputs": [{"id": "go", "property": "n_clicks", "value": 1}],
+    "changedPropIds": ["go.n_clicks"],
+    "state": [],
+}
+
+
+def make_app(manager, release):
+    app = dash.Dash(__name__, background_callback_manager=manager)
+    app.layout = html.Div([html.Button(id="go"), html.Div(id="out"), html.Div(id="status"), html.Div(id="side")])
+
+    @app.callback(
+        Output("out", "children"),
+        Input("go", "n_clicks"),
+        background=True,
+        progress=[Output("status", "children")],
+        prevent_initial_call=True,
+    )
+    def slow(set_progress, n_clicks):
+        set_progress("halfway")
+        release.wait(5)
+        set_props("side", {"children": "set from the job"})
+        # The starting request's headers are readable from the pool thread
+        return f"{n_clicks} for {flask.request.headers.get('X-Forwarded-Email', 'nobody')}"
+
+    return app
+
+
+def poll(client, started, timeout=5):
+    url = f"/_dash-update-component?cacheKey={started['cacheKey']}&job={started['job']}"
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        body = json.loads(client.post(url, json=BODY).data)
+        yield body
+        time.sleep(0.02)
+
+
+def test_background_callback_runs_through_the_manager():
+    manager = ThreadPoolManager(2, 60)
+    release = threading.Event()
+    client = make_app(manager, release).server.test_client()
+
+    started = json.loads(
+        client.post("/_dash-update-component", json=BODY, headers={"X-Forwarded-Email": "ann@example.com"}).data
+    )
+    assert {"cacheKey", "job"} <= started.keys()
+
+    progress_seen = False
+    for body in poll(client, started):
+        if body.get("progress"):
+            assert body["progress"] == {"status.children": "halfway"}
+            progress_seen = True
+            release.set()
+        if "response" in body:
+            break
+    assert progress_seen
+    assert body["response"]["out"]["children"] == "1 for ann@example.com"
+    assert body["sideUpdate"] == {"side": {"children": "set from the job"}}
+
+    stats = manager.stats()
+    assert stats["completed"] == 1
+    assert stats["running"] == stats["queued"] == stats["unread_results"] == 0
+
+
+def test_cancelled_job_result_is_dropped():
+    manager = ThreadPoolManager(1, 60)
+    release = threading.Event()
+    client = make_app(manager, release).server.test_client()
+
+    started = json.loads(client.post("/_dash-update-component", json=BODY).data)
+    manager.terminate_job(started["job"])
+    release.set()
+    # The thread finishes the callback anyway, but nobody is polling for its result
+    manager._executor.shutdown(wait=True)
+
+    assert not manager.job_running(started["job"])
+    assert manager.get_result(started["cacheKey"], None) is manager.UNDEFINED
+    assert manager.stats()["cancelled"] == 1
+
+
+@pytest.mark.parametrize("version", ["3.0.4", "3.0.10"])
+def test_supported_dash_versions_pass(version):
+    check_dash_version(version)
+
+
+@pytest.mark.parametrize("version", ["3.1.0", "4.0.0", "2.18.2", "dev"])
+def test_unsupported_dash_versions_are_refused(version):
+    with pytest.raises(RuntimeError, match="SUPPORTED_DASH"):
+        check_dash_version(version)
+
+
+def test_installed_dash_is_supported():
+    check_dash_version(dash.__version__)
+
+
+def test_sql_runs_do_not_share_workers_with_genie_jobs():
+    from dash._callback import GLOBAL_CALLBACK_MAP
+
+    import callbacks.genie_callbacks
+    import callbacks.sql_callbacks
+
+    managers = {
+        output: (spec.get("background") or {}).get("manager")
+        for output, spec in GLOBAL_CALLBACK_MAP.items()
+        if spec.get("background")
+    }
+    sql_runs = [output for output in managers if "table-data-" in output]
+    assert len(sql_runs) == 2
+    assert all(managers[output] is jobs.sql_manager for output in sql_runs)
+    assert all(managers[output] is None for output in managers if output not in sql_runs)
+    assert jobs.sql_manager._executor is not jobs.manager._executor
@@ -0,0 +1,300 @@
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+import time
+import uuid
+
+import jwt
+import pytest
+import requests
+
+import rest
+
+_real_sleep = time.sleep
+
+
+class StubServer:
+    """Local HTTP server that answers GETs from a script of (status, headers, body) responses"""
+
+    def __init__(self):
+        self.script = []
+        self.requests = []
+        self.lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with server.lock:
+                    server.requests.append(self.path)
+                    status, headers, body = server.script.pop(0) if server.script else (200, {}, {})
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    def url(self, path):
+        return f"http://127.0.0.1:{self.httpd.server_port}{path}"
+
+    def respond(self, *responses):
+        """Queue responses given as a status or a (status, headers, body) tuple"""
+        with self.lock:
+            for response in responses:
+                self.script.append(response if isinstance(response, tuple) else (response, {}, {}))
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def stub():
+    server = StubServer()
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Record backoff delays instead of sleeping through them"""
+    recorded = []
+    monkeypatch.setattr(rest.time, "sleep", recorded.append)
+    return recorded
+
+
+@pytest.fixture(autouse=True)
+def policy(monkeypatch):
+    monkeypatch.setattr(rest, "RETRY_MAX_ATTEMPTS", 3)
+    monkeypatch.setattr(rest, "RETRY_BASE_DELAY", 0.01)
+    monkeypatch.setattr(rest, "RETRY_MAX_DELAY", 2.0)
+    monkeypatch.setattr(rest, "BREAKER_FAILURE_THRESHOLD", 2)
+    monkeypatch.setattr(rest, "BREAKER_RESET_TIMEOUT", 0.2)
+    monkeypatch.setattr(rest, "_breakers", {})
+
+
+def test_retries_transient_statuses_until_success(stub, sleeps):
+    stub.respond(503, 429, (200, {}, {"ok": True}))
+
+    assert rest.get_json(stub.url("/api/retry")) == {"ok": True}
+    assert len(stub.requests) == 3
+    assert len(sleeps) == 2
+
+
+def test_gives_up_after_max_attempts(stub, sleeps):
+    stub.respond(503, 503, 503, 503)
+
+    with pytest.raises(requests.HTTPError):
+        rest.get_json(stub.url("/api/exhausted"))
+    assert len(stub.requests) == 3
+    assert len(sleeps) == 2
+
+
+def test_client_errors_are_not_retried_or_counted(stub, sleeps):
+    stub.respond(404, 404, 404)
+
+    for _ in range(3):
+        with pytest.raises(requests.HTTPError):
+            rest.get_json(stub.url("/api/missing"))
+    assert len(stub.requests) == 3
+    assert sleeps == []
+    assert rest.get_breaker_stats()["/api/missing"]["state"] == "closed"
+
+
+def test_backoff_grows_and_stays_under_the_cap(stub, sleeps, monkeypatch):
+    monkeypatch.setattr(rest, "RETRY_MAX_ATTEMPTS", 5)
+    monkeypatch.setattr(rest, "RETRY_BASE_DELAY", 0.5)
+    monkeypatch.setattr(rest, "RETRY_MAX_DELAY", 1.0)
+    monkeypatch.setattr(rest.random, "uniform", lambda low, high: high)
+    stub.respond(503, 503, 503, 503, 200)
+
+    rest.get_json(stub.url("/api/backoff"))
+    assert sleeps == [0.5, 1.0, 1.0, 1.0]
+
+
+def test_honours_retry_after_seconds(stub, sleeps):
+    stub.respond((429, {"Retry-After": "1"}, {}), (200, {}, {"ok": True}))
+
+    assert rest.get_json(stub.url("/api/retry-after")) == {"ok": True}
+    assert sleeps == [1.0]
+
+
+def test_honours_retry_after_http_date(stub, sleeps):
+    retry_at = datetime.now(timezone.utc) + timedelta(seconds=2)
+    stub.respond((503, {"Retry-After": format_datetime(retry_at, usegmt=True)}, {}), 200)
+
+    rest.get_json(stub.url("/api/retry-date"))
+    assert len(sleeps) == 1
+    assert 0 < sleeps[0] <= 2
+
+
+def test_retry_after_beyond_the_cap_is_not_waited_for(stub, sleeps):
+    stub.respond((429, {"Retry-After": "60"}, {}), 200)
+
+    with pytest.raises(requests.HTTPError):
+        rest.get_json(stub.url("/api/overloaded"))
+    assert len(stub.requests) == 1
+    assert sleeps == []
+
+
+def test_breaker_opens_fails_fast_half_opens_and_recovers(stub):
+    url = stub.url("/api/flaky")
+    stub.respond(503, 503)
+    for _ in range(2):
+        with pytest.raises(requests.HTTPError):
+            rest.get_json(url, retries=0)
+    assert rest.get_breaker_stats()["/api/flaky"]["state"] == "open"
+
+    # Open: the endpoint is not called at all
+    with pytest.raises(rest.CircuitOpenError):
+        rest.get_json(url, retries=0)
+    assert len(stub.requests) == 2
+    assert rest.get_breaker_stats()["/api/flaky"]["rejected"] == 1
+
+    # Half-open after the reset timeout: one trial call goes through and closes it
+    _real_sleep(0.25)
+    stub.respond((200, {}, {"ok": True}))
+    assert rest.get_json(url, retries=0) == {"ok": True}
+    assert rest.get_breaker_stats()["/api/flaky"]["state"] == "closed"
+    assert rest.get_json(url, retries=0) == {}
+    assert len(stub.requests) == 4
+
+
+def test_failed_trial_reopens_the_breaker(stub):
+    url = stub.url("/api/down")
+    stub.respond(503, 503)
+    for _ in range(2):
+        with pytest.raises(requests.HTTPError):
+            rest.get_json(url, retries=0)
+
+    _real_sleep(0.25)
+    stub.respond(503)
+    with pytest.raises(requests.HTTPError):
+        rest.get_json(url, retries=0)
+    with pytest.raises(rest.CircuitOpenError):
+        rest.get_json(url, retries=0)
+    assert len(stub.requests) == 3
+
+
+def test_client_errors_do_not_reset_a_run_of_failures(stub):
+    url = stub.url("/api/mixed")
+    stub.respond(503, 404, 503)
+    for _ in range(3):
+        with pytest.raises(requests.HTTPError):
+            rest.get_json(url, retries=0)
+    assert rest.get_breaker_stats()["/api/mixed"]["state"] == "open"
+
+
+def test_client_error_on_the_trial_call_closes_the_breaker(stub):
+    url = stub.url("/api/gone")
+    stub.respond(503, 503)
+    for _ in range(2):
+        with pytest.raises(requests.HTTPError):
+            rest.get_json(url, retries=0)
+
+    _real_sleep(0.25)
+    stub.respond(404)
+    with pytest.raises(requests.HTTPError):
+        rest.get_json(url, retries=0)
+    assert rest.get_breaker_stats()["/api/gone"]["state"] == "closed"
+
+
+def test_each_caller_has_its_own_breaker(stub):
+    url = stub.url("/api/throttled")
+    stub.respond(429, 429)
+    for _ in range(2):
+        with pytest.raises(requests.HTTPError):
+            rest.get_json(url, retries=0, caller="obo:noisy")
+    with pytest.raises(rest.CircuitOpenError):
+        rest.get_json(url, retries=0, caller="obo:noisy")
+
+    assert rest.get_json(url, retries=0, caller="sp") == {}
+    assert rest.get_breaker_stats()["obo:noisy /api/throttled"]["state"] == "open"
+    assert rest.get_breaker_stats()["sp /api/throttled"]["state"] == "closed"
+
+
+def test_ids_share_one_breaker_per_endpoint():
+    assert rest.endpoint_key("https://host/api/2.0/genie/spaces/a1/conversations?page_token=x") == (
+        "/api/2.0/genie/spaces/{id}/conversations"
+    )
+    assert rest.endpoint_key("/api/2.0/genie/spaces/b2/conversations") == "/api/2.0/genie/spaces/{id}/conversations"
+
+
+@pytest.fixture
+def genie_obo(stub, monkeypatch):
+    """auth with OBO Genie calls sent to the stub server and a fresh user token"""
+    import auth
+
+    monkeypatch.setattr(auth, "get_workspace_url", stub.url)
+    # Listings go stale almost at once so the fallback can be exercised
+    monkeypatch.setattr(auth.genie_listing_cache, "ttl", 0.05)
+    token = jwt.encode({"sub": f"user-{uuid.uuid4().hex}"}, "stub-signing-key-of-sufficient-length", algorithm="HS256")
+    return auth, token
+
+
+def test_serves_stale_listing_when_upstream_fails(stub, sleeps, genie_obo):
+    auth, token = genie_obo
+    spaces = {"spaces": [{"id": "s1", "title": "Sales"}]}
+    stub.respond((200, {}, spaces))
+    assert auth.get_genie_spaces_obo(token) == spaces
+
+    _real_sleep(0.1)
+    stub.respond(503, 503, 503)
+    assert auth.get_genie_spaces_obo(token) == spaces
+    assert len(stub.requests) == 4
+
+
+def test_serves_stale_listing_while_the_breaker_is_open(stub, sleeps, genie_obo):
+    auth, token = genie_obo
+    spaces = {"spaces": [{"id": "s2", "title": "Ops"}]}
+    stub.respond((200, {}, spaces))
+    assert auth.get_genie_spaces_obo(token) == spaces
+
+    _real_sleep(0.1)
+    stub.respond(*[503] * 6)
+    assert auth.get_genie_spaces_obo(token) == spaces
+    assert auth.get_genie_spaces_obo(token) == spaces
+    requests_made = len(stub.requests)
+
+    # The breaker is open now, so the stale answer comes without an upstream call
+    assert auth.get_genie_spaces_obo(token) == spaces
+    assert len(stub.requests) == requests_made
+
+
+def test_forged_token_for_another_user_misses_their_cache(stub, sleeps, genie_obo):
+    auth, token = genie_obo
+    spaces = {"spaces": [{"id": "s3", "title": "Payroll"}]}
+    stub.respond((200, {}, spaces))
+    assert auth.get_genie_spaces_obo(token) == spaces
+
+    # Same 'sub', no signature: only Databricks can tell, so it must be asked
+    victim = jwt.decode(token, options={"verify_signature": False})["sub"]
+    forged = jwt.encode({"sub": victim}, key=None, algorithm="none")
+    stub.respond(403, 403, 403)
+    assert auth.get_genie_spaces_obo(forged) is None
+    assert len(stub.requests) == 2
+
+
+def test_sp_calls_are_bounded_by_the_retry_policy(stub, sleeps, monkeypatch):
+    import auth
+
+    monkeypatch.setattr(auth, "get_workspace_url", stub.url)
+    monkeypatch.setattr(auth.w.config, "authenticate", lambda: {"Authorization": "Bearer sp-token"})
+    stub.respond(503, 503, 503, 200)
+
+    with pytest.raises(requests.HTTPError):
+        auth.fetch_sp("/api/2.0/genie/spaces")
+    assert len(stub.requests) == rest.RETRY_MAX_ATTEMPTS
+    assert sum(sleeps) <= rest.RETRY_MAX_DELAY * (rest.RETRY_MAX_ATTEMPTS - 1)
+    assert rest.get_breaker_stats()["sp /api/2.0/genie/spaces"]["failures"] == 1
@@ -0,0 +1,213 @@
+from types import SimpleNamespace
+import threading
+import time
+
+import jwt
+import pyarrow as pa
+import pytest
+
+from auth import get_token_identity
+import sql
+
+
+class FakeConnection:
+    """Connection whose statements return rows of one integer column, held until released"""
+
+    def __init__(self, rows=5, release=None):
+        self.rows = rows
+        self.release = release
+        self.executed = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def close(self):
+        pass
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.pending = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        self.conn.executed.append(query)
+        if self.conn.release is not None:
+            self.conn.release.wait(5)
+        self.pending = list(range(self.conn.rows))
+
+    def fetchmany_arrow(self, size):
+        batch, self.pending = self.pending[:size], self.pending[size:]
+        return pa.table({"n": pa.array(batch, pa.int64())})
+
+    def cancel(self):
+        pass
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(sql, "_streams", {})
+    monkeypatch.setattr(sql, "_latest_progress", sql.OrderedDict())
+    monkeypatch.setattr(sql, "result_store", type("NoStore", (), {
+        "enabled": staticmethod(lambda: False),
+        "get": staticmethod(lambda key: None),
+        "put": staticmethod(lambda *args: None),
+        "invalidate": staticmethod(lambda prefix: None),
+    }))
+    monkeypatch.setattr(sql, "_start_durations", {})
+    monkeypatch.setattr(sql, "WAREHOUSE_POLL_INTERVAL", 0.01)
+    # The warehouse is unknown, and so let through, unless a test says otherwise
+    monkeypatch.setattr(sql, "get_warehouse_state", lambda http_path: None)
+    sql.result_blocks.invalidate(lambda key: True)
+
+
+def wait_until(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def fetch(conn, identity, session, table="cat.sch.t", on_wait=None):
+    return sql.fetch_page(table, lambda: conn, identity, "/sql/wh", 0, 10, session=session, on_wait=on_wait)
+
+
+@pytest.fixture
+def stopped_warehouse(monkeypatch):
+    """A warehouse listed as STOPPED whose polls return the states in the returned list"""
+    polls = []
+    monkeypatch.setattr(sql, "get_warehouse_state", lambda http_path: {"id": "wh", "name": "WH", "state": "STOPPED"})
+    monkeypatch.setattr(sql, "_start_warehouse", lambda warehouse_id: None)
+    monkeypatch.setattr(sql, "_poll_warehouse_state", lambda warehouse_id: polls.pop(0))
+    return polls
+
+
+def test_pages_are_cached_per_identity():
+    conn = FakeConnection()
+    assert fetch(conn, "sp:app", ("a", "sp")) == (["n"], [{"n": i} for i in range(5)], False)
+    fetch(conn, "sp:app", ("b", "sp"))
+    assert len(conn.executed) == 1
+
+
+def test_forged_obo_token_misses_the_victims_cached_rows():
+    victim = jwt.encode({"sub": "victim@example.com"}, "stub-signing-key-of-sufficient-length", algorithm="HS256")
+    forged = jwt.encode({"sub": "victim@example.com"}, key=None, algorithm="none")
+    fetch(FakeConnection(), get_token_identity(victim), ("a", "obo"), table="main.hr.salaries")
+
+    def refuse():
+        raise PermissionError("Invalid access token")
+
+    with pytest.raises(PermissionError):
+        sql.fetch_page("main.hr.salaries", refuse, get_token_identity(forged), "/sql/wh", 0, 10, session=("b", "obo"))
+
+
+def test_unidentified_calls_share_neither_streams_nor_cache():
+    release = threading.Event()
+    conn = FakeConnection(release=release)
+    results = []
+    threads = [
+        threading.Thread(target=lambda session=session: results.append(fetch(conn, None, session)))
+        for session in (("a", "obo"), ("b", "obo"))
+    ]
+    for thread in threads:
+        thread.start()
+    # Both calls are in flight before either statement finishes
+    wait_until(lambda: len(sql._streams) == 2)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(results) == 2
+    fetch(conn, None, ("c", "obo"))
+    assert len(conn.executed) == 3
+
+
+def test_progress_is_kept_per_query_session():
+    fetch(FakeConnection(rows=3), "sp:app", ("a", "sp"), table="cat.sch.small")
+    fetch(FakeConnection(rows=7), "sp:app", ("b", "sp"), table="cat.sch.large")
+
+    assert sql.get_query_progress(("a", "sp"))["rows"] == 3
+    assert sql.get_query_progress(("b", "sp"))["rows"] == 7
+    assert sql.get_query_progress(("c", "sp")) is None
+
+
+def test_block_waits_for_a_starting_warehouse(stopped_warehouse):
+    stopped_warehouse.extend(["STOPPED", "STARTING", "STARTING", "RUNNING"])
+    waits = []
+
+    assert fetch(FakeConnection(), "sp:app", ("a", "sp"), on_wait=waits.append)[1]
+    assert len(waits) >= 2 and waits[-1] is None
+    assert {state for state, waited, expected in waits[:-1]} <= {"STOPPED", "STARTING"}
+    assert "wh" in sql._start_durations
+
+
+def test_cached_page_does_not_wait_for_the_warehouse(stopped_warehouse):
+    conn = FakeConnection()
+    stopped_warehouse.append("RUNNING")
+    fetch(conn, "sp:app", ("a", "sp"))
+
+    waits = []
+    assert fetch(conn, "sp:app", ("b", "sp"), on_wait=waits.append)[1]
+    assert waits == []
+    assert len(conn.executed) == 1
+
+
+def test_start_time_is_only_learned_from_an_observed_start(stopped_warehouse):
+    # The listing was stale: the first poll already finds the warehouse running
+    stopped_warehouse.append("RUNNING")
+    fetch(FakeConnection(), "sp:app", ("a", "sp"))
+
+    assert sql._start_durations == {}
+
+
+def test_sessions_queue_separately_and_see_their_place(monkeypatch):
+    limiter = sql.FairLimiter(1, 1, 5)
+    monkeypatch.setattr(sql, "query_limiter", limiter)
+    release = threading.Event()
+    first = threading.Thread(target=fetch, args=(FakeConnection(release=release), "sp:app", ("a", "sp")))
+    first.start()
+    wait_until(lambda: limiter.stats()["running"])
+
+    places = []
+    second = threading.Thread(
+        target=lambda: sql.fetch_page(
+            "cat.sch.other", FakeConnection, "sp:app", "/sql/wh", 0, 10, session=("b", "sp"), on_queue=places.append
+        )
+    )
+    second.start()
+    wait_until(lambda: places)
+    assert list(limiter._queues) == [("sp:app", ("b", "sp"))]
+
+    release.set()
+    first.join(5)
+    second.join(5)
+    assert places == [(1, 1), None]
+
+
+def test_selector_and_states_share_one_warehouse_listing(monkeypatch):
+    listed = []
+
+    def warehouse(name, state):
+        return SimpleNamespace(
+            id=name, name=name, state=SimpleNamespace(value=state), odbc_params=SimpleNamespace(path=f"/sql/{name}")
+        )
+
+    def list_warehouses():
+        listed.append(True)
+        return [warehouse("zeta", "RUNNING"), warehouse("alpha", "STOPPED")]
+
+    monkeypatch.setattr(sql, "w", SimpleNamespace(warehouses=SimpleNamespace(list=list_warehouses)))
+    sql.fetch_warehouse_listing.invalidate()
+
+    options, first = sql.fetch_warehouses()
+    states = sql.fetch_warehouse_states()
+    assert [option["label"] for option in options] == ["alpha", "zeta"]
+    assert first == "/sql/alpha"
+    assert states["/sql/zeta"]["state"] == "RUNNING"
+    assert len(listed) == 1
+    sql.fetch_warehouse_listing.invalidate()
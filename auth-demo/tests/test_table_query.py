@@ -0,0 +1,157 @@
+import pytest
+
+from table_query import FilterSyntaxError, build_order_by, build_where, quote_identifier
+
+SYMBOLS = {"=": "=", "!=": "!=", "<": "<", "<=": "<=", ">": ">", ">=": ">="}
+WORDS = {"eq": "=", "ne": "!=", "lt": "<", "le": "<=", "gt": ">", "ge": ">="}
+
+
+@pytest.mark.parametrize("spelling, sql", [*SYMBOLS.items(), *WORDS.items()])
+@pytest.mark.parametrize("prefix", ["", "s"])
+def test_relational_operators(spelling, sql, prefix):
+    assert build_where(f"{{price}} {prefix}{spelling} 10") == (f"`price` {sql} :f0", {"f0": 10})
+    assert build_where(f'{{name}} {prefix}{spelling} "Ann"') == (f"`name` {sql} :f0", {"f0": "Ann"})
+
+
+@pytest.mark.parametrize("spelling, sql", [*SYMBOLS.items(), *WORDS.items()])
+def test_case_insensitive_operators_lower_strings(spelling, sql):
+    assert build_where(f'{{name}} i{spelling} "Ann"') == (
+        f"lower(CAST(`name` AS STRING)) {sql} lower(:f0)",
+        {"f0": "Ann"},
+    )
+
+
+def test_case_insensitive_operators_leave_numbers_alone():
+    assert build_where("{price} ieq 10") == ("`price` = :f0", {"f0": 10})
+
+
+def test_word_operators_ignore_case():
+    assert build_where("{price} GT 10") == ("`price` > :f0", {"f0": 10})
+
+
+@pytest.mark.parametrize("prefix", ["", "s"])
+def test_contains(prefix):
+    assert build_where(f'{{name}} {prefix}contains "an"') == (
+        "CAST(`name` AS STRING) LIKE :f0",
+        {"f0": "%an%"},
+    )
+
+
+def test_icontains():
+    assert build_where('{name} icontains "An"') == (
+        "lower(CAST(`name` AS STRING)) LIKE lower(:f0)",
+        {"f0": "%An%"},
+    )
+
+
+@pytest.mark.parametrize("prefix", ["", "s", "i"])
+def test_datestartswith_matches_a_prefix(prefix):
+    where, params = build_where(f'{{day}} {prefix}datestartswith "2024-01"')
+    assert "LIKE" in where
+    assert params == {"f0": "2024-01%"}
+
+
+def test_like_wildcards_are_escaped():
+    assert build_where('{code} contains "50%_off\\\\"')[1] == {"f0": "%50\\%\\_off\\\\%"}
+    assert build_where('{day} datestartswith "2024_%"')[1] == {"f0": "2024\\_\\%%"}
+
+
+@pytest.mark.parametrize(
+    "filter_query, sql",
+    [
+        ("{note} is nil", "`note` IS NULL"),
+        ("{note} is not nil", "(NOT `note` IS NULL)"),
+        ("{note} is blank", "(`note` IS NULL OR trim(CAST(`note` AS STRING)) = '')"),
+        ("{note} is not blank", "(NOT (`note` IS NULL OR trim(CAST(`note` AS STRING)) = ''))"),
+    ],
+)
+def test_nil_and_blank_checks(filter_query, sql):
+    assert build_where(filter_query) == (sql, {})
+
+
+@pytest.mark.parametrize("and_, or_", [("&&", "||"), ("and", "or")])
+def test_boolean_operators(and_, or_):
+    assert build_where(f"{{a}} = 1 {and_} {{b}} = 2 {or_} {{c}} = 3") == (
+        "((`a` = :f0 AND `b` = :f1) OR `c` = :f2)",
+        {"f0": 1, "f1": 2, "f2": 3},
+    )
+
+
+def test_parentheses_and_negation():
+    assert build_where("!({a} = 1 || {b} = 2) && {c} = 3") == (
+        "((NOT (`a` = :f0 OR `b` = :f1)) AND `c` = :f2)",
+        {"f0": 1, "f1": 2, "f2": 3},
+    )
+    assert build_where("! {a} is nil") == ("(NOT `a` IS NULL)", {})
+
+
+@pytest.mark.parametrize(
+    "value, param",
+    [
+        ("42", 42),
+        ("-7", -7),
+        ("3.5", 3.5),
+        (".5", 0.5),
+        ("1e3", 1000.0),
+        ("1.0", 1.0),
+        ('"42"', "42"),
+        ("'42'", "42"),
+        ("abc", "abc"),
+        ("12ab", "12ab"),
+    ],
+)
+def test_numbers_versus_strings(value, param):
+    params = build_where(f"{{x}} = {value}")[1]
+    assert params == {"f0": param}
+    assert type(params["f0"]) is type(param)
+
+
+def test_escaped_quotes_in_strings():
+    assert build_where('{x} = "say \\"hi\\""')[1] == {"f0": 'say "hi"'}
+
+
+def test_backticks_in_column_names_are_escaped():
+    assert build_where("{we`ird} = 1")[0] == "`we``ird` = :f0"
+    assert build_where("{a\\}b} = 1")[0] == "`a}b` = :f0"
+    assert quote_identifier("x` OR 1=1 --") == "`x`` OR 1=1 --`"
+
+
+def test_values_are_never_inlined():
+    where, params = build_where("{name} = \"x' OR '1'='1\"")
+    assert where == "`name` = :f0"
+    assert params == {"f0": "x' OR '1'='1"}
+
+
+@pytest.mark.parametrize("filter_query", [None, "", "   "])
+def test_empty_filter(filter_query):
+    assert build_where(filter_query) == ("", {})
+
+
+@pytest.mark.parametrize(
+    "filter_query",
+    [
+        "{a} =",
+        "{a} = 1 &&",
+        "({a} = 1",
+        "{a} = 1)",
+        "a = 1",
+        "{a} like 1",
+        "{a} xeq 1",
+        "{a} = (",
+        "{a} is",
+        "{a} is empty",
+        "{a} = 1 & {b} = 2",
+        "{a} = 1 {b} = 2",
+        '{a} = "unterminated',
+    ],
+)
+def test_malformed_filters_raise(filter_query):
+    with pytest.raises(FilterSyntaxError):
+        build_where(filter_query)
+
+
+def test_order_by():
+    assert build_order_by(
+        [{"column_id": "b", "direction": "desc"}, {"column_id": "a`x", "direction": "asc"}]
+    ) == "`b` DESC, `a``x` ASC"
+    assert build_order_by(None) == ""
@@ -0,0 +1,55 @@
+import gzip
+import json
+
+import brotli
+import dash
+import flask
+from dash import html
+import pytest
+
+import wire
+
+PAYLOAD = {"rows": [{"id": i, "name": f"row {i}"} for i in range(500)]}
+
+
+@pytest.fixture
+def client():
+    app = dash.Dash(server=wire.compression_server(), compress=True)
+    app.layout = html.Div()
+
+    @app.server.route("/_test/rows")
+    def rows():
+        response = flask.jsonify(PAYLOAD)
+        response.set_etag("rows-v1")
+        return response
+
+    @app.server.route("/_test/small")
+    def small():
+        return flask.jsonify({"ok": True})
+
+    return app.server.test_client()
+
+
+@pytest.mark.parametrize("accept, encoding, decode", [
+    ("br, gzip", "br", brotli.decompress),
+    ("gzip", "gzip", gzip.decompress),
+])
+def test_responses_are_compressed_as_the_client_accepts(client, accept, encoding, decode):
+    response = client.get("/_test/rows", headers={"Accept-Encoding": accept})
+    assert response.headers["Content-Encoding"] == encoding
+    assert "Accept-Encoding" in response.headers["Vary"]
+    assert json.loads(decode(response.data)) == PAYLOAD
+
+
+def test_each_encoding_has_its_own_etag(client):
+    etags = {
+        accept: client.get("/_test/rows", headers={"Accept-Encoding": accept}).headers["ETag"]
+        for accept in ("br", "gzip", "identity")
+    }
+    assert len(set(etags.values())) == 3
+    assert etags["identity"] == '"rows-v1"'
+
+
+def test_small_and_unaccepted_responses_are_left_alone(client):
+    assert "Content-Encoding" not in client.get("/_test/small", headers={"Accept-Encoding": "br"}).headers
+    assert "Content-Encoding" not in client.get("/_test/rows", headers={"Accept-Encoding": "identity"}).headers
@@ -1,7 +1,12 @@
+import os
+
 from dash import dash_table
 from dash_iconify import DashIconify
 import dash_mantine_components as dmc
 
+# Cells with at least this many characters may be cut off by the column's maxWidth
+TOOLTIP_MIN_LENGTH = int(os.getenv("TOOLTIP_MIN_LENGTH", "40"))
+
 
 def get_icon(icon):
     return DashIconify(icon=icon, height=16)
@@ -39,28 +44,50 @@ def create_data_table(id):
                 "backgroundColor": "#F9F7F4",
             }
         ],
+        # Paging, sorting and filtering run on the warehouse via the SQL callbacks
+        page_action="custom",
+        page_current=0,
         page_size=10,
-        sort_action="native",
-        filter_action="native",
+        sort_action="custom",
+        sort_mode="multi",
+        sort_by=[],
+        filter_action="custom",
+        filter_query="",
         tooltip_delay=0,
         tooltip_duration=None,
-        tooltip_data=[
-            {
-                column: {"value": str(value), "type": "markdown"}
-                for column, value in row.items()
-            }
-            for row in [{}]
-        ],
+        tooltip_data=[],
         virtualization=True,
         fixed_rows={"headers": True},
     )
 
 
+def build_tooltips(records, min_length=None):
+    """Tooltip data for a page of rows, with entries only for cells long enough to be truncated"""
+    if min_length is None:
+        min_length = TOOLTIP_MIN_LENGTH
+    tooltips = []
+    for row in records:
+        row_tooltips = {}
+        for column, value in row.items():
+            if value is None:
+                continue
+            text = str(value)
+            if len(text) >= min_length:
+                row_tooltips[column] = {"value": text, "type": "markdown"}
+        tooltips.append(row_tooltips)
+    return tooltips
+
+
 def create_genie_list(items, title_key="title", id_key="id"):
     """Create a formatted list for Genie spaces or conversations"""
     if not items:
         return dmc.Text("No items found", size="sm", c="dimmed")
     
+    return dmc.List(create_genie_list_items(items, title_key, id_key), size="sm", spacing="xs")
+
+
+def create_genie_list_items(items, title_key="title", id_key="id"):
+    """List items for Genie spaces or conversations, to start a list or append to one"""
     list_items = []
     for item in items:
         # Try different possible key names for ID
@@ -74,7 +101,7 @@ def create_genie_list(items, title_key="title", id_key="id"):
             ])
         )
     
-    return dmc.List(list_items, size="sm", spacing="xs")
+    return list_items
 
 
 def create_genie_messages_list(messages_data):
@@ -99,6 +126,11 @@ def create_genie_messages_list(messages_data):
     if not messages:
         return dmc.Text("No messages found", size="sm", c="dimmed")
     
+    return dmc.Stack(create_genie_message_cards(messages), gap="md")
+
+
+def create_genie_message_cards(messages):
+    """Message cards for a page of Genie messages, to start a list or append to one"""
     list_items = []
     for message in messages:
         # Extract message details
@@ -113,10 +145,10 @@ def create_genie_messages_list(messages_data):
                 dmc.Badge(message_role, color="blue", size="sm"),
                 dmc.Text(f"ID: {message_id}", size="xs", c="dimmed"),
                 dmc.Text(message_timestamp, size="xs", c="dimmed"),
-            ], position="apart", mb="xs"),
+            ], justify="space-between", mb="xs"),
             dmc.Text(message_content, size="sm", style={"whiteSpace": "pre-wrap"})
         ], p="md", radius="sm", withBorder=True, mb="xs")
         
         list_items.append(message_card)
     
-    return dmc.Stack(list_items, spacing="md")
+    return list_items
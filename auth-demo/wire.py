@@ -0,0 +1,70 @@
+import os
+import threading
+
+import brotli
+from flask import Flask
+
+WIRE_COMPRESSION = os.getenv("WIRE_COMPRESSION", "true").lower() == "true"
+WIRE_COMPRESS_MIN_BYTES = int(os.getenv("WIRE_COMPRESS_MIN_BYTES", "1024"))
+WIRE_GZIP_LEVEL = int(os.getenv("WIRE_GZIP_LEVEL", "6"))
+# Brotli's higher qualities cost far more CPU than they save on JSON this size
+WIRE_BROTLI_QUALITY = int(os.getenv("WIRE_BROTLI_QUALITY", "5"))
+# Send table rows as column arrays that a clientside callback expands
+WIRE_COLUMNAR = os.getenv("WIRE_COLUMNAR", "true").lower() == "true"
+
+_COMPRESSIBLE_TYPES = ["application/json", "application/javascript", "text/html", "text/css", "text/javascript"]
+
+_stats_lock = threading.Lock()
+_stats = {"responses": 0, "compressed": 0, "bytes_out": 0}
+
+
+def _count_response(response):
+    with _stats_lock:
+        _stats["responses"] += 1
+        if "Content-Encoding" in response.headers and response.content_length is not None:
+            _stats["compressed"] += 1
+            _stats["bytes_out"] += response.content_length
+    return response
+
+
+def compression_server():
+    """A Flask server set up for Dash(server=..., compress=WIRE_COMPRESSION).
+
+    flask-compress, which Dash installs with compress=True, reads its options
+    when Dash is created, so they are set on the server beforehand. It
+    negotiates brotli or gzip per request and tags each variant's ETag with
+    its encoding.
+    """
+    server = Flask(__name__)
+    server.config.update(
+        COMPRESS_ALGORITHM=["br", "gzip"],
+        COMPRESS_MIMETYPES=_COMPRESSIBLE_TYPES,
+        COMPRESS_MIN_SIZE=WIRE_COMPRESS_MIN_BYTES,
+        COMPRESS_LEVEL=WIRE_GZIP_LEVEL,
+        COMPRESS_BR_LEVEL=WIRE_BROTLI_QUALITY,
+        COMPRESS_BR_MODE=brotli.MODE_TEXT,
+    )
+    # Registered before flask-compress, so it sees the compressed response
+    server.after_request(_count_response)
+    return server
+
+
+def to_table_payload(columns, records):
+    """Table rows for the browser, as column arrays when WIRE_COLUMNAR is on.
+
+    Row dicts repeat every column name in every row; the columnar form
+    names each column once and is expanded back into rows by a clientside
+    callback.
+    """
+    if not WIRE_COLUMNAR or not records:
+        return records
+    return {
+        "columns": list(columns),
+        "values": [[row.get(column) for row in records] for column in columns],
+    }
+
+
+def get_wire_stats():
+    """Report how many responses were compressed and their compressed bytes"""
+    with _stats_lock:
+        return dict(_stats)